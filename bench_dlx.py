@@ -0,0 +1,963 @@
+#!/usr/bin/env python
+# Benchmarks for the DLX solver on some standard exact cover problems.
+#
+# Usage:
+#   python bench_dlx.py [selection] [engines] [restarts] [secondary] [compiled] [memory]
+#                       [components] [loading] [streaming] [bounds] [colors] [symmetries]
+#                       [rowstream] [saveload] [budgets] [async] [shared] [preprocess]
+#   python bench_dlx.py suite [--engine ENGINE] [--repeat N] [--json results.json]
+#   python bench_dlx.py --compare old.json new.json [--threshold 0.1]
+#
+# The suite times the standard workloads of SUITE and can write them to a
+# JSON file, so that the results of two commits can be compared.
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pprint import pprint
+
+import dlx
+
+# A hard puzzle, 0 is an empty cell
+HARD_SUDOKU = (
+    "800000000"
+    "003600000"
+    "070090200"
+    "050007000"
+    "000045700"
+    "000100030"
+    "001000068"
+    "008500010"
+    "090000400"
+)
+
+PENTOMINOES = {
+    "F": [(0,1), (0,2), (1,0), (1,1), (2,1)],
+    "I": [(0,0), (1,0), (2,0), (3,0), (4,0)],
+    "L": [(0,0), (1,0), (2,0), (3,0), (3,1)],
+    "N": [(0,1), (1,1), (2,0), (2,1), (3,0)],
+    "P": [(0,0), (0,1), (1,0), (1,1), (2,0)],
+    "T": [(0,0), (0,1), (0,2), (1,1), (2,1)],
+    "U": [(0,0), (0,2), (1,0), (1,1), (1,2)],
+    "V": [(0,0), (1,0), (2,0), (2,1), (2,2)],
+    "W": [(0,0), (1,0), (1,1), (2,1), (2,2)],
+    "X": [(0,1), (1,0), (1,1), (1,2), (2,1)],
+    "Y": [(0,1), (1,0), (1,1), (2,1), (3,1)],
+    "Z": [(0,0), (0,1), (1,1), (2,1), (2,2)],
+}
+
+
+# Returns (columns, rows) for a sudoku made of boxSize x boxSize boxes. The
+# puzzle is a list of n*n digits where 0 is an empty cell (or a string for
+# 9x9 puzzles), None gives the empty grid. Only the candidates allowed by the
+# givens are added as rows.
+def sudokuMatrix(puzzle=None, boxSize=3):
+    n = boxSize * boxSize
+    cells = n * n
+    if puzzle is None:
+        puzzle = [0] * cells
+    columns = (
+        [f"cell{r},{c}" for r in range(n) for c in range(n)] +
+        [f"row{r}#{d}" for r in range(n) for d in range(n)] +
+        [f"col{c}#{d}" for c in range(n) for d in range(n)] +
+        [f"box{b}#{d}" for b in range(n) for d in range(n)]
+    )
+    rows = []
+    for r in range(n):
+        for c in range(n):
+            given = int(puzzle[r*n + c])
+            for d in range(n):
+                if given != 0 and given != d + 1:
+                    continue
+                b = (r // boxSize) * boxSize + c // boxSize
+                rows.append([
+                    r*n + c,
+                    cells + r*n + d,
+                    2*cells + c*n + d,
+                    3*cells + b*n + d,
+                ])
+    return columns, rows
+
+
+# Returns `count` 9x9 puzzles made by shuffling a solved grid and emptying
+# `blanks` of its cells. They are all solvable but can have more than one
+# solution.
+def sudokuPuzzles(count, seed=0, blanks=55):
+    rng = random.Random(seed)
+    puzzles = []
+    for _ in range(count):
+        digits = list(range(1, 10))
+        rng.shuffle(digits)
+        rowOrder = [band*3 + r for band in rng.sample(range(3), 3) for r in rng.sample(range(3), 3)]
+        colOrder = [stack*3 + c for stack in rng.sample(range(3), 3) for c in rng.sample(range(3), 3)]
+        grid = [
+            digits[(r*3 + r//3 + c) % 9]
+            for r in rowOrder for c in colOrder
+        ]
+        for cell in rng.sample(range(81), blanks):
+            grid[cell] = 0
+        puzzles.append(grid)
+    return puzzles
+
+
+# The rows of sudokuMatrix(None) which place the givens of `puzzle`
+def sudokuGivens(puzzle):
+    return [cell*9 + d - 1 for cell, d in enumerate(puzzle) if d != 0]
+
+
+# Returns (columns, rows, secondary) for placing n queens. Every rank and
+# file must be covered exactly once while the diagonals may only be covered at
+# most once. With secondary=True the diagonals are secondary columns,
+# otherwise every diagonal is padded with a row which only covers it.
+def queensMatrix(n, secondary=False):
+    columns = (
+        [f"rank{i}" for i in range(n)] +
+        [f"file{i}" for i in range(n)] +
+        [f"diag{i}" for i in range(2*n - 1)] +
+        [f"anti{i}" for i in range(2*n - 1)]
+    )
+    rows = []
+    for r in range(n):
+        for c in range(n):
+            rows.append([r, n + c, 2*n + r + c, 4*n - 1 + r - c + n - 1])
+    diagonals = range(2*n, len(columns))
+    if secondary:
+        return columns, rows, list(diagonals)
+    for d in diagonals:
+        rows.append([d])
+    return columns, rows, []
+
+
+def _orientations(cells):
+    shapes = set()
+    for _ in range(2):
+        for _ in range(4):
+            cells = [(c, -r) for r, c in cells]
+            minR = min(r for r, _ in cells)
+            minC = min(c for _, c in cells)
+            shapes.add(tuple(sorted((r - minR, c - minC) for r, c in cells)))
+        cells = [(r, -c) for r, c in cells]
+    return sorted(shapes)
+
+
+# Returns (columns, rows) for Langford pairs: the numbers 1..n each placed
+# twice in 2n slots with k numbers between the two copies of k. The columns
+# are the numbers followed by the slots.
+def langfordMatrix(n):
+    columns = [f"{k}" for k in range(1, n + 1)] + [f"slot{i}" for i in range(2*n)]
+    rows = []
+    for k in range(1, n + 1):
+        for i in range(2*n - k - 1):
+            rows.append([k - 1, n + i, n + i + k + 1])
+    return columns, rows
+
+
+# Returns (columns, rows) of a random matrix where every entry is 1 with
+# probability `density`. A solution is planted first, by splitting the
+# columns into rows of about the same length, so there is always one.
+def randomSparseMatrix(numColumns, numRows, density, seed=0):
+    rng = random.Random(seed)
+    columns = list(range(numColumns))
+    order = rng.sample(columns, numColumns)
+    length = max(1, round(density * numColumns))
+    rows = [sorted(order[i:i + length]) for i in range(0, numColumns, length)]
+    while len(rows) < numRows:
+        row = [ci for ci in columns if rng.random() < density]
+        if row:
+            rows.append(row)
+    rng.shuffle(rows)
+    return columns, rows
+
+
+# Returns (columns, rows) for tiling a height x width board with the 12
+# pentominoes.
+def pentominoMatrix(height=6, width=10):
+    names = sorted(PENTOMINOES)
+    columns = names + [f"{r},{c}" for r in range(height) for c in range(width)]
+    rows = []
+    for pi, name in enumerate(names):
+        for shape in _orientations(PENTOMINOES[name]):
+            for r in range(height):
+                for c in range(width):
+                    cells = [(r + dr, c + dc) for dr, dc in shape]
+                    if all(cr < height and cc < width for cr, cc in cells):
+                        rows.append([pi] + [len(names) + cr*width + cc for cr, cc in cells])
+    return columns, rows
+
+
+# The reflections of the board as permutations of the rows of
+# pentominoMatrix(height, width), for DLX.setSymmetries
+def pentominoSymmetries(height, width):
+    columns, rows = pentominoMatrix(height, width)
+    numPieces = len(PENTOMINOES)
+    rowIndex = {(row[0], frozenset(row[1:])): i for i, row in enumerate(rows)}
+    symmetries = []
+    for reflect in (lambda r, c: (height - 1 - r, c), lambda r, c: (r, width - 1 - c)):
+        permutation = []
+        for row in rows:
+            cells = []
+            for cell in row[1:]:
+                r, c = reflect(*divmod(cell - numPieces, width))
+                cells.append(numPieces + r*width + c)
+            permutation.append(rowIndex[row[0], frozenset(cells)])
+        symmetries.append(permutation)
+    return symmetries
+
+
+# Time how long it takes to find the first `limit` solutions, or all of
+# them when limit is None. Returns (seconds, solutions found)
+def timeSolve(columns, rows, limit=None, secondary=None, **options):
+    d = dlx.DLX(**options)
+    d.setColumns(columns, secondary)
+    d.setRows(rows)
+    found = 0
+    start = time.perf_counter()
+    for _ in d.solve():
+        found += 1
+        if limit is not None and found >= limit:
+            break
+    return time.perf_counter() - start, found
+
+
+# Scanning the column headers against the column buckets, both on the nodes
+# engine since it is the only one with buckets.
+def benchColumnSelection():
+    workloads = [
+        ("sudoku hard", sudokuMatrix(HARD_SUDOKU), None),
+        ("queens 8", queensMatrix(8)[:2], None),
+        ("queens 10", queensMatrix(10)[:2], None),
+        ("pentomino 6x10 (first 10)", pentominoMatrix(6, 10), 10),
+        ("sudoku 16x16 empty (first)", sudokuMatrix(None, 4), 1),
+        ("sudoku 36x36 empty (first)", sudokuMatrix(None, 6), 1),
+    ]
+    results = []
+    for name, (columns, rows), limit in workloads:
+        entry = {"workload": name}
+        for selection in ("scan", "buckets"):
+            seconds, found = timeSolve(
+                columns, rows, limit, engine="nodes", columnSelection=selection)
+            entry[selection] = round(seconds, 4)
+            entry["solutions"] = found
+        results.append(entry)
+    return results
+
+
+# Every engine on the same workloads, from 58 to 2500 columns. The bitset
+# engine wins up to a few hundred columns, see dlx.BITSET_MAX_COLUMNS.
+def benchEngines():
+    workloads = [
+        ("queens 10", queensMatrix(10, True), None),
+        ("pentomino 6x10 (first 10)", pentominoMatrix(6, 10) + ([],), 10),
+        ("sudoku hard", sudokuMatrix(HARD_SUDOKU) + ([],), None),
+        ("sudoku 16x16 empty (first)", sudokuMatrix(None, 4) + ([],), 1),
+        ("sudoku 25x25 empty (first)", sudokuMatrix(None, 5) + ([],), 1),
+    ]
+    results = []
+    for name, (columns, rows, secondary), limit in workloads:
+        entry = {"workload": name, "columns": len(columns)}
+        for engine in dlx.ENGINES + ("auto",):
+            seconds, found = timeSolve(columns, rows, limit, secondary, engine=engine)
+            entry[engine] = round(seconds, 4)
+            entry["solutions"] = found
+        results.append(entry)
+    return results
+
+
+# The distribution of the time to the first solution over a corpus of
+# puzzles, with the fixed order of solve() against solveRandom() with every
+# kind of restarts and a few seeds.
+def benchRandomRestarts(seeds=5, unit=100):
+    corpus = [pentominoMatrix(h, w) + ([],) for h, w in ((6, 10), (5, 12), (4, 15), (3, 20))]
+    corpus += [queensMatrix(n, True) for n in (20, 30, 40)]
+    corpus += [sudokuMatrix(p) + ([],) for p in sudokuPuzzles(5, seed=1, blanks=60)]
+
+    def summary(times):
+        times = sorted(times)
+        return {
+            "median": round(times[len(times) // 2], 4),
+            "p90": round(times[int(len(times) * 0.9)], 4),
+            "max": round(times[-1], 4),
+        }
+
+    results = {}
+    times = []
+    for columns, rows, secondary in corpus:
+        times.append(timeSolve(columns, rows, 1, secondary)[0])
+    results["fixed order"] = summary(times)
+    for restarts in dlx.RESTARTS:
+        times = []
+        for columns, rows, secondary in corpus:
+            for seed in range(seeds):
+                d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+                start = time.perf_counter()
+                d.solveRandom(seed, restarts, unit)
+                times.append(time.perf_counter() - start)
+        results[f"random, {restarts} restarts"] = summary(times)
+    return results
+
+
+# N-queens with the diagonals as secondary columns against padding every
+# diagonal with a singleton row. Counting every solution takes too long in
+# Python past n=12, so only the first `limit` solutions are timed.
+def benchSecondaryColumns(sizes=range(12, 17), limit=1000):
+    results = []
+    for n in sizes:
+        entry = {"workload": f"queens {n} (first {limit})"}
+        for encoding, secondary in (("padded", False), ("secondary", True)):
+            columns, rows, secondaryColumns = queensMatrix(n, secondary)
+            seconds, found = timeSolve(columns, rows, limit, secondaryColumns, engine="nodes")
+            entry[encoding] = round(seconds, 4)
+            entry["rows " + encoding] = len(rows)
+        results.append(entry)
+    return results
+
+
+# The disjoint union of some matrices given as (columns, rows, secondary)
+def unionMatrix(parts):
+    columns, rows, secondary = [], [], []
+    for partColumns, partRows, partSecondary in parts:
+        offset = len(columns)
+        columns += partColumns
+        rows += [[offset + ci for ci in row] for row in partRows]
+        secondary += [offset + ci for ci in partSecondary]
+    return columns, rows, secondary
+
+
+# Counting the solutions of several independent boards bundled into one
+# matrix, searched as a whole or split into components.
+def benchComponents():
+    workloads = [
+        ("queens 7 + queens 8", [queensMatrix(7, True), queensMatrix(8, True)]),
+        ("3 x queens 6", [queensMatrix(6, True)] * 3),
+    ]
+    results = []
+    for name, parts in workloads:
+        columns, rows, secondary = unionMatrix(parts)
+        entry = {"workload": name}
+        for label, decompose in (("whole", False), ("components", True)):
+            d = dlx.DLX("nodes", decompose=decompose).setColumns(columns, secondary).setRows(rows)
+            start = time.perf_counter()
+            entry["solutions"] = d.count()
+            entry[label] = round(time.perf_counter() - start, 4)
+        results.append(entry)
+    return results
+
+
+# Tasks to be spread over days with exactly `perDay` tasks on each day, as
+# (columns, rows, bounds). Every row is one task on one day.
+def scheduleMatrix(tasks, days, perDay):
+    columns = [f"task {t}" for t in range(tasks)] + [f"day {d}" for d in range(days)]
+    rows = [[t, tasks + d] for t in range(tasks) for d in range(days)]
+    bounds = {tasks + d: perDay for d in range(days)}
+    return columns, rows, bounds
+
+
+# The usual way to cover a column k times without bounds: k copies of the
+# column and a copy of each of its rows for every copy. Every solution is
+# then found once for each way of ordering the rows over the copies.
+def copiesMatrix(columns, rows, bounds):
+    copies = {}
+    newColumns = []
+    for ci, name in enumerate(columns):
+        copies[ci] = list(range(len(newColumns), len(newColumns) + bounds.get(ci, 1)))
+        newColumns += [name] * bounds.get(ci, 1)
+    newRows = []
+    rowOf = []
+    for rowIndex, row in enumerate(rows):
+        for choice in itertools.product(*(copies[ci] for ci in row)):
+            newRows.append(list(choice))
+            rowOf.append(rowIndex)
+    return newColumns, newRows, rowOf
+
+
+# Counting the distinct schedules with column bounds against giving every day
+# a copy per task and removing the repeated solutions.
+def benchBounds():
+    results = []
+    for tasks, days, perDay in ((8, 2, 4), (8, 4, 2), (9, 3, 3)):
+        columns, rows, bounds = scheduleMatrix(tasks, days, perDay)
+        entry = {"workload": f"{tasks} tasks, {days} days of {perDay}"}
+
+        d = dlx.DLX().setColumns(columns, None, bounds).setRows(rows)
+        start = time.perf_counter()
+        entry["solutions"] = d.count()
+        entry["bounds"] = round(time.perf_counter() - start, 4)
+
+        copyColumns, copyRows, rowOf = copiesMatrix(columns, rows, bounds)
+        d = dlx.DLX().setColumns(copyColumns).setRows(copyRows)
+        start = time.perf_counter()
+        solutions = [frozenset(rowOf[i] for i in solution) for solution in d.solve()]
+        distinct = set(solutions)
+        entry["copies"] = round(time.perf_counter() - start, 4)
+        entry["copies solutions"] = len(solutions)
+        assert len(distinct) == entry["solutions"]
+        results.append(entry)
+    return results
+
+
+# Word squares: a size x size grid whose rows and columns are all words.
+# Every option puts a word in a row or column slot, a primary column. The
+# cells are secondary columns, either colored with the letter the word puts
+# there or, without colors, one column per cell and letter: a column word
+# covers the one of its letter and a row word every other one.
+def wordSquareMatrix(words, size, colors=True):
+    letters = sorted(set("".join(words)))
+    slots = [("row", i) for i in range(size)] + [("column", i) for i in range(size)]
+    columns = [f"{kind} {i}" for kind, i in slots]
+    cells = {}
+    for r in range(size):
+        for c in range(size):
+            if colors:
+                cells[r, c] = len(columns)
+                columns.append(f"cell {r},{c}")
+            else:
+                for letter in letters:
+                    cells[r, c, letter] = len(columns)
+                    columns.append(f"cell {r},{c} not {letter}")
+    secondary = range(len(slots), len(columns))
+    rows = []
+    for si, (kind, i) in enumerate(slots):
+        for word in words:
+            row = [si]
+            for k, letter in enumerate(word):
+                cell = (i, k) if kind == "row" else (k, i)
+                if colors:
+                    row.append((cells[cell], letter))
+                elif kind == "column":
+                    row.append(cells[cell + (letter,)])
+                else:
+                    row += [cells[cell + (other,)] for other in letters if other != letter]
+            rows.append(row)
+    return columns, rows, secondary
+
+
+def randomWords(count, length, letters="abcdef", seed=0):
+    rng = random.Random(seed)
+    return sorted({"".join(rng.choice(letters) for _ in range(length)) for _ in range(count)})
+
+
+# Counting word squares with colored cells against the encoding without
+# colors, which needs a column per cell and letter, with both engines which
+# support colors.
+def benchColors():
+    results = []
+    for size, count, letters in ((3, 60, "abcdefgh"), (4, 60, "abcdef")):
+        words = randomWords(count, size, letters)
+        entry = {"workload": f"{size}x{size} squares of {len(words)} words"}
+        for label, colors in (("colors", True), ("letter columns", False)):
+            columns, rows, secondary = wordSquareMatrix(words, size, colors)
+            entry["columns " + label] = len(columns)
+            for engine in ("nodes", "bitset"):
+                d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows)
+                start = time.perf_counter()
+                entry["solutions"] = d.count()
+                entry[f"{label} {engine}"] = round(time.perf_counter() - start, 4)
+        results.append(entry)
+    return results
+
+
+# Counting every pentomino tiling against counting one tiling out of each
+# set of reflections of the board, which only tries the placements of one
+# piece which are the smallest of their orbit.
+def benchSymmetries():
+    results = []
+    for height, width in ((3, 20), (4, 15)):
+        columns, rows = pentominoMatrix(height, width)
+        d = dlx.DLX().setColumns(columns).setRows(rows)
+        d.setSymmetries(pentominoSymmetries(height, width))
+        entry = {"workload": f"pentomino {height}x{width}"}
+        start = time.perf_counter()
+        entry["solutions"] = d.count()
+        entry["all"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        entry["canonical solutions"] = d.countCanonical()
+        entry["canonical"] = round(time.perf_counter() - start, 4)
+        results.append(entry)
+    return results
+
+
+# Puzzles per second solving a batch of sudokus. Each puzzle is either built
+# and linked on its own, or solved against one compiled matrix with its
+# givens as the partial rows.
+def benchCompiledSudoku(count=200):
+    puzzles = sudokuPuzzles(count)
+    results = {"puzzles": count}
+
+    start = time.perf_counter()
+    for puzzle in puzzles:
+        columns, rows = sudokuMatrix(puzzle)
+        next(dlx.DLX("nodes").setColumns(columns).setRows(rows).solve())
+    results["relink per puzzle"] = round(count / (time.perf_counter() - start), 1)
+
+    columns, rows = sudokuMatrix(None)
+    for engine in dlx.ENGINES:
+        start = time.perf_counter()
+        compiled = dlx.DLX(engine).setColumns(columns).setRows(rows).compile()
+        for puzzle in puzzles:
+            search = compiled.solve(partial=sudokuGivens(puzzle))
+            next(search)
+            search.close()
+        results[f"compiled {engine}"] = round(count / (time.perf_counter() - start), 1)
+    return results
+
+
+# Bytes allocated by linking each matrix, per entry (1 in the matrix)
+def benchMemory():
+    workloads = [
+        ("sudoku 9x9 empty", sudokuMatrix(None)),
+        ("sudoku 16x16 empty", sudokuMatrix(None, 4)),
+        ("pentomino 6x10", pentominoMatrix(6, 10)),
+    ]
+    results = []
+    for name, (columns, rows) in workloads:
+        entries = sum(len(row) for row in rows)
+        entry = {"workload": name, "entries": entries}
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine).setColumns(columns).setRows(rows)
+            tracemalloc.start()
+            d.compile()
+            size, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            entry[f"{engine} bytes/entry"] = round(size / entries, 1)
+        results.append(entry)
+    return results
+
+
+# Writing every solution of n-queens to a file as lines of text against
+# solveTo(), and reading them back with SolutionReader.
+def benchStreaming(n=11):
+    columns, rows, secondary = queensMatrix(n, True)
+    d = dlx.DLX().setColumns(columns, secondary).setRows(rows).compile()
+    results = {"workload": f"queens {n}"}
+    with tempfile.TemporaryDirectory() as directory:
+        textPath = os.path.join(directory, "solutions.txt")
+        binaryPath = os.path.join(directory, "solutions.bin")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(textPath, "w") as f:
+            for solution in d.solve():
+                f.write(" ".join(map(str, solution)) + "\n")
+        results["text seconds"] = round(time.perf_counter() - start, 4)
+        results["text peak bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results["text bytes"] = os.path.getsize(textPath)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(binaryPath, "wb") as f:
+            results["solutions"] = d.solveTo(f)
+        results["solveTo seconds"] = round(time.perf_counter() - start, 4)
+        results["solveTo peak bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results["solveTo bytes"] = os.path.getsize(binaryPath)
+
+        start = time.perf_counter()
+        with dlx.SolutionReader(binaryPath) as reader:
+            for _ in reader:
+                pass
+        results["read seconds"] = round(time.perf_counter() - start, 4)
+    return results
+
+
+# Seconds to check and link the empty 16x16 sudoku given as lists of rows
+# against the same rows as CSR arrays, which are linked with numpy when it is
+# installed.
+def benchLoading(boxSize=4):
+    columns, rows = sudokuMatrix(None, boxSize)
+    indptr = [0]
+    for row in rows:
+        indptr.append(indptr[-1] + len(row))
+    indices = [ci for row in rows for ci in row]
+    results = {"entries": len(indices), "numpy": dlx.numpy is not None}
+    for engine in dlx.ENGINES:
+        start = time.perf_counter()
+        dlx.DLX(engine).setColumns(columns).setRows(rows).compile()
+        results[f"{engine} lists"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        dlx.DLX(engine).setColumns(columns).setRowsFromArrays(indptr, indices).compile()
+        results[f"{engine} arrays"] = round(time.perf_counter() - start, 4)
+    return results
+
+
+# The rows of sudokuMatrix(None, boxSize), made one at a time
+def sudokuRowStream(boxSize):
+    n = boxSize * boxSize
+    cells = n * n
+    for r in range(n):
+        for c in range(n):
+            b = (r // boxSize) * boxSize + c // boxSize
+            for d in range(n):
+                yield [r*n + c, cells + r*n + d, 2*cells + c*n + d, 3*cells + b*n + d]
+
+
+# Peak memory of making the rows of a big sudoku and linking them, from a
+# list of the rows held by the caller and from a generator read while
+# linking.
+def benchRowStream(boxSize=5):
+    columns = sudokuMatrix(None, boxSize)[0]
+    results = []
+    for engine in ("nodes", "array"):
+        entry = {"workload": f"sudoku {boxSize**2}x{boxSize**2} empty", "engine": engine}
+        for label in ("list", "generator"):
+            tracemalloc.start()
+            start = time.perf_counter()
+            rows = sudokuRowStream(boxSize)
+            if label == "list":
+                rows = list(rows)
+            d = dlx.DLX(engine).setColumns(columns).setRows(rows).compile()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            entry[f"{label} peak MB"] = round(peak / 2**20, 1)
+            entry[f"{label} seconds"] = round(seconds, 3)
+            del d, rows
+        results.append(entry)
+    return results
+
+
+# Linking a big sudoku from lists of rows against loading it from a file
+# written by DLX.save(), with and without the links of the array engine, and
+# the time to the first solution from each.
+def benchSaveLoad(boxSize=6):
+    columns, rows = sudokuMatrix(None, boxSize)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "matrix.dlx")
+        for engine in ("nodes", "array"):
+            entry = {"workload": f"sudoku {boxSize**2}x{boxSize**2} empty", "engine": engine}
+            start = time.perf_counter()
+            d = dlx.DLX(engine).setColumns(columns).setRows(rows).compile()
+            entry["link seconds"] = round(time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            next(d.solve())
+            entry["first solution seconds"] = round(time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            d.save(path, links=engine == "array")
+            entry["save seconds"] = round(time.perf_counter() - start, 3)
+            entry["file MB"] = round(os.path.getsize(path) / 2**20, 1)
+            start = time.perf_counter()
+            loaded = dlx.DLX(engine).load(path).compile()
+            entry["load seconds"] = round(time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            next(loaded.solve())
+            entry["first solution after load seconds"] = round(time.perf_counter() - start, 3)
+            del d, loaded
+            results.append(entry)
+    return results
+
+
+# The cost of the budget checks on a full count: none, a node budget which
+# is never reached, and a timeout with a CancelToken which are looked at every
+# BUDGET_CHECK_NODES rows.
+def benchBudgets(n=10):
+    columns, rows, secondary = queensMatrix(n, True)
+    results = []
+    for engine in dlx.ENGINES:
+        d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows).compile()
+        entry = {"workload": f"queens {n}", "engine": engine}
+        budgets = {
+            "no budget": {},
+            "maxNodes": {"maxNodes": 10**9},
+            "timeout and cancel": {"timeout": 3600, "cancel": dlx.CancelToken()},
+        }
+        for label, options in budgets.items():
+            start = time.perf_counter()
+            d.count(**options)
+            entry[f"{label} seconds"] = round(time.perf_counter() - start, 3)
+        results.append(entry)
+    return results
+
+
+# Many sudoku validations (are there 0, 1 or 2+ solutions) served at once
+# from an event loop: solve() called in the coroutines, which blocks the loop
+# for the whole search, against asolve() on the workers of startAsync(). The
+# latency of each request and the longest the loop went without running a
+# ticker are reported. All the requests arrive at once, so the latency
+# includes the time spent waiting for the ones before them.
+def benchAsync(count=1000, workers=None):
+    import asyncio
+
+    columns, rows = sudokuMatrix(None)
+    puzzles = [sudokuGivens(p) for p in sudokuPuzzles(count, seed=4, blanks=50)]
+
+    async def blocking(d, givens):
+        return [x for x in itertools.islice(d.solve(partial=givens), 2)]
+
+    async def concurrent(d, givens):
+        return [x async for x in d.asolve(partial=givens, maxSolutions=2)]
+
+    async def serve(validate):
+        d = dlx.DLX().setColumns(columns).setRows(rows).compile()
+        if validate is concurrent:
+            d.startAsync(workers)
+        lag = 0.0
+        done = False
+
+        async def ticker():
+            nonlocal lag
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lag = max(lag, time.perf_counter() - start - 0.01)
+
+        # every request arrives at `start`
+        async def request(givens):
+            await validate(d, givens)
+            return time.perf_counter() - start
+
+        tick = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*[request(g) for g in puzzles]))
+        seconds = time.perf_counter() - start
+        done = True
+        await tick
+        if validate is concurrent:
+            await d.aclose()
+        return {
+            "requests": count,
+            "seconds": round(seconds, 3),
+            "p50 latency ms": round(1000 * latencies[len(latencies) // 2], 1),
+            "p99 latency ms": round(1000 * latencies[len(latencies) * 99 // 100], 1),
+            "max loop lag ms": round(1000 * lag, 1),
+        }
+
+    return {
+        "solve() in the loop": asyncio.run(serve(blocking)),
+        "asolve()": asyncio.run(serve(concurrent)),
+    }
+
+
+# What a thread pays to get its own search of a big sudoku: linking the
+# matrix again against a solver() of a CompiledMatrix, which only copies the
+# arrays the search changes. Then the puzzles solved by `threads` threads
+# sharing one CompiledMatrix.
+def benchShared(boxSize=5, threads=4, count=8):
+    import threading
+
+    columns, rows = sudokuMatrix(None, boxSize)
+    results = []
+    for engine in ("array", "bitset"):
+        entry = {"workload": f"sudoku {boxSize**2}x{boxSize**2}", "engine": engine}
+        start = time.perf_counter()
+        dlx.DLX(engine).setColumns(columns).setRows(rows).compile()
+        entry["link seconds"] = round(time.perf_counter() - start, 4)
+        matrix = dlx.DLX(engine).setColumns(columns).setRows(rows).compileShared()
+        start = time.perf_counter()
+        matrix.solver()
+        entry["solver() seconds"] = round(time.perf_counter() - start, 4)
+        results.append(entry)
+
+    matrix = dlx.DLX("array").setColumns(columns).setRows(rows).compileShared()
+    n = boxSize * boxSize
+    # the first row of every box, a placement which never clashes
+    givens = [[(r * n + c) * n + (r % boxSize * boxSize + r // boxSize + c) % n]
+              for r in range(n) for c in range(n)][:count]
+
+    def work(k):
+        solver = matrix.solver()
+        for partial in givens[k::threads]:
+            next(solver.solve(partial=partial), None)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=work, args=(k,)) for k in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.append({"threads": threads, "puzzles": len(givens),
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "free threaded": not getattr(sys, "_is_gil_enabled", lambda: True)()})
+    return results
+
+
+# The time preprocess=True adds to linking, on empty sudokus of growing size
+# and on the hard puzzle, where the givens force most of the other rows.
+def benchPreprocess():
+    workloads = [(f"sudoku {k*k}x{k*k} empty", sudokuMatrix(None, k)) for k in (3, 4, 5)]
+    workloads.append(("sudoku hard", sudokuMatrix(HARD_SUDOKU)))
+    results = []
+    for name, (columns, rows) in workloads:
+        entry = {"workload": name, "rows": len(rows)}
+        for label, preprocess in (("link", False), ("preprocess and link", True)):
+            start = time.perf_counter()
+            d = dlx.DLX("array", preprocess=preprocess).setColumns(columns).setRows(rows).compile()
+            entry[f"{label} seconds"] = round(time.perf_counter() - start, 3)
+        entry["rows left"] = len(d.reduction.rows)
+        results.append(entry)
+    return results
+
+
+# The standard workloads of the suite as name: (matrices, limit). Every
+# matrix is (columns, rows, secondary) and the times of a set of matrices are
+# added up. Only the first `limit` solutions are searched, None is all.
+def _suiteWorkloads():
+    easy = [sudokuMatrix(p) + ([],) for p in sudokuPuzzles(10, seed=2, blanks=45)]
+    hard = [sudokuMatrix(HARD_SUDOKU) + ([],)]
+    hard += [sudokuMatrix(p) + ([],) for p in sudokuPuzzles(4, seed=3, blanks=58)]
+    return {
+        "sudoku easy (10)": (easy, 1),
+        "sudoku hard (5)": (hard, 1),
+        "queens 10 secondary": ([queensMatrix(10, True)], None),
+        "queens 10 padded": ([queensMatrix(10, False)], None),
+        "pentomino 6x10 (first 100)": ([pentominoMatrix(6, 10) + ([],)], 100),
+        "langford 8": ([langfordMatrix(8) + ([],)], None),
+        "random 0.05": ([randomSparseMatrix(100, 400, 0.05, seed=1) + ([],)], None),
+        "random 0.1": ([randomSparseMatrix(60, 300, 0.1, seed=2) + ([],)], None),
+        "random 0.2": ([randomSparseMatrix(60, 600, 0.2, seed=3) + ([],)], None),
+    }
+
+
+# Times one workload: linking the matrices, the first solution, and all of
+# them (up to `limit`) with the nodes per second of that search. The peak
+# memory of linking and searching is measured in a separate run, as
+# tracemalloc slows everything down. Times are the best of `repeat` runs.
+def _timeWorkload(matrices, limit, engine, repeat):
+    best = {}
+
+    def keep(name, value):
+        best[name] = min(best.get(name, value), value)
+
+    for _ in range(repeat):
+        link = first = search = 0.0
+        solutions = nodes = 0
+        for columns, rows, secondary in matrices:
+            d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows)
+            start = time.perf_counter()
+            d.compile()
+            link += time.perf_counter() - start
+
+            start = time.perf_counter()
+            next(d.solve(), None)
+            first += time.perf_counter() - start
+
+            start = time.perf_counter()
+            solutions += d.count(limit)
+            search += time.perf_counter() - start
+            nodes += d.stats.totalNodes()
+        keep("link seconds", link)
+        keep("first solution seconds", first)
+        keep("all solutions seconds", search)
+        best["solutions"] = solutions
+        best["nodes"] = nodes
+
+    peak = 0
+    for columns, rows, secondary in matrices:
+        tracemalloc.start()
+        d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows).compile()
+        d.count(limit)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    best["peak bytes"] = peak
+    best["nodes per second"] = round(best["nodes"] / max(best["all solutions seconds"], 1e-9))
+    for name in ("link seconds", "first solution seconds", "all solutions seconds"):
+        best[name] = round(best[name], 5)
+    return best
+
+
+def benchSuite(engine="auto", repeat=3):
+    return {
+        "engine": engine,
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {
+            name: _timeWorkload(matrices, limit, engine, repeat)
+            for name, (matrices, limit) in _suiteWorkloads().items()
+        },
+    }
+
+
+# The metrics of the suite which are worse when they go up
+SUITE_METRICS = ("link seconds", "first solution seconds", "all solutions seconds", "peak bytes")
+
+# Times below this are too noisy to call a regression
+SUITE_MIN_SECONDS = 0.005
+
+# Compares two results of benchSuite(). Returns a list of
+# (workload, metric, old, new, change) for every metric, where change is
+# new / old - 1, and the ones which got worse by more than `threshold`.
+# A different number of solutions is always a regression.
+def compareSuites(old, new, threshold=0.1):
+    changes = []
+    regressions = []
+    for name, newResult in new["results"].items():
+        oldResult = old["results"].get(name)
+        if oldResult is None:
+            continue
+        if oldResult["solutions"] != newResult["solutions"]:
+            regressions.append((name, "solutions", oldResult["solutions"], newResult["solutions"], None))
+        for metric in SUITE_METRICS:
+            before, after = oldResult[metric], newResult[metric]
+            change = after / before - 1 if before else 0.0
+            changes.append((name, metric, before, after, round(change, 3)))
+            if metric.endswith("seconds") and after < SUITE_MIN_SECONDS:
+                continue
+            if change > threshold:
+                regressions.append(changes[-1])
+    return changes, regressions
+
+
+BENCHMARKS = {
+    "selection": benchColumnSelection,
+    "engines": benchEngines,
+    "secondary": benchSecondaryColumns,
+    "restarts": benchRandomRestarts,
+    "compiled": benchCompiledSudoku,
+    "memory": benchMemory,
+    "components": benchComponents,
+    "loading": benchLoading,
+    "streaming": benchStreaming,
+    "bounds": benchBounds,
+    "colors": benchColors,
+    "symmetries": benchSymmetries,
+    "rowstream": benchRowStream,
+    "saveload": benchSaveLoad,
+    "budgets": benchBudgets,
+    "async": benchAsync,
+    "shared": benchShared,
+    "preprocess": benchPreprocess,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the DLX solver")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, 'suite' or any of BENCHMARKS")
+    parser.add_argument("--engine", default="auto", help="engine for the suite")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the suite to take the best of")
+    parser.add_argument("--json", help="write the results of the suite to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two JSON files written by the suite")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="how much slower or bigger counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        changes, regressions = compareSuites(old, new, args.threshold)
+        for name, metric, before, after, change in changes:
+            print(f"{name:30} {metric:24} {before:>12} {after:>12} {change:+.1%}")
+        for name, metric, before, after, change in regressions:
+            print(f"REGRESSION {name}: {metric} {before} -> {after}")
+        sys.exit(1 if regressions else 0)
+
+    for name in args.names or list(BENCHMARKS):
+        if name == "suite":
+            results = benchSuite(args.engine, args.repeat)
+            if args.json:
+                with open(args.json, "w") as f:
+                    json.dump(results, f, indent=2)
+            pprint(results)
+        else:
+            pprint(BENCHMARKS[name]())
+
+if __name__ == "__main__":
+    main()
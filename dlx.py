@@ -1,21 +1,46 @@
 #!/usr/bin/env python
 # From Donald Knuth's Paper: http://lanl.arxiv.org/pdf/cs/0011047
 
+import asyncio
+import copy
+import heapq
+import itertools
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pprint import pprint
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The color of a node while its column is purified with the same color, see
+# DLX._purify
+_PURIFIED = object()
+
 class Node:
-    NodeId = 0
+    __slots__ = ("left", "right", "up", "down", "columnHeader", "rowId", "nodeId", "color")
 
-    def __init__(self, columnHeader, rowId=None):
+    # `rowId` is the index of the row this node belongs to and `nodeId` is
+    # handed out by the DLX which links the node, so it is unique per matrix.
+    # `color` is the color the row gives a secondary column, None for none.
+    def __init__(self, columnHeader, rowId=None, nodeId=0, color=None):
         self.left = self
         self.right = self
         self.up = self
         self.down = self
         self.columnHeader = columnHeader
         self.rowId = rowId
-
-        self.nodeId = Node.NodeId
-        Node.NodeId += 1
+        self.nodeId = nodeId
+        self.color = color
 
     def insertRight(self, other):
         sRight = self.right
@@ -102,8 +127,10 @@ class Node:
 
 
 class ColumnHeader(Node):
-    def __init__(self, name):
-        super().__init__(columnHeader=self, rowId=None)
+    __slots__ = ("size", "name")
+
+    def __init__(self, name, nodeId=0):
+        super().__init__(columnHeader=self, rowId=None, nodeId=nodeId)
         self.size = 0
         self.name = name
 
@@ -113,24 +140,1904 @@ class ColumnHeader(Node):
     def __repr__(self):
         return f"ColumnHeader({self.nodeId}, {self.name})"
 
-class DLX:
+
+# Keeps the index of every active column in a bucket keyed by its size so
+# that the column with the fewest rows can be found without walking all of
+# the column headers. Ties are broken by the left-most column, the same as
+# scanning the list of column headers would. A bucket is a set of column
+# indices, and one with more than BUCKET_HEAP_MIN of them also gets a heap
+# with the left-most on top. Indices of columns which have left the bucket
+# are only popped once they get to the top, and the heap is dropped when
+# they make up half of it.
+class ColumnBuckets:
+    def __init__(self, columnHeaders):
+        self.columnHeaders = columnHeaders
+        maxSize = max([c.size for c in columnHeaders], default=0)
+        self.buckets = [set() for _ in range(maxSize + 1)]
+        # size -> heap of the bucket, or None while it hasn't got one
+        self.heaps = [None] * (maxSize + 1)
+        # No bucket below this size holds a column
+        self.lowest = 0
+
+    def add(self, columnHeader):
+        self.put(columnHeader.size, columnHeader.index)
+        if columnHeader.size < self.lowest:
+            self.lowest = columnHeader.size
+
+    def remove(self, columnHeader):
+        self.buckets[columnHeader.size].discard(columnHeader.index)
+
+    # Puts a column index in the bucket of `size`
+    def put(self, size, index):
+        bucket = self.buckets[size]
+        bucket.add(index)
+        heap = self.heaps[size]
+        if heap is not None:
+            if len(heap) > 2 * len(bucket):
+                self.heaps[size] = None
+            else:
+                heapq.heappush(heap, index)
+
+    # Returns the column with the smallest size, or None if there are no
+    # active columns left
+    def smallest(self):
+        buckets = self.buckets
+        while self.lowest < len(buckets):
+            bucket = buckets[self.lowest]
+            if bucket:
+                if len(bucket) <= BUCKET_HEAP_MIN:
+                    return self.columnHeaders[min(bucket)]
+                heap = self.heaps[self.lowest]
+                if heap is None:
+                    # a sorted list is a heap
+                    heap = self.heaps[self.lowest] = sorted(bucket)
+                while heap[0] not in bucket:
+                    heapq.heappop(heap)
+                return self.columnHeaders[heap[0]]
+            self.lowest += 1
+        return None
+
+
+# A Node which keeps the ColumnBuckets up to date as it is removed from and
+# added back to its column.
+class BucketedNode(Node):
+    __slots__ = ()
+
+    def removeUpDown(self):
+        self.up.down = self.down
+        self.down.up = self.up
+        columnHeader = self.columnHeader
+        size = columnHeader.size
+        columnHeader.size = size - 1
+        if columnHeader.active:
+            columnBuckets = columnHeader.columnBuckets
+            buckets = columnBuckets.buckets
+            buckets[size].discard(columnHeader.index)
+            if columnBuckets.heaps[size - 1] is None:
+                buckets[size - 1].add(columnHeader.index)
+            else:
+                columnBuckets.put(size - 1, columnHeader.index)
+            if size <= columnBuckets.lowest:
+                columnBuckets.lowest = size - 1
+
+    def addUpDown(self):
+        self.up.down = self
+        self.down.up = self
+        columnHeader = self.columnHeader
+        size = columnHeader.size
+        columnHeader.size = size + 1
+        if columnHeader.active:
+            columnBuckets = columnHeader.columnBuckets
+            buckets = columnBuckets.buckets
+            buckets[size].discard(columnHeader.index)
+            if columnBuckets.heaps[size + 1] is None:
+                buckets[size + 1].add(columnHeader.index)
+            else:
+                columnBuckets.put(size + 1, columnHeader.index)
+
+
+# A ColumnHeader which is only kept in the ColumnBuckets while it is in the
+# list of column headers.
+class BucketedColumnHeader(ColumnHeader):
+    __slots__ = ("index", "columnBuckets", "active")
+
+    def __init__(self, name, index, nodeId=0):
+        super().__init__(name, nodeId)
+        self.index = index
+        self.columnBuckets = None
+        self.active = False
+
+    def activate(self, columnBuckets):
+        self.columnBuckets = columnBuckets
+        self.active = True
+        columnBuckets.add(self)
+
+    def removeLeftRight(self):
+        super().removeLeftRight()
+        if self.active:
+            self.active = False
+            self.columnBuckets.remove(self)
+
+    def addLeftRight(self):
+        super().addLeftRight()
+        # secondary columns are never activated
+        if self.columnBuckets is not None:
+            self.active = True
+            self.columnBuckets.add(self)
+
+
+# A read only list of rows stored as compressed sparse row arrays: the column
+# indices of row i are indices[indptr[i]:indptr[i+1]]. Both are stored as
+# array('i') whatever sequence of integers they are given as, except int
+# memoryviews such as those of a file mapped by DLX.load() which are kept as
+# they are.
+class CSRRows:
+    def __init__(self, indptr, indices):
+        self.indptr = _intArray(indptr)
+        self.indices = _intArray(indices)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, rowIndex):
+        if rowIndex < 0:
+            rowIndex += len(self)
+        return self.indices[self.indptr[rowIndex]:self.indptr[rowIndex + 1]]
+
+    def __iter__(self):
+        indptr = self.indptr
+        indices = self.indices
+        for rowIndex in range(len(indptr) - 1):
+            yield indices[indptr[rowIndex]:indptr[rowIndex + 1]]
+
+    # memoryviews can't be pickled, so the rows are sent to other processes
+    # as arrays
+    def __reduce__(self):
+        return CSRRows, (array('i', self.indptr), array('i', self.indices))
+
+
+def _intArray(values):
+    if isinstance(values, array) and values.typecode == 'i':
+        return values
+    if isinstance(values, memoryview) and values.format == 'i':
+        return values
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return array('i', values.astype(numpy.int32).tobytes())
+    return array('i', values)
+
+
+# The rows as CSRRows, copied into arrays if they are lists
+def _toCSR(rows):
+    if isinstance(rows, CSRRows):
+        return rows
+    return CSRRows(itertools.accumulate((len(row) for row in rows), initial=0),
+                   itertools.chain.from_iterable(rows))
+
+
+# A copy of an int array or memoryview as an array('i'), copied as bytes
+def _copyInts(values):
+    copied = array('i')
+    copied.frombytes(memoryview(values).cast('B'))
+    return copied
+
+
+# Reads rows from an iterable, which may be a generator, exactly once into
+# CSRRows. Every row is checked like _checkRows and its colors are split off
+# like _splitColors as it comes, so the rows are never held as lists. The
+# arrays grow in place as the rows are appended.
+# Returns (CSRRows, colors).
+def _readRows(rows, numColumns):
+    indptr = array('i', [0])
+    indices = array('i')
+    colors = {}
+    for rowNum, row in enumerate(rows):
+        columnIndices = []
+        for entry in row:
+            if isinstance(entry, (tuple, list)):
+                entry, color = entry
+                if color is not None:
+                    colors.setdefault(rowNum, {})[entry] = color
+            if entry < 0 or entry >= numColumns:
+                raise Exception(
+                    f"Row {rowNum} uses column {entry} but there are only {numColumns} columns")
+            columnIndices.append(entry)
+        if len(set(columnIndices)) != len(columnIndices):
+            raise Exception(f"Row {rowNum} uses the same column more than once")
+        indices.extend(columnIndices)
+        indptr.append(len(indices))
+    return CSRRows(indptr, indices), colors or None
+
+
+# Raise if a row uses a column which does not exist or uses the same column
+# twice, either of which would corrupt the links.
+def _checkRows(rows, numColumns):
+    for rowNum, row in enumerate(rows):
+        for columnIndex in row:
+            if columnIndex < 0 or columnIndex >= numColumns:
+                raise Exception(
+                    f"Row {rowNum} uses column {columnIndex} but there are only {numColumns} columns")
+        if len(set(row)) != len(row):
+            raise Exception(f"Row {rowNum} uses the same column more than once")
+
+
+# Split rows which have (column, color) pairs into rows of column indices and
+# {rowIndex: {columnIndex: color}} of their colors. Rows without any pairs
+# are returned as they are, with None for the colors.
+def _splitColors(rows):
+    if isinstance(rows, CSRRows):
+        return rows, None
+    if not any(isinstance(entry, (tuple, list)) for row in rows for entry in row):
+        return rows, None
+    plainRows = []
+    colors = {}
+    for rowIndex, row in enumerate(rows):
+        plainRow = []
+        for entry in row:
+            if isinstance(entry, (tuple, list)):
+                columnIndex, color = entry
+                if color is not None:
+                    colors.setdefault(rowIndex, {})[columnIndex] = color
+                entry = columnIndex
+            plainRow.append(entry)
+        plainRows.append(plainRow)
+    return plainRows, colors or None
+
+
+# The rows with their (column, color) pairs put back, for setRows of another
+# DLX
+def _joinColors(rows, colors):
+    if not colors:
+        return rows
+    joined = []
+    for rowIndex, row in enumerate(rows):
+        rowColors = colors.get(rowIndex, {})
+        joined.append([(ci, rowColors[ci]) if ci in rowColors else ci for ci in row])
+    return joined
+
+
+# The column bounds given to setColumns as {columnIndex: (low, high)}, leaving
+# out the columns covered exactly once.
+def _checkBounds(bounds, numColumns, secondary):
+    checked = {}
+    for columnIndex, bound in bounds.items():
+        if columnIndex < 0 or columnIndex >= numColumns:
+            raise Exception(f"Column {columnIndex} is not one of the {numColumns} columns")
+        if columnIndex in secondary:
+            raise Exception(f"Secondary column {columnIndex} can't have bounds")
+        if isinstance(bound, int):
+            bound = (bound, bound)
+        low, high = bound
+        if low < 0 or high < max(low, 1):
+            raise Exception(f"The bounds of column {columnIndex} must have 0 <= low <= high and high >= 1")
+        if (low, high) != (1, 1):
+            checked[columnIndex] = (low, high)
+    return checked
+
+
+# The same checks as _checkRows for rows given as CSR arrays, plus the
+# shape of the arrays themselves. Done in one vectorized pass with numpy.
+def _checkRowArrays(indptr, indices, numColumns):
+    if len(indptr) == 0 or indptr[0] != 0 or indptr[-1] != len(indices):
+        raise Exception("indptr must start at 0 and end at the number of indices")
+    if numpy is None:
+        for rowNum in range(len(indptr) - 1):
+            if indptr[rowNum + 1] < indptr[rowNum]:
+                raise Exception(f"indptr decreases at row {rowNum}")
+        _checkRows(CSRRows(indptr, indices), numColumns)
+        return
+
+    indptr = numpy.frombuffer(indptr, dtype=numpy.int32)
+    indices = numpy.frombuffer(indices, dtype=numpy.int32)
+    counts = numpy.diff(indptr)
+    if numpy.any(counts < 0):
+        raise Exception(f"indptr decreases at row {int(numpy.argmax(counts < 0))}")
+    if len(indices) == 0:
+        return
+    rowOfEntry = numpy.repeat(numpy.arange(len(counts)), counts)
+    bad = (indices < 0) | (indices >= numColumns)
+    if numpy.any(bad):
+        k = int(numpy.argmax(bad))
+        raise Exception(
+            f"Row {rowOfEntry[k]} uses column {indices[k]} but there are only {numColumns} columns")
+    keys = numpy.sort(rowOfEntry.astype(numpy.int64) * numColumns + indices)
+    repeated = keys[1:] == keys[:-1]
+    if numpy.any(repeated):
+        rowNum = keys[int(numpy.argmax(repeated))] // numColumns
+        raise Exception(f"Row {rowNum} uses the same column more than once")
+
+
+# The links of the "array" engine saved by DLX.save() only point at the
+# nodes, columns and rows of a matrix of this shape. Done in one vectorized
+# pass per array with numpy.
+def _checkLinks(links, numColumns, numRows):
+    top, ulink, dlink, length, rowStart = links
+    numNodes = len(top)
+    for values, low, high in ((top, -numRows, numColumns), (ulink, 0, numNodes - 1),
+                              (dlink, 0, numNodes - 1), (length, 0, numRows),
+                              (rowStart, 0, numNodes - 1)):
+        if len(values) == 0:
+            continue
+        if numpy is None:
+            bad = any(x < low or x > high for x in values)
+        else:
+            values = numpy.frombuffer(values, dtype=numpy.int32)
+            bad = values.min() < low or values.max() > high
+        if bad:
+            raise Exception("The links in the matrix file point outside of it")
+
+
+# The same dancing links as Node/ColumnHeader, but stored in flat integer
+# arrays using the layout of Knuth's DLX1 program. Index 0 is the root of the
+# column list and indices 1..N are the column headers. The nodes of every row
+# are stored next to each other and each row is followed by a spacer node
+# whose `top` is -(rowNumber+1). A spacer's `ulink` points at the first node
+# of the row before it and its `dlink` at the last node of the row after it,
+# which lets us walk around a row without any left/right links.
+#
+# Column handles are header indices and row handles are node indices, so the
+# search in DLX can drive this engine exactly like it drives the Node graph.
+class ArrayEngine:
+    # `links` are the (top, ulink, dlink, length, rowStart) of an ArrayEngine
+    # of the same matrix, as saved by DLX.save(), which are used instead of
+    # linking the rows again
+    def __init__(self, columns, rows, secondary=(), links=None):
+        numColumns = len(columns)
+        self.names = columns
+        # Number of links removed by _coverColumn, Knuth's "updates"
+        self.updates = 0
+
+        # left-right links of the column headers. Secondary columns are
+        # linked to themselves so they are never chosen.
+        self.llink = array('i', range(numColumns + 1))
+        self.rlink = array('i', range(numColumns + 1))
+        last = 0
+        for x in range(1, numColumns + 1):
+            if x - 1 in secondary:
+                continue
+            self.rlink[last] = x
+            self.llink[x] = last
+            last = x
+        self.rlink[last] = 0
+        self.llink[0] = last
+
+        if links is not None:
+            self.top, self.ulink, self.dlink, self.length, self.rowStart = links
+        elif numpy is not None and isinstance(rows, CSRRows) and len(rows.indices) > 0:
+            # without any entries there are no columns to link with numpy
+            self._linkArrays(numColumns, rows.indptr, rows.indices)
+        else:
+            self._linkRows(numColumns, rows)
+
+    # A new engine for the same matrix for a search which runs at the same
+    # time as the searches of this one. The arrays no search changes, top
+    # and rowStart, are shared and the links and lengths are copied. Must
+    # not be called while this engine is searching.
+    def copy(self):
+        other = copy.copy(self)
+        for name in ("llink", "rlink", "ulink", "dlink", "length"):
+            setattr(other, name, _copyInts(getattr(self, name)))
+        other.updates = 0
+        return other
+
+    def _linkRows(self, numColumns, rows):
+        self.length = array('i', [0]) * (numColumns + 1)
+
+        # up-down links of every node, including the headers and spacers
+        self.top = array('i', [0]) * (numColumns + 1)
+        self.ulink = array('i', range(numColumns + 1))
+        self.dlink = array('i', range(numColumns + 1))
+
+        top = self.top
+        ulink = self.ulink
+        dlink = self.dlink
+        length = self.length
+
+        # the first spacer
+        spacer = len(top)
+        top.append(0)
+        ulink.append(0)
+        dlink.append(0)
+
+        # first node of every row
+        self.rowStart = array('i')
+
+        for rowNum, row in enumerate(rows):
+            start = len(top)
+            self.rowStart.append(start)
+            for columnIndex in row:
+                x = columnIndex + 1
+                p = len(top)
+                last = ulink[x]
+                top.append(x)
+                ulink.append(last)
+                dlink.append(x)
+                dlink[last] = p
+                ulink[x] = p
+                length[x] += 1
+
+            dlink[spacer] = len(top) - 1
+            spacer = len(top)
+            top.append(-(rowNum + 1))
+            ulink.append(start)
+            dlink.append(0)
+
+    # Builds the same links as _linkRows straight from the CSR arrays of the
+    # rows with numpy, without a Python loop over the entries. Everything is
+    # int32 like the arrays it ends up in, and each array is converted as soon
+    # as it is done, which keeps the peak memory close to the links alone.
+    def _linkArrays(self, numColumns, indptr, indices):
+        int32 = numpy.int32
+        indptr = numpy.frombuffer(indptr, dtype=int32)
+        indices = numpy.frombuffer(indices, dtype=int32)
+        numRows = len(indptr) - 1
+        rowNums = numpy.arange(numRows, dtype=int32)
+        firstNode = numColumns + 2
+        size = firstNode + len(indices) + numRows
+
+        def toArray(values):
+            return array('i', values.astype(int32, copy=False).tobytes())
+
+        # Every row is followed by a spacer, so entry k of row i lives at
+        # firstNode + k + i
+        nodes = numpy.repeat(rowNums, numpy.diff(indptr))
+        nodes += firstNode + numpy.arange(len(indices), dtype=int32)
+        rowStart = firstNode + indptr[:-1] + rowNums
+        spacers = firstNode + indptr[1:] + rowNums
+
+        top = numpy.zeros(size, dtype=int32)
+        top[nodes] = indices + 1
+        top[spacers] = -(rowNums + 1)
+        self.top = toArray(top)
+        del top
+
+        # Link every column from top to bottom, in row order
+        order = numpy.argsort(indices, kind="stable")
+        columnOf = indices[order] + 1
+        nodeOf = nodes[order]
+        del order, nodes
+        firstOfColumn = numpy.concatenate(([True], columnOf[1:] != columnOf[:-1]))
+        lastOfColumn = numpy.concatenate((columnOf[:-1] != columnOf[1:], [True]))
+
+        ulink = numpy.zeros(size, dtype=int32)
+        ulink[:numColumns + 1] = numpy.arange(numColumns + 1, dtype=int32)
+        ulink[nodeOf[1:]] = nodeOf[:-1]
+        ulink[nodeOf[firstOfColumn]] = columnOf[firstOfColumn]
+        ulink[columnOf[lastOfColumn]] = nodeOf[lastOfColumn]
+        # A spacer points up to the first node of the row before it
+        ulink[spacers] = rowStart
+        self.ulink = toArray(ulink)
+        del ulink
+
+        dlink = numpy.zeros(size, dtype=int32)
+        dlink[:numColumns + 1] = numpy.arange(numColumns + 1, dtype=int32)
+        dlink[nodeOf[:-1]] = nodeOf[1:]
+        dlink[nodeOf[lastOfColumn]] = columnOf[lastOfColumn]
+        dlink[columnOf[firstOfColumn]] = nodeOf[firstOfColumn]
+        # and down to the last node of the row after it
+        if numRows > 0:
+            dlink[firstNode - 1] = spacers[0] - 1
+            dlink[spacers[:-1]] = spacers[1:] - 1
+        self.dlink = toArray(dlink)
+        del dlink
+
+        self.length = toArray(numpy.bincount(indices + 1, minlength=numColumns + 1))
+        self.rowStart = toArray(rowStart)
+
+    def _chooseColumn(self):
+        rlink = self.rlink
+        length = self.length
+        bestColumn = rlink[0]
+        bestSize = length[bestColumn]
+        x = rlink[bestColumn]
+        while x != 0 and bestSize > 1:
+            if length[x] < bestSize:
+                bestColumn = x
+                bestSize = length[x]
+            x = rlink[x]
+        return bestColumn
+
+    def _columnSize(self, column):
+        return self.length[column]
+
+    def _activeColumns(self):
+        rlink = self.rlink
+        x = rlink[0]
+        while x != 0:
+            yield x
+            x = rlink[x]
+
+    def _columnRows(self, column):
+        dlink = self.dlink
+        p = dlink[column]
+        while p != column:
+            yield p
+            p = dlink[p]
+
+    def _rowNode(self, rowIndex):
+        start = self.rowStart[rowIndex]
+        if self.top[start] <= 0:
+            # an empty row
+            return None
+        return start
+
+    def _columnOf(self, rowNode):
+        return self.top[rowNode]
+
+    def _rowIndex(self, rowNode):
+        top = self.top
+        while top[rowNode] > 0:
+            rowNode += 1
+        return -top[rowNode] - 1
+
+    def _coverRow(self, rowNode):
+        top = self.top
+        ulink = self.ulink
+        q = rowNode + 1
+        while q != rowNode:
+            x = top[q]
+            if x <= 0:
+                q = ulink[q]
+            else:
+                self._coverColumn(x)
+                q += 1
+
+    def _uncoverRow(self, rowNode):
+        top = self.top
+        dlink = self.dlink
+        q = rowNode - 1
+        while q != rowNode:
+            x = top[q]
+            if x <= 0:
+                q = dlink[q]
+            else:
+                self._uncoverColumn(x)
+                q -= 1
+
+    def _coverColumn(self, column):
+        llink = self.llink
+        rlink = self.rlink
+        top = self.top
+        ulink = self.ulink
+        dlink = self.dlink
+        length = self.length
+
+        updates = 0
+        left = llink[column]
+        right = rlink[column]
+        rlink[left] = right
+        llink[right] = left
+
+        p = dlink[column]
+        while p != column:
+            q = p + 1
+            while q != p:
+                x = top[q]
+                if x <= 0:
+                    q = ulink[q]
+                else:
+                    up = ulink[q]
+                    down = dlink[q]
+                    dlink[up] = down
+                    ulink[down] = up
+                    length[x] -= 1
+                    q += 1
+                    updates += 1
+            p = dlink[p]
+        self.updates += updates
+
+    def _uncoverColumn(self, column):
+        llink = self.llink
+        rlink = self.rlink
+        top = self.top
+        ulink = self.ulink
+        dlink = self.dlink
+        length = self.length
+
+        p = ulink[column]
+        while p != column:
+            q = p - 1
+            while q != p:
+                x = top[q]
+                if x <= 0:
+                    q = dlink[q]
+                else:
+                    dlink[ulink[q]] = q
+                    ulink[dlink[q]] = q
+                    length[x] += 1
+                    q -= 1
+            p = ulink[p]
+
+        rlink[llink[column]] = column
+        llink[rlink[column]] = column
+
+    def _columnsAreCovered(self):
+        return self.rlink[0] == 0
+
+
+# Exact cover with multiplicities, Knuth's Algorithm M. Each column i must
+# be covered between low and high times: `bound[i]` is how many more rows may
+# still cover it (high minus the rows chosen so far) and `slack[i]` is
+# high - low, so the column still needs bound[i] - slack[i] rows. Secondary
+# columns are columns with bounds (0, 1) which are never chosen.
+#
+# The rows of the chosen column i are tried in order. While i may take more
+# rows, a row which is tried is "tweaked": taken out of i's list and hidden
+# from every other column, so later branches of the same level never choose
+# it again and every solution is found once. The last branch of a column
+# whose lower bound is met is to use no more of its rows. Column handles are
+# header indices and row handles node indices, the same as ArrayEngine.
+class MultiplicityEngine(ArrayEngine):
+    def __init__(self, columns, rows, secondary=(), bounds=None):
+        super().__init__(columns, rows, secondary)
+        bounds = bounds or {}
+        self.bound = array('i', [1]) * (len(columns) + 1)
+        self.slack = array('i', [0]) * (len(columns) + 1)
+        for columnIndex in range(len(columns)):
+            low, high = bounds.get(columnIndex, (1, 1))
+            if columnIndex in secondary:
+                low, high = 0, 1
+            self.bound[columnIndex + 1] = high
+            self.slack[columnIndex + 1] = high - low
+
+    def copy(self):
+        other = super().copy()
+        other.bound = _copyInts(self.bound)
+        other.slack = _copyInts(self.slack)
+        return other
+
+    # The active column with the fewest ways to go on, which is the number of
+    # its rows plus one for not using any more of them, less the rows it
+    # still needs. None when some column can't get the rows it needs.
+    def _chooseColumn(self):
+        rlink = self.rlink
+        length = self.length
+        bound = self.bound
+        slack = self.slack
+        bestColumn = None
+        bestBranches = None
+        x = rlink[0]
+        while x != 0:
+            branches = length[x] + 1 - max(bound[x] - slack[x], 0)
+            if bestColumn is None or branches < bestBranches:
+                bestColumn = x
+                bestBranches = branches
+                if branches <= 0:
+                    return None
+            x = rlink[x]
+        return bestColumn
+
+    # Unlink the nodes of a row, other than rowNode, from their columns
+    def _hideRow(self, rowNode):
+        top = self.top
+        ulink = self.ulink
+        dlink = self.dlink
+        length = self.length
+        q = rowNode + 1
+        while q != rowNode:
+            x = top[q]
+            if x <= 0:
+                q = ulink[q]
+            else:
+                up = ulink[q]
+                down = dlink[q]
+                dlink[up] = down
+                ulink[down] = up
+                length[x] -= 1
+                self.updates += 1
+                q += 1
+
+    def _unhideRow(self, rowNode):
+        top = self.top
+        ulink = self.ulink
+        dlink = self.dlink
+        length = self.length
+        q = rowNode - 1
+        while q != rowNode:
+            x = top[q]
+            if x <= 0:
+                q = dlink[q]
+            else:
+                dlink[ulink[q]] = q
+                ulink[dlink[q]] = q
+                length[x] += 1
+                q -= 1
+
+    # Use a row for every column it has other than the one of rowNode
+    def _commitRow(self, rowNode):
+        top = self.top
+        ulink = self.ulink
+        bound = self.bound
+        q = rowNode + 1
+        while q != rowNode:
+            x = top[q]
+            if x <= 0:
+                q = ulink[q]
+            else:
+                bound[x] -= 1
+                if bound[x] == 0:
+                    self._coverColumn(x)
+                q += 1
+
+    def _uncommitRow(self, rowNode):
+        top = self.top
+        dlink = self.dlink
+        bound = self.bound
+        q = rowNode - 1
+        while q != rowNode:
+            x = top[q]
+            if x <= 0:
+                q = dlink[q]
+            else:
+                bound[x] += 1
+                if bound[x] == 1:
+                    self._uncoverColumn(x)
+                q -= 1
+
+    # Take rowNode, the first row of `column`, out of the column's list. It is
+    # also hidden from its other columns unless `column` was covered, which
+    # already hid it.
+    def _tweak(self, rowNode, column):
+        if self.bound[column] != 0:
+            self._hideRow(rowNode)
+        down = self.dlink[rowNode]
+        self.dlink[column] = down
+        self.ulink[down] = column
+        self.length[column] -= 1
+
+    # Put back every row tweaked out of `column` since `first`
+    def _untweak(self, first, column):
+        dlink = self.dlink
+        ulink = self.ulink
+        last = dlink[column]
+        tweaked = []
+        x = first
+        while x != last:
+            tweaked.append(x)
+            x = dlink[x]
+        dlink[column] = first
+        up = column
+        for x in tweaked:
+            ulink[x] = up
+            up = x
+        ulink[last] = up
+        self.length[column] += len(tweaked)
+        if self.bound[column] != 0:
+            for x in reversed(tweaked):
+                self._unhideRow(x)
+        else:
+            self._uncoverColumn(column)
+
+    # Choose a row given as part of the solution: hide it and use it for all
+    # of its columns. Returns False, with nothing changed, if one of them
+    # can't be covered again.
+    def _chooseRow(self, rowNode):
+        top = self.top
+        bound = self.bound
+        q = rowNode
+        while top[q] > 0:
+            if bound[top[q]] == 0:
+                return False
+            q += 1
+        column = top[rowNode]
+        self._hideRow(rowNode)
+        up = self.ulink[rowNode]
+        down = self.dlink[rowNode]
+        self.dlink[up] = down
+        self.ulink[down] = up
+        self.length[column] -= 1
+        bound[column] -= 1
+        if bound[column] == 0:
+            self._coverColumn(column)
+        self._commitRow(rowNode)
+        return True
+
+    def _unchooseRow(self, rowNode):
+        column = self.top[rowNode]
+        self._uncommitRow(rowNode)
+        self.bound[column] += 1
+        if self.bound[column] == 1:
+            self._uncoverColumn(column)
+        self.dlink[self.ulink[rowNode]] = rowNode
+        self.ulink[self.dlink[rowNode]] = rowNode
+        self.length[column] += 1
+        self._unhideRow(rowNode)
+
+    # Knuth's steps M2 to M9 without recursion. Every level of the stack is
+    # [column, current row, first row tweaked]. The current row is the column
+    # itself for the branch which uses no more of its rows.
+    def search(self, stats=None, countOnly=False, budget=None):
+        rlink = self.rlink
+        llink = self.llink
+        dlink = self.dlink
+        bound = self.bound
+        slack = self.slack
+        if stats is not None:
+            stats._start(self.updates)
+
+        levels = []
+        step = "enter"
+        nodesLeft = None if budget is None else budget.nodesUntilCheck()
+        try:
+            while True:
+                if step == "enter":
+                    if nodesLeft is not None:
+                        nodesLeft -= 1
+                        if nodesLeft < 0:
+                            nodesLeft = budget.nodesUntilCheck() - 1
+                            if nodesLeft < 0:
+                                return
+                    if stats is not None:
+                        stats._visit(len(levels), self.updates)
+                    if rlink[0] == 0:
+                        if stats is not None:
+                            stats._solution()
+                        if countOnly:
+                            yield None
+                        else:
+                            yield [self._rowIndex(x) for column, x, _ in levels if x != column]
+                        step = "leave"
+                        continue
+                    column = self._chooseColumn()
+                    if stats is not None and column is not None:
+                        stats._chose(self.length[column])
+                    if column is None:
+                        step = "leave"
+                        continue
+                    x = dlink[column]
+                    bound[column] -= 1
+                    if bound[column] == 0:
+                        self._coverColumn(column)
+                    levels.append([column, x, x])
+                    step = "try"
+
+                elif step == "try":
+                    column, x, _ = levels[-1]
+                    if bound[column] == 0 and slack[column] == 0:
+                        # the last row the column takes, as in plain DLX
+                        if x == column:
+                            step = "restore"
+                            continue
+                    elif self.length[column] <= bound[column] - slack[column]:
+                        # too few rows left for the column
+                        step = "restore"
+                        continue
+                    elif x != column:
+                        self._tweak(x, column)
+                    elif bound[column] != 0:
+                        # use no more rows of this column
+                        rlink[llink[column]] = rlink[column]
+                        llink[rlink[column]] = llink[column]
+                    if x != column:
+                        self._commitRow(x)
+                    step = "enter"
+
+                elif step == "restore":
+                    column, x, first = levels.pop()
+                    if bound[column] == 0 and slack[column] == 0:
+                        self._uncoverColumn(column)
+                    else:
+                        self._untweak(first, column)
+                    bound[column] += 1
+                    step = "leave"
+
+                else:
+                    # leave the level, back to the one above it
+                    if not levels:
+                        return
+                    frame = levels[-1]
+                    column, x, _ = frame
+                    if x == column:
+                        if bound[column] != 0:
+                            rlink[llink[column]] = column
+                            llink[rlink[column]] = column
+                        step = "restore"
+                    else:
+                        self._uncommitRow(x)
+                        frame[1] = dlink[x]
+                        step = "try"
+        finally:
+            # put every link back if the search is stopped early
+            while levels:
+                column, x, first = levels.pop()
+                if x != column:
+                    self._uncommitRow(x)
+                elif bound[column] != 0:
+                    rlink[llink[column]] = column
+                    llink[rlink[column]] = column
+                if bound[column] == 0 and slack[column] == 0:
+                    self._uncoverColumn(column)
+                else:
+                    self._untweak(first, column)
+                bound[column] += 1
+            if nodesLeft is not None:
+                budget.giveBack(nodesLeft)
+            if stats is not None:
+                stats._finish(self.updates)
+
+
+# Exact cover with Python ints as bitsets, for matrices with at most a few
+# hundred columns where linking nodes costs more than the search itself.
+# Bit r of columnRows[c] is set when row r has column c, so covering a row is
+# a couple of AND/NOTs on the bitsets of the rows still available and the
+# columns still to cover. Every cover pushes those two ints on a stack and
+# every uncover pops them, which works because the search always uncovers in
+# the reverse order.
+#
+# Column handles are column indices and row handles are row indices. Columns
+# are tried from the lowest index and rows from the lowest index, the same
+# order as the linked engines, so the solutions come out in the same order.
+# `updates` counts the rows removed while covering instead of links.
+#
+# Colors from DLX.setRows only change which rows conflict: rows which give a
+# column the same color don't, so choosing a row purifies its colored columns
+# without any extra work.
+class BitsetEngine:
+    def __init__(self, columns, rows, secondary=(), colors=None):
+        numColumns = len(columns)
+        self.names = columns
+        self.updates = 0
+
+        self.rowColumns = []
+        columnRows = [0] * numColumns
+        for rowIndex, row in enumerate(rows):
+            mask = 0
+            for columnIndex in row:
+                mask |= 1 << columnIndex
+                columnRows[columnIndex] |= 1 << rowIndex
+            self.rowColumns.append(mask)
+        self.columnRows = columnRows
+
+        # the rows which give a column a color, by (column, color)
+        colors = colors or {}
+        colorRows = {}
+        for rowIndex, rowColors in colors.items():
+            for columnIndex, color in rowColors.items():
+                key = (columnIndex, color)
+                colorRows[key] = colorRows.get(key, 0) | (1 << rowIndex)
+
+        # every row which shares a column with row r, including r, other than
+        # the ones which give it the same color
+        self.rowConflicts = []
+        for rowIndex, mask in enumerate(self.rowColumns):
+            rowColors = colors.get(rowIndex, {})
+            conflicts = 1 << rowIndex
+            while mask:
+                low = mask & -mask
+                columnIndex = low.bit_length() - 1
+                if columnIndex in rowColors:
+                    conflicts |= columnRows[columnIndex] & ~colorRows[columnIndex, rowColors[columnIndex]]
+                else:
+                    conflicts |= columnRows[columnIndex]
+                mask ^= low
+            self.rowConflicts.append(conflicts)
+
+        self.activeRows = (1 << len(self.rowColumns)) - 1
+        self.uncoveredColumns = 0
+        for columnIndex in range(numColumns):
+            if columnIndex not in secondary:
+                self.uncoveredColumns |= 1 << columnIndex
+        # the rows a column had when it was covered, which the search walks
+        self.columnCandidates = [0] * numColumns
+        self.saved = []
+
+    # A new engine for the same matrix, see ArrayEngine.copy. Only the
+    # bitsets of the search are its own, the ones of the rows are shared.
+    def copy(self):
+        other = copy.copy(self)
+        other.columnCandidates = list(self.columnCandidates)
+        other.saved = []
+        other.updates = 0
+        return other
+
+    def _chooseColumn(self):
+        activeRows = self.activeRows
+        columnRows = self.columnRows
+        columns = self.uncoveredColumns
+        bestColumn = None
+        bestSize = None
+        while columns:
+            low = columns & -columns
+            column = low.bit_length() - 1
+            size = (activeRows & columnRows[column]).bit_count()
+            if bestColumn is None or size < bestSize:
+                bestColumn = column
+                bestSize = size
+                # a column can't do better than a single row
+                if size <= 1:
+                    break
+            columns ^= low
+        return bestColumn
+
+    def _columnSize(self, column):
+        return (self.activeRows & self.columnRows[column]).bit_count()
+
+    def _activeColumns(self):
+        columns = self.uncoveredColumns
+        while columns:
+            low = columns & -columns
+            yield low.bit_length() - 1
+            columns ^= low
+
+    def _columnRows(self, column):
+        rows = self.columnCandidates[column]
+        while rows:
+            low = rows & -rows
+            yield low.bit_length() - 1
+            rows ^= low
+
+    def _rowNode(self, rowIndex):
+        if self.rowColumns[rowIndex] == 0:
+            # an empty row
+            return None
+        return rowIndex
+
+    def _columnOf(self, rowNode):
+        mask = self.rowColumns[rowNode]
+        return (mask & -mask).bit_length() - 1
+
+    def _rowIndex(self, rowNode):
+        return rowNode
+
+    def _coverRow(self, rowNode):
+        activeRows = self.activeRows
+        self.saved.append((activeRows, self.uncoveredColumns))
+        removed = activeRows & self.rowConflicts[rowNode]
+        self.updates += removed.bit_count()
+        self.activeRows = activeRows ^ removed
+        self.uncoveredColumns &= ~self.rowColumns[rowNode]
+
+    def _uncoverRow(self, rowNode):
+        self.activeRows, self.uncoveredColumns = self.saved.pop()
+
+    # _coverRow already keeps the rows with the same colors
+    def _purify(self, rowNode):
+        pass
+
+    def _unpurify(self, rowNode):
+        pass
+
+    def _coverColumn(self, column):
+        activeRows = self.activeRows
+        self.saved.append((activeRows, self.uncoveredColumns))
+        removed = activeRows & self.columnRows[column]
+        self.columnCandidates[column] = removed
+        self.updates += removed.bit_count()
+        self.activeRows = activeRows ^ removed
+        self.uncoveredColumns &= ~(1 << column)
+
+    def _uncoverColumn(self, column):
+        self.activeRows, self.uncoveredColumns = self.saved.pop()
+
+    def _columnsAreCovered(self):
+        return self.uncoveredColumns == 0
+
+
+# Counters collected while searching, in the spirit of the statistics
+# Knuth's DLX programs print.
+class SearchStats:
+    def __init__(self):
+        # nodes[d] is the number of search nodes visited at depth d, the
+        # root of the search tree is at depth 0
+        self.nodes = []
+        # The number of links removed while covering columns, in total and
+        # by the depth of the search node which covered them
+        self.updates = 0
+        self.depthUpdates = []
+        # columnSizes[n] is how many times the column chosen to branch on had
+        # n rows left, 0 being a dead end
+        self.columnSizes = {}
+        self.solutions = 0
+        # Wall clock time from the start of the search to its end and to the
+        # first solution. This includes any time the caller spends between
+        # solutions.
+        self.seconds = 0.0
+        self.firstSolutionSeconds = None
+
+        self._startTime = None
+        self._startUpdates = 0
+        self._lastDepth = 0
+        self._lastUpdates = 0
+
+    def _start(self, updates):
+        self._startTime = time.perf_counter()
+        self._startUpdates = updates
+        self._lastDepth = 0
+        self._lastUpdates = updates
+
+    # Every update between visiting a node and visiting the next one is done
+    # by the first node, covering its row and then the column it branches on
+    def _visit(self, depth, updates=None):
+        # a resumed search can start deep in the tree
+        while len(self.nodes) <= depth:
+            self.nodes.append(0)
+        self.nodes[depth] += 1
+        if updates is not None:
+            self._addUpdates(updates)
+            self._lastDepth = depth
+
+    def _addUpdates(self, updates):
+        depth = self._lastDepth
+        while len(self.depthUpdates) <= depth:
+            self.depthUpdates.append(0)
+        self.depthUpdates[depth] += updates - self._lastUpdates
+        self._lastUpdates = updates
+
+    def _chose(self, size):
+        self.columnSizes[size] = self.columnSizes.get(size, 0) + 1
+
+    def _solution(self):
+        self.solutions += 1
+        if self.firstSolutionSeconds is None:
+            self.firstSolutionSeconds = time.perf_counter() - self._startTime
+
+    def _finish(self, updates):
+        self._addUpdates(updates)
+        self.updates += updates - self._startUpdates
+        self.seconds += time.perf_counter() - self._startTime
+
+    # Adds the counters of another search, such as one of the components of
+    # the matrix
+    def _add(self, other):
+        for name in ("nodes", "depthUpdates"):
+            mine = getattr(self, name)
+            for depth, n in enumerate(getattr(other, name)):
+                if depth == len(mine):
+                    mine.append(0)
+                mine[depth] += n
+        for size, n in other.columnSizes.items():
+            self.columnSizes[size] = self.columnSizes.get(size, 0) + n
+        self.updates += other.updates
+        self.solutions += other.solutions
+        self.seconds += other.seconds
+
+    def totalNodes(self):
+        return sum(self.nodes)
+
+    # The average number of rows tried by the nodes at each depth
+    def branchingFactors(self):
+        return [
+            self.nodes[depth + 1] / self.nodes[depth]
+            for depth in range(len(self.nodes) - 1)
+        ]
+
+    def asDict(self):
+        return {
+            "nodes": list(self.nodes),
+            "totalNodes": self.totalNodes(),
+            "branchingFactors": self.branchingFactors(),
+            "updates": self.updates,
+            "depthUpdates": list(self.depthUpdates),
+            "columnSizes": dict(sorted(self.columnSizes.items())),
+            "solutions": self.solutions,
+            "seconds": self.seconds,
+            "firstSolutionSeconds": self.firstSolutionSeconds,
+        }
+
+    def toJson(self, **kwargs):
+        return json.dumps(self.asDict(), **kwargs)
+
+
+"""
+A flag which stops a running solve() or count() when it is given as their
+`cancel` argument. cancel() can be called from any thread, the search
+notices within BUDGET_CHECK_NODES rows and leaves the matrix as it was.
+"""
+class CancelToken:
     def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def isCancelled(self):
+        return self._event.is_set()
+
+
+# The limits of a search: the rows it may still try, a time.monotonic()
+# deadline and a CancelToken. Searches take the rows they may try in steps of
+# at most BUDGET_CHECK_NODES and call nodesUntilCheck() for the next step, so
+# the deadline and the token cost nothing on every row. The searches of the
+# components of a matrix share one budget.
+class _Budget:
+    def __init__(self, maxNodes=None, timeout=None, cancel=None):
+        self.nodesLeft = maxNodes
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.cancel = cancel
+        # Why the search was stopped: "nodes", "timeout" or "cancelled"
+        self.stopReason = None
+
+    # The number of rows which may be tried before calling this again, 0
+    # once the budget has run out and stopReason is set
+    def nodesUntilCheck(self):
+        if self.stopReason is None:
+            if self.cancel is not None and self.cancel.isCancelled():
+                self.stopReason = "cancelled"
+            elif self.deadline is not None and time.monotonic() >= self.deadline:
+                self.stopReason = "timeout"
+            elif self.nodesLeft is not None and self.nodesLeft <= 0:
+                self.stopReason = "nodes"
+        if self.stopReason is not None:
+            return 0
+        step = BUDGET_CHECK_NODES
+        if self.nodesLeft is not None:
+            step = min(step, self.nodesLeft)
+            self.nodesLeft -= step
+        return step
+
+    # Hands back the rows of a step a search didn't use
+    def giveBack(self, nodes):
+        if self.nodesLeft is not None and nodes > 0:
+            self.nodesLeft += nodes
+
+
+"""
+A matrix linked once by DLX.compileShared() which is never changed again,
+so that many searches can share it, in as many threads. Every search gets
+its own DLX from solver() with copies of the few arrays a search changes,
+which costs a copy of the links instead of linking the rows again. The
+rows, the arrays which never change and a preprocess Reduction are shared.
+"""
+class CompiledMatrix:
+    def __init__(self, template):
+        # The linked DLX which is copied and never searched itself
+        self._template = template
+
+    """
+    Returns a new DLX which searches this matrix. It has all the usual
+    methods, such as solve(), count() and checkpoint(), and must only be used
+    by one thread at a time.
+
+    Return: DLX object
+    """
+    def solver(self):
+        template = self._template
+        d = DLX(template.engine, preprocess=template.preprocess)
+        d.setColumns(template.columns, template.secondary, template.bounds)
+        d.rows = template.rows
+        d.colors = template.colors
+        d.symmetries = template.symmetries
+        d.reduction = template.reduction
+        d._rowsChecked = True
+        d._engine = template._engine.copy()
+        d.compiled = True
+        return d
+
+    """
+    solve() with a new solver(), see DLX.solve for the arguments
+    """
+    def solve(self, partial=None, **options):
+        yield from self.solver().solve(partial, **options)
+
+    """
+    count() with a new solver(), see DLX.count for the arguments
+    """
+    def count(self, limit=None, partial=None, **options):
+        return self.solver().count(limit, partial, **options)
+
+
+# Shrinks a matrix before it is linked and maps the solutions of the smaller
+# matrix back to the rows of the original one. Until nothing changes:
+#   - a primary column with a single row forces that row into every solution,
+#     so the row is taken out along with its columns and every row it clashes
+#     with
+#   - a row which clashes with every row of some primary column it doesn't
+#     have can't be in any solution and is removed
+# Empty rows are removed, and so are rows with the same columns as an earlier
+# row. Those duplicates are alternatives for the earlier row in every
+# solution which uses it. A primary column which runs out of rows makes the
+# matrix `infeasible`, it is left in so the search finds no solutions.
+#
+# The reduced matrix is `columns`, `rows` and `secondary`. Row i of it is
+# row rowMap[i] of the original matrix.
+class Reduction:
+    def __init__(self, columns, rows, secondary=()):
+        numColumns = len(columns)
+        self.numRows = len(rows)
+        self.forcedRows = []
+        self.deadRows = []
+        self.duplicateRows = []
+        self.emptyRows = []
+        self.infeasible = False
+        # original index of a row -> the rows which can take its place,
+        # including itself, when it has duplicates
+        self.alternatives = {}
+        self._representative = {}
+
+        rowColumns = [0] * len(rows)
+        columnRows = [0] * numColumns
+        alive = 0
+        seen = {}
+        for rowIndex, row in enumerate(rows):
+            if len(row) == 0:
+                self.emptyRows.append(rowIndex)
+                continue
+            key = frozenset(row)
+            if key in seen:
+                first = seen[key]
+                self.duplicateRows.append(rowIndex)
+                self.alternatives.setdefault(first, [first]).append(rowIndex)
+                self._representative[rowIndex] = first
+                continue
+            seen[key] = rowIndex
+            for columnIndex in row:
+                rowColumns[rowIndex] |= 1 << columnIndex
+                columnRows[columnIndex] |= 1 << rowIndex
+            alive |= 1 << rowIndex
+
+        uncovered = 0
+        for columnIndex in range(numColumns):
+            if columnIndex not in secondary:
+                uncovered |= 1 << columnIndex
+        covered = 0
+
+        # A column is checked again only when some of its rows are removed:
+        # a single row left is forced, and rows which conflict with every row
+        # left can't be in any solution, as they would leave it uncovered.
+        work = uncovered
+        while work:
+            low = work & -work
+            work ^= low
+            if not uncovered & low:
+                continue
+            columnIndex = low.bit_length() - 1
+            candidates = alive & columnRows[columnIndex]
+            if candidates == 0:
+                self.infeasible = True
+                break
+            if candidates & (candidates - 1) == 0:
+                rowIndex = candidates.bit_length() - 1
+                self.forcedRows.append(rowIndex)
+                alive ^= candidates
+                removed = alive & self._conflicts(rowColumns[rowIndex], columnRows)
+                covered |= rowColumns[rowIndex]
+                uncovered &= ~rowColumns[rowIndex]
+            else:
+                removed = alive & ~columnRows[columnIndex]
+                pending = candidates
+                while pending and removed:
+                    row = pending & -pending
+                    pending ^= row
+                    removed &= self._conflicts(rowColumns[row.bit_length() - 1], columnRows)
+            if removed:
+                self._removeRows(removed)
+                alive ^= removed
+                work |= uncovered & self._columns(removed, rowColumns)
+
+        self.forcedRows.sort()
+        self.deadRows.sort()
+        self.removedColumns = [ci for ci in range(numColumns) if covered >> ci & 1]
+
+        newColumn = {}
+        self.columns = []
+        self.secondary = []
+        for columnIndex in range(numColumns):
+            if not covered >> columnIndex & 1:
+                newColumn[columnIndex] = len(self.columns)
+                if columnIndex in secondary:
+                    self.secondary.append(len(self.columns))
+                self.columns.append(columns[columnIndex])
+        self.rowMap = [ri for ri in range(len(rows)) if alive >> ri & 1]
+        self.rows = [[newColumn[ci] for ci in rows[ri]] for ri in self.rowMap]
+        self._reducedIndex = {ri: i for i, ri in enumerate(self.rowMap)}
+        self._forced = set(self.forcedRows)
+        self._empty = set(self.emptyRows)
+
+    # Every row which shares a column with a row, including itself
+    def _conflicts(self, mask, columnRows):
+        conflicts = 0
+        while mask:
+            low = mask & -mask
+            conflicts |= columnRows[low.bit_length() - 1]
+            mask ^= low
+        return conflicts
+
+    # Every column of the rows in a mask
+    def _columns(self, mask, rowColumns):
+        columns = 0
+        while mask:
+            low = mask & -mask
+            columns |= rowColumns[low.bit_length() - 1]
+            mask ^= low
+        return columns
+
+    def _removeRows(self, mask):
+        while mask:
+            low = mask & -mask
+            self.deadRows.append(low.bit_length() - 1)
+            mask ^= low
+
+    # Maps rows of the original matrix which must be in the solution to rows of
+    # the reduced one. Returns (reduced rows, pinned) where pinned maps a
+    # forced or reduced row (by its original index) to the alternative which
+    # was asked for, or None when no solution can have all of them.
+    def mapPartial(self, partial):
+        reduced = []
+        pinned = {}
+        for rowIndex in partial:
+            if rowIndex < 0 or rowIndex >= self.numRows:
+                raise Exception(f"Row {rowIndex} is not one of the {self.numRows} rows")
+            representative = self._representative.get(rowIndex, rowIndex)
+            if representative in pinned:
+                # two rows with the same columns
+                return None
+            if representative in self._forced:
+                pinned[representative] = rowIndex
+            elif representative in self._reducedIndex:
+                pinned[representative] = rowIndex
+                reduced.append(self._reducedIndex[representative])
+            elif rowIndex not in self._empty:
+                # a dead row
+                return None
+        return reduced, pinned
+
+    # Yields the solutions of the original matrix for a solution of the
+    # reduced one (without its partial rows): the forced rows followed by the
+    # rows of the solution, once for every choice between duplicates. A row
+    # in `pinned` was given as a partial row, so it is left out.
+    def expand(self, solution, pinned):
+        if solution is None:
+            # counting, with nothing to expand
+            yield None
+            return
+        choices = []
+        for rowIndex in self.forcedRows + [self.rowMap[i] for i in solution]:
+            if rowIndex not in pinned:
+                choices.append(self.alternatives.get(rowIndex, (rowIndex,)))
+        for rows in itertools.product(*choices):
+            yield list(rows)
+
+    def asDict(self):
+        return {
+            "forcedRows": list(self.forcedRows),
+            "deadRows": list(self.deadRows),
+            "duplicateRows": list(self.duplicateRows),
+            "emptyRows": list(self.emptyRows),
+            "removedColumns": list(self.removedColumns),
+            "infeasible": self.infeasible,
+            "rows": len(self.rows),
+            "columns": len(self.columns),
+        }
+
+
+# The smallest active column of an engine, picked at random between columns
+# of the same size
+def _chooseRandomColumn(engine, rng):
+    bestColumn = None
+    bestSize = None
+    ties = 0
+    for column in engine._activeColumns():
+        size = engine._columnSize(column)
+        if bestColumn is None or size < bestSize:
+            bestColumn = column
+            bestSize = size
+            ties = 1
+        elif size == bestSize:
+            # keep each of the tied columns with the same probability
+            ties += 1
+            if rng.randrange(ties) == 0:
+                bestColumn = column
+    return bestColumn
+
+
+def _shuffledRows(engine, column, rng):
+    rows = list(engine._columnRows(column))
+    rng.shuffle(rows)
+    return iter(rows)
+
+
+# The i-th term (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ...
+def _luby(i):
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+# Every element of the group of row permutations made by `generators`, other
+# than the identity. permutation[i] is the row which row i is mapped to.
+def _closeGroup(generators, numRows):
+    for generator in generators:
+        if sorted(generator) != list(range(numRows)):
+            raise Exception(f"A symmetry must be a permutation of the {numRows} rows")
+    identity = tuple(range(numRows))
+    group = {identity}
+    frontier = [identity]
+    while frontier:
+        newElements = []
+        for element in frontier:
+            for generator in generators:
+                product = tuple(generator[x] for x in element)
+                if product not in group:
+                    group.add(product)
+                    newElements.append(product)
+        frontier = newElements
+    group.discard(identity)
+    return sorted(group)
+
+
+# Whether the sorted rows of a solution are no greater than their image under
+# every permutation of the group, so that only one solution of each orbit is
+# kept.
+def _isLexMin(solution, group):
+    rows = sorted(solution)
+    for permutation in group:
+        if sorted(permutation[x] for x in rows) < rows:
+            return False
+    return True
+
+
+# Groups the columns which are joined by rows into connected components.
+# Returns a list of (column indices, row indices) ordered by their first
+# column. Empty rows are in no component.
+def _connectedComponents(numColumns, rows):
+    parent = list(range(numColumns))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for row in rows:
+        if len(row) == 0:
+            continue
+        first = find(row[0])
+        for columnIndex in row[1:]:
+            root = find(columnIndex)
+            if root != first:
+                parent[root] = first
+
+    groups = {}
+    for columnIndex in range(numColumns):
+        groups.setdefault(find(columnIndex), ([], []))[0].append(columnIndex)
+    for rowIndex, row in enumerate(rows):
+        if len(row) > 0:
+            groups[find(row[0])][1].append(rowIndex)
+    return list(groups.values())
+
+
+# Every combination of one item from each iterator, as the concatenation of
+# the items. The iterators are only read as far as needed and what all but
+# the first one return is kept for the next combinations, so this needs the
+# memory of the sum of their lengths instead of the product. The first one
+# is only read once, so it can be a search which is never over.
+def _lazyProduct(iterators):
+    seen = [[] for _ in iterators]
+    # find out straight away if any of them is empty
+    for k, iterator in enumerate(iterators):
+        first = next(iterator, None)
+        if first is None:
+            return
+        seen[k].append(first)
+    done = [False] * len(iterators)
+
+    def items(k):
+        if k == 0:
+            yield seen[0].pop()
+            yield from iterators[0]
+            return
+        i = 0
+        while True:
+            if i < len(seen[k]):
+                yield seen[k][i]
+                i += 1
+            elif done[k]:
+                return
+            else:
+                item = next(iterators[k], None)
+                if item is None:
+                    done[k] = True
+                    return
+                seen[k].append(item)
+
+    def combine(k):
+        if k == len(iterators):
+            yield []
+            return
+        for item in items(k):
+            for rest in combine(k + 1):
+                yield item + rest
+
+    yield from combine(0)
+
+
+# Reads the solutions written by DLX.solveTo(). The file starts with
+# SOLUTIONS_MAGIC followed by batches, each one being:
+#   uint32 number of solutions n, uint32 number of values m,
+#   uint8 width of the lengths, uint8 width of the values, 2 bytes padding
+#   n lengths: the number of rows of each solution
+#   m values: the rows of every solution in turn, sorted and delta encoded:
+#             the first row of a solution followed by the difference of each
+#             row with the one before
+# The lengths and values are unsigned ints of 1, 2 or 4 bytes, the smallest
+# which fits the batch, each array padded to a multiple of 4 bytes. Everything
+# is little endian. The file (or any bytes-like `source`) is memory mapped
+# and batches() gives zero-copy views of the arrays.
+class SolutionReader:
+    def __init__(self, source):
+        self._file = None
+        self._mmap = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buffer = memoryview(source)
+        else:
+            self._file = open(source, "rb")
+            if os.fstat(self._file.fileno()).st_size == 0:
+                self._buffer = memoryview(b"")
+            else:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._buffer = memoryview(self._mmap)
+        if bytes(self._buffer[:len(SOLUTIONS_MAGIC)]) != SOLUTIONS_MAGIC:
+            self.close()
+            raise Exception("Not a file of solutions written by solveTo()")
+
+        # (offset, count, width) of the lengths and of the values of every
+        # batch
+        self._batches = []
+        offset = len(SOLUTIONS_MAGIC)
+        while offset < len(self._buffer):
+            if offset + BATCH_HEADER.size > len(self._buffer):
+                self.close()
+                raise Exception("The file of solutions is truncated")
+            n, m, lengthWidth, valueWidth = BATCH_HEADER.unpack_from(self._buffer, offset)
+            lengths = (offset + BATCH_HEADER.size, n, lengthWidth)
+            values = (lengths[0] + _padded(n * lengthWidth), m, valueWidth)
+            offset = values[0] + _padded(m * valueWidth)
+            if offset > len(self._buffer) or lengthWidth not in UINT_TYPES or valueWidth not in UINT_TYPES:
+                self.close()
+                raise Exception("The file of solutions is truncated or corrupt")
+            self._batches.append((lengths, values))
+
+    def __len__(self):
+        return sum(lengths[1] for lengths, _ in self._batches)
+
+    # Yields (lengths, values) of every batch as sequences of ints
+    def batches(self):
+        for lengths, values in self._batches:
+            yield self._uints(*lengths), self._uints(*values)
+
+    def __iter__(self):
+        for lengths, values in self.batches():
+            i = 0
+            for length in lengths:
+                solution = list(itertools.accumulate(values[i:i + length]))
+                i += length
+                yield solution
+
+    def _uints(self, offset, count, width):
+        view = self._buffer[offset:offset + width * count]
+        typecode = UINT_TYPES[width]
+        if sys.byteorder == "little" or width == 1:
+            return view.cast(typecode)
+        values = array(typecode)
+        values.frombytes(view)
+        values.byteswap()
+        return values
+
+    # Views from batches() which are still held keep the mapping open until
+    # they are garbage collected
+    def close(self):
+        try:
+            self._buffer.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _padded(size):
+    return (size + 3) & ~3
+
+
+# The narrowest unsigned array which holds all of `values`
+def _narrowest(values):
+    largest = max(values, default=0)
+    for width, typecode in UINT_TYPES.items():
+        if largest < 1 << (8 * width):
+            narrow = array(typecode, values)
+            if sys.byteorder != "little":
+                narrow.byteswap()
+            return width, narrow.tobytes()
+    raise Exception(f"Row index {largest} is too big to write")
+
+
+def _writeBatch(sink, lengths, values):
+    lengthWidth, lengthBytes = _narrowest(lengths)
+    valueWidth, valueBytes = _narrowest(values)
+    sink.write(BATCH_HEADER.pack(len(lengths), len(values), lengthWidth, valueWidth))
+    for data in (lengthBytes, valueBytes):
+        sink.write(data)
+        sink.write(bytes(_padded(len(data)) - len(data)))
+
+
+# The little endian bytes of an int array for DLX.save()
+def _int32Bytes(values):
+    values = array('i', values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+# `count` ints of a file written by DLX.save() from `offset`, without copying
+# them on little endian machines
+def _int32View(buffer, offset, count):
+    view = buffer[offset:offset + 4 * count]
+    if len(view) != 4 * count:
+        raise Exception("The matrix file is truncated")
+    if sys.byteorder == "little":
+        return view.cast('i')
+    values = array('i')
+    values.frombytes(view)
+    values.byteswap()
+    return values
+
+
+ENGINES = ("nodes", "array", "bitset")
+# The most columns for which engine="auto" picks the bitset engine. Past this
+# finding the smallest column with popcounts costs more than the linked scan.
+BITSET_MAX_COLUMNS = 512
+# The most rows for which engine="auto" picks the bitset engine. Every row
+# keeps a mask of the rows it conflicts with, so the engine takes about
+# rows * rows / 8 bytes, 2MB at this many rows.
+BITSET_MAX_ROWS = 4096
+RESTARTS = ("luby", "geometric", None)
+SOLUTIONS_MAGIC = b"DLXSOL1\n"
+BATCH_HEADER = struct.Struct("<IIBBxx")
+MATRIX_MAGIC = b"DLXMAT1\n"
+# The sizes of the JSON of the columns, of the rows and of the links in a
+# file written by DLX.save()
+MATRIX_HEADER = struct.Struct("<IIII")
+# array typecodes of the unsigned ints by their width in bytes
+UINT_TYPES = {1: 'B', 2: 'H', 4: 'I'}
+COLUMN_SELECTIONS = ("scan", "buckets")
+# The most columns in a bucket of ColumnBuckets for which min() over the set
+# is used to find the left-most one instead of a heap
+BUCKET_HEAP_MIN = 64
+SUBPROBLEMS_PER_WORKER = 8
+# How many rows a search with a timeout or a CancelToken tries between
+# looking at the clock and the token
+BUDGET_CHECK_NODES = 1024
+# The defaults of startAsync(): the most asolve() requests sent to a worker
+# at once and waiting to be sent
+ASYNC_BATCH_SIZE = 64
+ASYNC_MAX_PENDING = 1024
+# The most solutions a worker finds for an asolve() request before handing
+# them back, the search is resumed from a checkpoint for more
+ASYNC_CHUNK_SOLUTIONS = 256
+
+class DLX:
+    """
+    Arguments:
+        engine: Which representation of the links to use while solving.
+                "nodes" links together Node/ColumnHeader objects.
+                "array" stores the links in flat integer arrays (ArrayEngine)
+                which uses far less memory on big matrices.
+                "bitset" keeps the rows of every column in an int used as a
+                bitset (BitsetEngine), which is much faster on matrices with
+                a few hundred columns or less.
+                "auto" picks "bitset" for at most BITSET_MAX_COLUMNS columns
+                and BITSET_MAX_ROWS rows, and "nodes" otherwise.
+                All the engines return the same solutions in the same order.
+        columnSelection: How the column with the fewest rows is found.
+                "scan" walks every active column at each step of the search.
+                "buckets" keeps the columns in buckets by size (ColumnBuckets)
+                as the links change, which pays off with thousands of columns.
+                Only supported by the "nodes" engine, "auto" then always
+                picks it.
+        preprocess: Shrink the matrix with a Reduction before linking it:
+                forced rows and rows which can't be in any solution are taken
+                out and duplicate rows are merged. The solutions are mapped
+                back to the original rows and `self.reduction` reports what
+                was removed.
+        decompose: Split the matrix into its connected components (columns
+                which share rows) and solve each one on its own. The
+                solutions are every combination of the solutions of the
+                components, in a different order than without decompose, and
+                count() multiplies the counts of the components.
+                checkpoint() isn't supported for a matrix with more than one
+                component.
+    """
+    def __init__(self, engine="auto", columnSelection="scan", preprocess=False, decompose=False):
+        if engine != "auto" and engine not in ENGINES:
+            raise Exception(f"Unknown engine {engine}, expected 'auto' or one of {ENGINES}")
+        if columnSelection not in COLUMN_SELECTIONS:
+            raise Exception(
+                f"Unknown columnSelection {columnSelection}, expected one of {COLUMN_SELECTIONS}")
+        if columnSelection == "buckets" and engine not in ("nodes", "auto"):
+            raise Exception("columnSelection 'buckets' is only supported by the 'nodes' engine")
+        self.engine = engine
+        self.columnSelection = columnSelection
+        self.preprocess = preprocess
+        self.reduction = None
+        self.decompose = decompose
+        # (DLX, original index of each of its rows) for every component
+        self.components = None
+        self._engine = None
+        self.compiled = False
+        self._searching = False
+        self._rowsChecked = False
+        self.columnBuckets = None
+
         self.rows = None
         self.columns = None
+        self.secondary = set()
+        # (low, high) of the columns which aren't covered exactly once
+        self.bounds = {}
+        # {rowIndex: {columnIndex: color}} of the colored secondary columns
+        self.colors = None
+        # The row permutations from setSymmetries(), without the identity
+        self.symmetries = []
+        # Rows given to setRows as an iterable which hasn't been read yet
+        self._rowStream = None
+        # The ArrayEngine links and the path of a matrix read by load()
+        self._links = None
+        self._path = None
+        # The worker processes of asolve(), see startAsync()
+        self._asyncPool = None
 
         self.listHeader = None
         self.columnIds = {}
-        self.rowIds = {}
-        self.solution = {}
+        self.rowNodes = []
+        # Number of links removed by _coverColumn, Knuth's "updates"
+        self.updates = 0
+        self.stats = None
+        self._collectStats = False
+        # The stack of the running search and its partial rows, for checkpoint()
+        self._stack = None
+        self._partial = []
+        # How many solutions the running search has returned for the current
+        # solution of the reduced matrix
+        self._variants = 0
+        # The solutions solve() or count() has found so far, with those found
+        # before the checkpoint it resumed from
+        self._solutions = 0
+        # The position of the row a budget stopped the last search at, before
+        # trying it, for checkpoint()
+        self._stopPosition = None
+        # Why the last solve() or count() stopped before searching
+        # everything: "nodes", "timeout", "cancelled" or "solutions", None
+        # when it searched the whole tree
+        self.stopReason = None
+        self.restarts = 0
 
     """
     Arguments:
         columns: A list of strings which represent the elements of the Set.
                  These are used as the name of the columns.
+        secondary: Indices into `columns` of the secondary columns. A
+                 secondary column may be covered at most once instead of
+                 exactly once, so a solution does not have to cover it.
+        bounds: How many times primary columns must be covered, as a dict
+                 from the index of a column to (low, high) or to a single
+                 number for exactly that many times. Columns which aren't in
+                 it are covered exactly once. The rows of such a column are
+                 branched on as a set (Knuth's Algorithm M), which is much
+                 faster than giving the column several copies. Only the
+                 "array" engine supports bounds, and not checkpoints,
+                 solveRandom(), solveParallel() or preprocess.
     Return: DLX object
     """
-    def setColumns(self, columns):
+    def setColumns(self, columns, secondary=None, bounds=None):
+        secondary = set(secondary or [])
+        for ci in secondary:
+            if ci < 0 or ci >= len(columns):
+                raise Exception(f"Secondary column {ci} is not one of the {len(columns)} columns")
         self.columns = columns
+        self.secondary = secondary
+        self.bounds = _checkBounds(bounds or {}, len(columns), secondary)
+        self._links = None
+        self._path = None
+        self.compiled = False
+        self._rowsChecked = False
+        self.components = None
         return self
             
     """
@@ -138,125 +2045,1520 @@ class DLX:
         rows: A list of lists. The inner list should contain integers which are the 
             indices into the columns array which was used in setColumns
             These are considered the 'constraints' of the covering
+            An entry can also be a (column index, color) pair for a secondary
+            column. Rows which give a column a color can share it with each
+            other as long as they give it the same color, but not with rows
+            which use it without one. Colors can be any values which compare
+            with ==, such as the letters of a crossword. The "array" engine
+            doesn't support colors.
+            Instead of a list the rows can be any iterable, such as a
+            generator. It is read once, when the matrix is first linked, into
+            compact arrays (CSRRows) so that the rows are never all held as
+            lists.
     Return: DLX object
     """
     def setRows(self, rows):
-        self.rows = rows
+        if hasattr(rows, "__len__") and hasattr(rows, "__getitem__"):
+            self.rows, self.colors = _splitColors(rows)
+            self._rowStream = None
+        else:
+            self.rows, self.colors = None, None
+            self._rowStream = rows
+        self._links = None
+        self._path = None
+        self.compiled = False
+        self._rowsChecked = False
+        self.components = None
         return self
+
+    """
+    Sets the rows from compressed sparse row (CSR) arrays: the columns of row
+    i are indices[indptr[i]:indptr[i+1]]. The arrays can be lists, array('i')
+    or numpy arrays. They are checked once, with numpy when it is installed,
+    and the links are built straight from them. setColumns must be called first.
+
+    Return: DLX object
+    """
+    def setRowsFromArrays(self, indptr, indices):
+        if self.columns is None:
+            raise Exception("Must first setColumns before setRowsFromArrays()")
+        indptr = _intArray(indptr)
+        indices = _intArray(indices)
+        _checkRowArrays(indptr, indices, len(self.columns))
+        self.setRows(CSRRows(indptr, indices))
+        self._rowsChecked = True
+        return self
+
+    """
+    Sets the rows from a scipy.sparse matrix with one column per column given
+    to setColumns. Every stored non-zero entry is a 1 in the matrix.
+
+    Return: DLX object
+    """
+    def setMatrix(self, matrix):
+        matrix = matrix.tocsr()
+        if self.columns is None or matrix.shape[1] != len(self.columns):
+            raise Exception("The matrix must have one column for every column given to setColumns()")
+        if not numpy.all(matrix.data):
+            matrix = matrix.copy()
+            matrix.eliminate_zeros()
+        return self.setRowsFromArrays(matrix.indptr, matrix.indices)
+
+    """
+    Sets the rows from a dense 2D numpy array of 0s and 1s with one column per
+    column given to setColumns.
+
+    Return: DLX object
+    """
+    def setDense(self, matrix):
+        if numpy is None:
+            raise Exception("setDense() needs numpy")
+        matrix = numpy.asarray(matrix)
+        if self.columns is None or matrix.ndim != 2 or matrix.shape[1] != len(self.columns):
+            raise Exception("The matrix must have one column for every column given to setColumns()")
+        rowOfEntry, indices = numpy.nonzero(matrix)
+        counts = numpy.bincount(rowOfEntry, minlength=matrix.shape[0])
+        indptr = numpy.concatenate(([0], numpy.cumsum(counts)))
+        return self.setRowsFromArrays(indptr, indices)
     
+    """
+    Links the matrix once so that solve() and count() can be called many
+    times without rebuilding it, for example with different `partial` rows.
+    Calling setColumns or setRows afterwards undoes this.
+
+    Return: DLX object
+    """
+    def compile(self):
+        if self.decompose and len(self._decompose()) > 1:
+            for component, _ in self.components:
+                component.compile()
+        else:
+            self._link()
+        self.compiled = True
+        return self
+
+    """
+    Links the matrix once into a CompiledMatrix which any number of threads
+    can search at the same time without locks, each with its own DLX from
+    solver(). Only the "array" and "bitset" engines can be shared, the
+    "nodes" engine keeps its links in the nodes themselves. "auto" picks
+    "array" where it would pick "nodes". Not supported with decompose.
+    Calling setColumns or setRows afterwards doesn't change the
+    CompiledMatrix.
+
+    Return: CompiledMatrix
+    """
+    def compileShared(self):
+        if self.decompose:
+            raise Exception("A matrix which is split into components can't be shared")
+        self._checkInput()
+        engine = self._engineName()
+        if engine == "nodes":
+            if self.engine == "nodes":
+                raise Exception("The 'nodes' engine can't be shared, use 'array' or 'bitset'")
+            engine = "array"
+        template = DLX(engine, preprocess=self.preprocess)
+        template.setColumns(self.columns, self.secondary, self.bounds)
+        template.rows = _toCSR(self.rows)
+        template.colors = self.colors
+        template.symmetries = self.symmetries
+        template._rowsChecked = True
+        template._links = self._links
+        template.compile()
+        return CompiledMatrix(template)
+
     """
     Returns all the solutions for the covering. This is a generator function.
     If you only want a single solution just call it once. Otherwise iterate
     through all the solutions.
 
+    Arguments:
+        partial: Indices of rows which must be part of every solution, such as
+                 the givens of a puzzle. They are covered before the search
+                 starts and uncovered again when it is done.
+        resume: A checkpoint from checkpoint() or loadCheckpoint(). The search
+                 carries on after the last solution it had returned, skipping
+                 everything searched before. Its partial rows are used.
+        timeout: Stop after this many seconds, including the time the caller
+                 spends between solutions.
+        maxNodes: Stop after trying this many rows.
+        maxSolutions: Stop after returning this many solutions.
+        cancel: A CancelToken which stops the search when it is cancelled.
+                 When any of these stops the search, `self.stopReason` says
+                 which one: "timeout", "nodes", "solutions" or "cancelled".
+                 It is None after a search of the whole tree. Either way the
+                 matrix is left as it was and can be searched again. After
+                 a timeout, maxNodes or cancel checkpoint() gives where to
+                 carry on from.
     Return: list[int] returns a list of integers which are the row indices which
-            are included in the covering.
+            are included in the covering, starting with the `partial` rows.
             If None is returned then no solution exists
     """
-    def solve(self):
-        self._linkTogether()
-        for solution in self._search(0):
-            yield solution
+    def solve(self, partial=None, resume=None, timeout=None, maxNodes=None, maxSolutions=None,
+              cancel=None):
+        self.stopReason = None
+        if maxSolutions is not None and maxSolutions <= 0:
+            self.stopReason = "solutions"
+            return
+        budget = None
+        if timeout is not None or maxNodes is not None or cancel is not None:
+            budget = _Budget(maxNodes, timeout, cancel)
+        if self.decompose and len(self._decompose()) > 1:
+            if resume is not None:
+                raise Exception("Can't resume a search which is split into components")
+            partial = list(partial or [])
+            self.stats = None
+            search = self._solveComponents(partial, budget)
+        else:
+            partial, position, variants, pending = self._resumeFrom(partial, resume)
+            self.stats = SearchStats() if self._collectStats else None
+            search = self._searchFrom(
+                partial, position, variants, pending, stats=self.stats, budget=budget)
+        self._solutions = 0 if resume is None else resume.get("solutions", 0)
+        found = 0
+        try:
+            for solution in search:
+                self._solutions += 1
+                yield partial + solution
+                found += 1
+                if found == maxSolutions:
+                    self.stopReason = "solutions"
+                    return
+        finally:
+            search.close()
+            if budget is not None and budget.stopReason is not None:
+                self.stopReason = budget.stopReason
+
+    """
+    Writes every solution to `sink` in batches of `batchSize` solutions,
+    holding no more than one batch in memory. Each solution is written as
+    its sorted row indices, delta encoded, see SolutionReader for the format
+    and for reading them back.
+
+    Arguments:
+        sink: A binary file, or anything else with a write(bytes) method such
+              as io.BytesIO
+        batchSize: The number of solutions in each batch
+        partial: Indices of rows which must be part of every solution, the
+                 same as for solve()
+    Return: int the number of solutions written
+    """
+    def solveTo(self, sink, batchSize=4096, partial=None):
+        if batchSize < 1:
+            raise Exception("batchSize must be at least 1")
+        partial = list(partial or [])
+        sink.write(SOLUTIONS_MAGIC)
+
+        lengths = array('I')
+        values = array('I')
+        written = 0
+        if self.preprocess or self.decompose or self.bounds:
+            solutions = self.solve(partial)
+        else:
+            # read the rows off the stack instead of building a list for
+            # every solution
+            self.stats = SearchStats() if self._collectStats else None
+            solutions = self._stackSolutions(partial)
+        try:
+            for solution in solutions:
+                rows = sorted(solution)
+                previous = 0
+                for rowIndex in rows:
+                    values.append(rowIndex - previous)
+                    previous = rowIndex
+                lengths.append(len(rows))
+                if len(lengths) == batchSize:
+                    _writeBatch(sink, lengths, values)
+                    written += len(lengths)
+                    lengths = array('I')
+                    values = array('I')
+        finally:
+            solutions.close()
+        if lengths:
+            _writeBatch(sink, lengths, values)
+            written += len(lengths)
+        return written
+
+    # The row indices of every solution of a search, read from its stack
+    def _stackSolutions(self, partial):
+        search = self._searchFrom(partial, stats=self.stats, countOnly=True)
+        try:
+            for _ in search:
+                engine = self._engine
+                yield itertools.chain(partial, (engine._rowIndex(frame[2]) for frame in self._stack))
+        finally:
+            search.close()
+
+    """
+    Turns the SearchStats of solve() on or off. When on, every call to solve()
+    replaces `self.stats` with the statistics of its search: the nodes visited
+    and link updates at each depth, the sizes of the columns chosen to branch
+    on and the time to the first solution. They can be exported with
+    stats.asDict() or stats.toJson(). count() always collects them.
+
+    Return: DLX object
+    """
+    def collectStats(self, enabled=True):
+        self._collectStats = enabled
+        return self
+
+    """
+    Counts the solutions for the covering without building any of them.
+    Afterwards `self.stats` holds the SearchStats of the search: the number of
+    nodes visited and link updates at each depth, see collectStats().
+
+    Arguments:
+        limit: Stop counting after this many solutions. By default all of the
+               solutions are counted.
+        partial: Indices of rows which must be part of every solution, the
+                 same as for solve()
+        resume: A checkpoint to carry on from, the same as for solve(). Only
+                 the solutions after it are counted.
+        timeout, maxNodes, cancel: Stop counting early, the same as for
+                 solve(). The solutions found until then are returned and
+                 `self.stopReason` says why, it is "solutions" when `limit`
+                 was reached. checkpoint() then gives where to carry on
+                 counting from.
+    Return: int the number of solutions
+    """
+    def count(self, limit=None, partial=None, resume=None, timeout=None, maxNodes=None, cancel=None):
+        self.stopReason = None
+        budget = None
+        if timeout is not None or maxNodes is not None or cancel is not None:
+            budget = _Budget(maxNodes, timeout, cancel)
+        found = self._count(limit, partial, resume, budget)
+        if budget is not None and budget.stopReason is not None:
+            self.stopReason = budget.stopReason
+        elif limit is not None and found >= limit:
+            self.stopReason = "solutions"
+        return found
+
+    def _count(self, limit, partial, resume, budget):
+        if limit is not None and limit <= 0:
+            self.stats = SearchStats()
+            return 0
+        if self.decompose and len(self._decompose()) > 1:
+            if resume is not None:
+                raise Exception("Can't resume a search which is split into components")
+            return self._countComponents(limit, partial, budget)
+        partial, position, variants, pending = self._resumeFrom(partial, resume)
+        self.stats = SearchStats()
+        self._solutions = 0 if resume is None else resume.get("solutions", 0)
+        found = 0
+        search = self._searchFrom(
+            partial, position, variants, pending, stats=self.stats, countOnly=True, budget=budget)
+        try:
+            for _ in search:
+                self._solutions += 1
+                found += 1
+                if found == limit:
+                    break
+        finally:
+            search.close()
+        return found
+
+    """
+    Declares symmetries of the matrix as permutations of its rows, such as
+    the rotations and reflections of a board mapping every placement of a
+    piece to another placement. Every permutation must map solutions to
+    solutions, which is not checked. They are closed into a group, which is
+    used by solveCanonical() and countCanonical() to find one solution out of
+    every set of solutions which are images of each other.
+
+    Arguments:
+        permutations: A list of permutations of the row indices, where
+                 permutation[i] is the row that row i is mapped to. It is
+                 enough to give generators of the group.
+    Return: DLX object
+    """
+    def setSymmetries(self, permutations):
+        permutations = [tuple(p) for p in permutations]
+        numRows = len(permutations[0]) if permutations else 0
+        self.symmetries = _closeGroup(permutations, numRows)
+        return self
+
+    """
+    Returns one solution out of every orbit of solutions under the group
+    given to setSymmetries(). This is a generator function.
+    When a primary column is mapped onto itself by every symmetry, each of
+    its rows only has to be tried when it is the smallest of its orbit, which
+    cuts the search by up to the size of the group. The solution returned
+    for an orbit is the one with such a row, and among those the one whose
+    sorted rows are the smallest. Without such a column every solution is
+    searched and the one whose sorted rows are the smallest is returned.
+
+    Arguments:
+        partial: Indices of rows which must be part of every solution, the
+                 same as for solve(). Only the symmetries which map them to
+                 themselves are used.
+    Return: list[int] the same as solve()
+    """
+    def solveCanonical(self, partial=None):
+        partial = list(partial or [])
+        group = self._symmetriesFixing(partial)
+        representatives = self._symmetricColumnRows(group, partial)
+        if representatives is None:
+            for solution in self.solve(partial):
+                if _isLexMin(solution, group):
+                    yield solution
+            return
+        for rowIndex in representatives:
+            stabilizer = [g for g in group if g[rowIndex] == rowIndex]
+            for solution in self.solve(partial + [rowIndex]):
+                if _isLexMin(solution, stabilizer):
+                    yield solution
+
+    """
+    Counts the solutions of solveCanonical(), one for every orbit of
+    solutions under the symmetries. Afterwards `self.stats` holds the
+    SearchStats of all the searches.
+
+    Arguments:
+        limit: Stop counting after this many solutions.
+        partial: Indices of rows which must be part of every solution, the
+                 same as for solveCanonical()
+    Return: int the number of solutions which are not images of each other
+    """
+    def countCanonical(self, limit=None, partial=None):
+        partial = list(partial or [])
+        group = self._symmetriesFixing(partial)
+        representatives = self._symmetricColumnRows(group, partial)
+        if representatives is None:
+            searches = [(partial, group)]
+        else:
+            searches = [(partial + [r], [g for g in group if g[r] == r]) for r in representatives]
+
+        stats = SearchStats()
+        found = 0
+        for searchPartial, checks in searches:
+            if limit is not None and found >= limit:
+                break
+            if not checks:
+                found += self.count(None if limit is None else limit - found, searchPartial)
+            else:
+                collectStats = self._collectStats
+                self._collectStats = True
+                try:
+                    for solution in self.solve(searchPartial):
+                        if _isLexMin(solution, checks):
+                            found += 1
+                            if found == limit:
+                                break
+                finally:
+                    self._collectStats = collectStats
+            if self.stats is not None:
+                stats._add(self.stats)
+        stats.solutions = found
+        self.stats = stats
+        return found
+
+    # The symmetries which map the partial rows to themselves
+    def _symmetriesFixing(self, partial):
+        self._checkInput()
+        group = self.symmetries
+        if group and len(group[0]) != len(self.rows):
+            raise Exception(f"The symmetries are permutations of {len(group[0])} rows, not {len(self.rows)}")
+        partialSet = set(partial)
+        return [g for g in group if {g[x] for x in partialSet} == partialSet]
+
+    # The rows to search from for a primary column which every symmetry maps
+    # onto itself: the smallest row of each orbit of its rows. The column
+    # with the fewest orbits is picked, None if no column is mapped onto
+    # itself. Columns with bounds or used by the partial rows are skipped, as
+    # a solution has to have exactly one of their rows.
+    def _symmetricColumnRows(self, group, partial):
+        if not group:
+            return None
+        usedColumns = {ci for rowIndex in partial for ci in self.rows[rowIndex]}
+        columnRows = [[] for _ in self.columns]
+        for rowIndex, row in enumerate(self.rows):
+            for columnIndex in row:
+                columnRows[columnIndex].append(rowIndex)
+        best = None
+        for columnIndex, rows in enumerate(columnRows):
+            if columnIndex in self.secondary or columnIndex in self.bounds or columnIndex in usedColumns:
+                continue
+            rowSet = set(rows)
+            if not all(g[r] in rowSet for g in group for r in rows):
+                continue
+            representatives = [r for r in rows if all(g[r] >= r for g in group)]
+            if best is None or len(representatives) < len(best):
+                best = representatives
+        return best
+
+    """
+    Returns one solution, found with a randomized search which is restarted
+    whenever it runs out of its node budget. Breaking ties between columns and
+    ordering the rows at random avoids the long runs of failing branches a
+    fixed order can get stuck in. Every run starts again from the matrix with
+    only the `partial` rows covered. Afterwards `self.stats` holds the
+    SearchStats of all the runs and `self.restarts` the number of restarts.
+
+    Arguments:
+        seed: Seed for the random choices, the same seed gives the same runs.
+        restarts: How many nodes (rows tried) each run may visit, in units of
+               `unit`: "luby" follows the Luby sequence 1, 1, 2, 1, 1, 2, 4,
+               ..., "geometric" multiplies the budget by `factor` after every
+               run, and None makes a single run without a budget.
+        unit: The node budget of the first run.
+        factor: The growth of the budget for "geometric" restarts.
+        maxNodes: Give up once all the runs together have visited this many
+               nodes.
+        partial: Indices of rows which must be part of the solution, the same
+               as for solve()
+    Return: list[int] the same as solve(), or None when there is no solution
+            or maxNodes ran out first
+    """
+    def solveRandom(self, seed=None, restarts="luby", unit=100, factor=1.5, maxNodes=None, partial=None):
+        if restarts not in RESTARTS:
+            raise Exception(f"Unknown restarts {restarts}, expected one of {RESTARTS}")
+        partial = list(partial or [])
+        if self.decompose and len(self._decompose()) > 1:
+            return self._solveComponentsRandom(seed, restarts, unit, factor, maxNodes, partial)
+
+        rng = random.Random(seed)
+        self.stats = SearchStats()
+        self.restarts = 0
+        budget = unit
+        while True:
+            runNodes = None
+            if restarts == "luby":
+                runNodes = unit * _luby(self.restarts + 1)
+            elif restarts == "geometric":
+                runNodes = int(budget)
+                budget *= factor
+            if maxNodes is not None:
+                nodesLeft = maxNodes - self.stats.totalNodes()
+                if runNodes is None or nodesLeft < runNodes:
+                    runNodes = nodesLeft
+
+            runStats = SearchStats()
+            runBudget = None if runNodes is None else _Budget(runNodes)
+            search = self._searchFrom(partial, stats=runStats, rng=rng, budget=runBudget)
+            try:
+                solution = next(search, None)
+            finally:
+                search.close()
+            self.stats._add(runStats)
+            if solution is not None:
+                return partial + solution
+            if runBudget is None or runBudget.stopReason is None:
+                # the whole tree was searched
+                return None
+            if maxNodes is not None and self.stats.totalNodes() >= maxNodes:
+                return None
+            self.restarts += 1
+
+    # solveRandom() for every component, so each one is restarted on its own
+    def _solveComponentsRandom(self, seed, restarts, unit, factor, maxNodes, partial):
+        partials = self._componentPartials(partial)
+        rng = random.Random(seed)
+        self.stats = SearchStats()
+        self.restarts = 0
+        solution = list(partial)
+        for (component, rowIndices), componentPartial in zip(self.components, partials):
+            nodesLeft = None
+            if maxNodes is not None:
+                nodesLeft = maxNodes - self.stats.totalNodes()
+            found = component.solveRandom(
+                rng.random(), restarts, unit, factor, nodesLeft, componentPartial)
+            self.stats._add(component.stats)
+            self.restarts += component.restarts
+            if found is None:
+                return None
+            solution += [rowIndices[i] for i in found[len(componentPartial):]]
+        return solution
+
+    """
+    Returns the position of the running solve() after the solution it last
+    returned, as a dict which can be passed to solve(resume=...) or
+    count(resume=...) or saved with saveCheckpoint(). `position` has the
+    offset of the chosen row in the rows of the chosen column, for every level
+    of the search tree from the top down. After a solve() or count() which
+    a timeout, maxNodes or a CancelToken stopped it is the position of the row
+    it would have tried next instead, marked with "pending", so that a long
+    search can be stopped and carried on between any two rows.
+    `solutions` is the number of solutions found before the checkpoint,
+    including those before the checkpoint the search was resumed from.
+
+    Return: dict
+    """
+    def checkpoint(self):
+        if self.decompose and self.components is not None and len(self.components) > 1:
+            raise Exception("Can't checkpoint a search which is split into components")
+        if self.bounds:
+            raise Exception("Can't checkpoint a search with column bounds")
+        if self._stack is not None:
+            position = self._positionOf(self._stack)
+        elif self._stopPosition is not None:
+            position = self._stopPosition
+        else:
+            raise Exception("There is no running or stopped search to checkpoint")
+        checkpoint = {
+            "columns": len(self.columns),
+            "rows": len(self.rows),
+            "partial": list(self._partial),
+            "position": position,
+            "solutions": self._solutions,
+        }
+        if self._stack is None:
+            checkpoint["pending"] = True
+        if self.reduction is not None:
+            checkpoint["preprocess"] = True
+            checkpoint["variants"] = 0 if self._stack is None else self._variants
+        return checkpoint
+
+    """
+    Writes checkpoint() to a JSON file. The file is replaced in one step, so
+    it is never left half written if the process is killed.
+    """
+    def saveCheckpoint(self, path):
+        checkpoint = self.checkpoint()
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(checkpoint, f, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    """
+    Writes the matrix to a binary file which load() maps back into memory
+    without linking or checking the rows again. It holds the column names,
+    the secondary columns, bounds and colors as JSON and the rows as compressed
+    sparse row arrays of 32 bit ints. The file is replaced in one step.
+
+    Arguments:
+        path: The file to write.
+        links: Also write the links of the "array" engine, so that a DLX
+               which loads the file with that engine doesn't link it either.
+               Not supported with colors.
+    """
+    def save(self, path, links=False):
+        if self._searching:
+            raise Exception("Can't save a matrix while a search of it is running")
+        self._checkInput()
+        rows = _toCSR(self.rows)
+        header = {
+            "columns": self.columns,
+            "secondary": sorted(self.secondary),
+            "bounds": [[ci, low, high] for ci, (low, high) in sorted(self.bounds.items())],
+            "colors": [[rowIndex, ci, color] for rowIndex, rowColors in sorted((self.colors or {}).items())
+                       for ci, color in rowColors.items()],
+        }
+        try:
+            meta = json.dumps(header, separators=(",", ":")).encode()
+        except TypeError:
+            raise Exception("save() needs column names and colors which can be written as JSON")
+        sections = [rows.indptr, rows.indices]
+        linkSize = 0
+        if links:
+            if self.colors:
+                raise Exception("The links of the 'array' engine can't be saved with colors")
+            engine = self._engine
+            if not self.compiled or type(engine) is not ArrayEngine or self.reduction is not None:
+                engine = ArrayEngine(self.columns, rows, self.secondary)
+            linkSize = len(engine.top)
+            sections += [engine.top, engine.ulink, engine.dlink, engine.length, engine.rowStart]
+
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(MATRIX_MAGIC)
+            f.write(MATRIX_HEADER.pack(len(meta), len(rows), len(rows.indices), linkSize))
+            f.write(meta)
+            f.write(bytes(_padded(len(meta)) - len(meta)))
+            for section in sections:
+                f.write(_int32Bytes(section))
+        os.replace(temporary, path)
+
+    """
+    Reads a matrix written by save(), replacing the columns and rows. The file
+    is memory mapped copy on write rather than read, so processes which load
+    the same file share its pages and solveParallel() workers load it too
+    instead of being sent the rows. The header, the sizes of the arrays and
+    the column indices of the rows and links are checked, with numpy when it
+    is installed, but the rows are not linked again. Column names and colors
+    come back as JSON gives them, tuples as lists.
+
+    Arguments:
+        path: A file written by save().
+    Return: DLX object
+    """
+    def load(self, path):
+        with open(path, "rb") as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            except ValueError:
+                raise Exception("Not a matrix file written by save()")
+        buffer = memoryview(mapping)
+        magic = bytes(buffer[:len(MATRIX_MAGIC)])
+        if magic != MATRIX_MAGIC:
+            if magic[:-2] == MATRIX_MAGIC[:-2]:
+                raise Exception(f"Unsupported version of the matrix file, expected {MATRIX_MAGIC!r}")
+            raise Exception("Not a matrix file written by save()")
+        offset = len(MATRIX_MAGIC)
+        if len(buffer) < offset + MATRIX_HEADER.size:
+            raise Exception("The matrix file is truncated")
+        metaSize, numRows, numEntries, linkSize = MATRIX_HEADER.unpack_from(buffer, offset)
+        offset += MATRIX_HEADER.size
+        if len(buffer) < offset + metaSize:
+            raise Exception("The matrix file is truncated")
+        try:
+            header = json.loads(bytes(buffer[offset:offset + metaSize]))
+            numColumns = len(header["columns"])
+            colors = [(rowIndex, ci, color) for rowIndex, ci, color in header["colors"]]
+            secondary = header["secondary"]
+            bounds = {ci: (low, high) for ci, low, high in header["bounds"]}
+        except (ValueError, KeyError, TypeError):
+            raise Exception("The header of the matrix file is corrupt")
+        offset += _padded(metaSize)
+
+        sizes = [numRows + 1, numEntries]
+        if linkSize:
+            if linkSize != numColumns + 2 + numEntries + numRows:
+                raise Exception("The links in the matrix file don't fit its rows")
+            sizes += [linkSize, linkSize, linkSize, numColumns + 1, numRows]
+        end = offset + 4 * sum(sizes)
+        if len(buffer) < end:
+            raise Exception("The matrix file is truncated")
+        if len(buffer) > end:
+            raise Exception("The matrix file is longer than its header says")
+        sections = []
+        for size in sizes:
+            sections.append(_int32View(buffer, offset, size))
+            offset += 4 * size
+        _checkRowArrays(sections[0], sections[1], numColumns)
+        if linkSize:
+            _checkLinks(sections[2:], numColumns, numRows)
+
+        self.setColumns(header["columns"], secondary, bounds)
+        for rowIndex, ci, _ in colors:
+            if not 0 <= rowIndex < numRows or ci not in self.secondary:
+                raise Exception(f"The matrix file gives row {rowIndex} a color in column {ci}")
+        self.setColumns(header["columns"], header["secondary"],
+                        {ci: (low, high) for ci, low, high in header["bounds"]})
+        self.setRows(CSRRows(sections[0], sections[1]))
+        if colors:
+            self.colors = {}
+            for rowIndex, ci, color in colors:
+                self.colors.setdefault(rowIndex, {})[ci] = color
+        self._rowsChecked = True
+        if linkSize:
+            self._links = tuple(sections[2:])
+        self._path = os.path.abspath(path)
+        return self
+
+    """
+    Returns all the solutions for the covering using a pool of processes. The
+    top of the search tree is expanded into independent sub-problems (the rows
+    chosen on the way down) which are solved by the workers. This is a
+    generator function.
+    With decompose the first component is searched while every other one is
+    solved by a worker instead, and the solutions of the first one are
+    combined with theirs as they are found.
+
+    Arguments:
+        workers: The number of worker processes, defaults to the number of CPUs.
+        depth: Expand exactly this many levels of the search tree, at least 1.
+               By default levels are expanded until there are at least
+               SUBPROBLEMS_PER_WORKER sub-problems for every worker, so that
+               workers which finish small sub-trees early can pick up more.
+        ordered: If True the solutions are returned in the same order as
+                 solve(). Otherwise they are returned as soon as a worker
+                 finishes its sub-problem.
+    Return: list[int] the same as solve()
+    """
+    def solveParallel(self, workers=None, depth=None, ordered=True):
+        workers = workers or os.cpu_count() or 1
+        if self.bounds:
+            raise Exception("solveParallel() isn't supported with column bounds")
+        if depth is not None and depth < 1:
+            raise Exception(f"depth must be at least 1, not {depth}")
+        if self.decompose and len(self._decompose()) > 1:
+            yield from self._solveComponentsParallel(workers)
+            return
+        subproblems = self._subproblems(depth, workers * SUBPROBLEMS_PER_WORKER)
+
+        # The workers solve the matrix which was linked, a reduced one is
+        # mapped back here
+        columns, rows, secondary = self._matrix()
+        if self._path is not None and self.reduction is None:
+            # every worker maps the same file instead of being sent the rows
+            initializer = _initWorkerFromFile
+            initargs = (self._options(), self._path)
+        else:
+            initializer = _initWorker
+            initargs = (self._options(), columns, secondary, _joinColors(rows, self.colors))
+        executor = ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs)
+        try:
+            futures = [executor.submit(_solveSubproblem, p) for p in subproblems]
+            if not ordered:
+                futures = as_completed(futures)
+            for future in futures:
+                if self.reduction is None:
+                    yield from future.result()
+                    continue
+                for solution in future.result():
+                    yield from self.reduction.expand(solution, {})
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    """
+    Starts the worker processes which asolve() sends its requests to. Every
+    worker links the matrix once, or loads it from the file it was load()ed
+    from, and then solves batches of requests with different partial rows,
+    such as the givens of many puzzles of the same size. Must be called from
+    the event loop asolve() is used in. The workers keep the matrix as it was
+    when they were started, call aclose() before changing it.
+    asolve() calls this with the defaults if it hasn't been called.
+
+    Arguments:
+        workers: The number of worker processes, defaults to the number of CPUs.
+        batchSize: The most requests sent to a worker at once. Requests which
+                   arrive while the workers are busy are sent together.
+        maxPending: The most requests waiting to be sent to a worker. Past it
+                   asolve() waits before sending another one, so a burst of
+                   requests can't queue up without bound.
+    Return: DLX object
+    """
+    def startAsync(self, workers=None, batchSize=ASYNC_BATCH_SIZE, maxPending=ASYNC_MAX_PENDING):
+        if self._asyncPool is not None:
+            raise Exception("The asolve() workers are already started, aclose() them first")
+        if self.bounds:
+            raise Exception("asolve() isn't supported with column bounds")
+        self._checkInput()
+        options = self._options()
+        options["preprocess"] = self.preprocess
+        options["decompose"] = self.decompose
+        if self._path is not None:
+            initializer, initargs = _initWorkerFromFile, (options, self._path)
+        else:
+            initializer = _initWorker
+            initargs = (options, self.columns, self.secondary, _joinColors(self.rows, self.colors))
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs)
+        # a search split into components can't be checkpointed, so it is
+        # solved in one go
+        resumable = not (self.decompose and len(self._decompose()) > 1)
+        self._asyncPool = _AsyncPool(executor, workers, batchSize, maxPending, resumable)
+        return self
+
+    """
+    Returns the solutions for the covering like solve(), but as an async
+    generator which doesn't block the event loop: the search runs in the
+    worker processes of startAsync(). The solutions are found
+    ASYNC_CHUNK_SOLUTIONS at a time and the next ones are only searched for
+    once the caller has taken them, so a slow caller doesn't pile them up.
+
+    Arguments:
+        partial: Indices of rows which must be part of every solution, the
+                 same as for solve()
+        maxSolutions: Stop after returning this many solutions.
+        timeout: Raise TimeoutError if the search isn't done after this many
+                 seconds, including the time spent waiting for a worker. It
+                 also stops the worker, which otherwise carries on with a
+                 request the caller has given up on until it finds its
+                 solutions.
+    Return: list[int] the same as solve()
+    """
+    async def asolve(self, partial=None, maxSolutions=None, timeout=None):
+        if self._asyncPool is None:
+            self.startAsync()
+        pool = self._asyncPool
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        partial = list(partial or [])
+        resume = None
+        found = 0
+        while maxSolutions is None or found < maxSolutions:
+            limit = maxSolutions
+            if pool.resumable:
+                limit = ASYNC_CHUNK_SOLUTIONS
+                if maxSolutions is not None:
+                    limit = min(limit, maxSolutions - found)
+            request = pool.submit(partial if resume is None else None, resume, limit, deadline)
+            if deadline is None:
+                solutions, resume, stopReason = await request
+            else:
+                # waiting in the queue and for a worker counts too
+                try:
+                    solutions, resume, stopReason = await asyncio.wait_for(
+                        request, deadline - loop.time())
+                except asyncio.TimeoutError:
+                    raise TimeoutError("asolve() ran out of time") from None
+            for solution in solutions:
+                yield solution
+            found += len(solutions)
+            if stopReason == "timeout":
+                raise TimeoutError("asolve() ran out of time")
+            if resume is None:
+                return
+
+    """
+    Stops the worker processes of startAsync(). Requests which haven't been
+    sent to a worker yet fail.
+    """
+    async def aclose(self):
+        pool = self._asyncPool
+        self._asyncPool = None
+        if pool is not None:
+            await pool.close()
+
+    # Split the matrix into connected components, each one a DLX with the
+    # same options. They are kept while the DLX is compiled.
+    def _decompose(self):
+        if self.components is not None and self.compiled:
+            return self.components
+        self._checkInput()
+        self.components = []
+        for columnIndices, rowIndices in _connectedComponents(len(self.columns), self.rows):
+            newIndex = {ci: i for i, ci in enumerate(columnIndices)}
+            component = DLX(self.engine, self.columnSelection, self.preprocess)
+            component.setColumns(
+                [self.columns[ci] for ci in columnIndices],
+                [newIndex[ci] for ci in columnIndices if ci in self.secondary],
+                {newIndex[ci]: self.bounds[ci] for ci in columnIndices if ci in self.bounds})
+            component.setRows([[newIndex[ci] for ci in self.rows[ri]] for ri in rowIndices])
+            if self.colors:
+                component.colors = {
+                    i: {newIndex[ci]: color for ci, color in self.colors[ri].items()}
+                    for i, ri in enumerate(rowIndices) if ri in self.colors
+                } or None
+            component._rowsChecked = True
+            self.components.append((component, rowIndices))
+        return self.components
+
+    # The partial rows of every component, by their index in the component
+    def _componentPartials(self, partial):
+        owner = {}
+        for k, (_, rowIndices) in enumerate(self.components):
+            for i, rowIndex in enumerate(rowIndices):
+                owner[rowIndex] = (k, i)
+        partials = [[] for _ in self.components]
+        for rowIndex in partial:
+            if rowIndex < 0 or rowIndex >= len(self.rows):
+                raise Exception(f"Row {rowIndex} is not one of the {len(self.rows)} rows")
+            if rowIndex in owner:
+                k, i = owner[rowIndex]
+                partials[k].append(i)
+            # an empty row is in no component, it covers nothing
+        return partials
+
+    def _solveComponents(self, partial, budget=None):
+        partials = self._componentPartials(partial)
+        searches = [
+            _componentSolutions(component, rowIndices, componentPartial, budget)
+            for (component, rowIndices), componentPartial in zip(self.components, partials)
+        ]
+        try:
+            yield from _lazyProduct(searches)
+        finally:
+            for search in searches:
+                search.close()
+
+    # The number of solutions is the product of the counts of the components.
+    # Counting each one up to `limit` is enough: if one of them reaches it
+    # and none of them is 0 the product does too.
+    # When a budget runs out on the last component the product is still a
+    # count of solutions found, before that nothing is known about the
+    # components left and the count is 0.
+    def _countComponents(self, limit, partial, budget=None):
+        partials = self._componentPartials(list(partial or []))
+        self.stats = SearchStats()
+        total = 1
+        for k, ((component, _), componentPartial) in enumerate(zip(self.components, partials)):
+            total *= component._count(limit, componentPartial, None, budget)
+            self.stats._add(component.stats)
+            if budget is not None and budget.stopReason is not None:
+                if k < len(self.components) - 1:
+                    total = 0
+                break
+            if total == 0:
+                break
+        if limit is not None:
+            total = min(total, limit)
+        self.stats.solutions = total
+        return total
+
+    # The first component is searched here while the workers solve the
+    # others, so its solutions are streamed and only the solutions of the
+    # others are kept, as _lazyProduct() needs them more than once.
+    def _solveComponentsParallel(self, workers):
+        (first, firstRows), rest = self.components[0], self.components[1:]
+        executor = ProcessPoolExecutor(min(workers, len(rest)))
+        searches = []
+        try:
+            futures = []
+            for component, rowIndices in rest:
+                options = component._options()
+                options["preprocess"] = component.preprocess
+                futures.append(executor.submit(
+                    _solveAll, options, component.columns, component.secondary,
+                    _joinColors(component.rows, component.colors)))
+            searches.append(_componentSolutions(first, firstRows, []))
+            for future, (_, rowIndices) in zip(futures, rest):
+                searches.append(_futureSolutions(future, rowIndices))
+            yield from _lazyProduct(searches)
+        finally:
+            for search in searches:
+                search.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # The keyword arguments needed to build another DLX like this one
+    def _options(self):
+        return {
+            "engine": self.engine,
+            "columnSelection": self.columnSelection,
+        }
+
+    # Expand the top of the search tree into sub-problems. Each sub-problem is
+    # the list of rows chosen on the way down, in the order solve() visits
+    # them. Without a fixed depth we keep going one level deeper until there
+    # are at least `target` of them or the tree runs out of levels.
+    def _subproblems(self, depth, target):
+        if not self.compiled:
+            self._link()
+        if depth is not None:
+            return list(self._search(maxDepth=depth))
+
+        depth = 1
+        subproblems = list(self._search(maxDepth=depth))
+        while len(subproblems) < target:
+            if all(len(p) < depth for p in subproblems):
+                break
+            depth += 1
+            subproblems = list(self._search(maxDepth=depth))
+        return subproblems
+
+    # The partial rows, position, variants already returned and whether the
+    # row at the position is still to be tried, to search from for
+    # solve(partial, resume)
+    def _resumeFrom(self, partial, resume):
+        if resume is None:
+            return list(partial or []), None, 0, False
+        self._checkInput()
+        if resume["columns"] != len(self.columns) or resume["rows"] != len(self.rows):
+            raise Exception("The checkpoint was taken on a different matrix")
+        if resume.get("preprocess", False) != self.preprocess:
+            raise Exception("The checkpoint was taken with a different preprocess setting")
+        if partial is not None and list(partial) != resume["partial"]:
+            raise Exception("The checkpoint was taken with different partial rows")
+        return (list(resume["partial"]), resume["position"], resume.get("variants", 0),
+                resume.get("pending", False))
+
+    # Run _search with the `partial` rows already chosen. The links are only
+    # rebuilt if the DLX has not been compiled. The solutions are in rows of
+    # the original matrix, without the partial rows.
+    # `position`, `variants` and `pending` are where to resume from, see
+    # checkpoint().
+    def _searchFrom(self, partial, position=None, variants=0, pending=False, **searchOptions):
+        self._stopPosition = None
+        if not self.compiled:
+            self._link()
+        elif self._searching:
+            raise Exception("A search of this compiled DLX is still running, close it first")
+        if self.bounds:
+            yield from self._searchBounds(partial, position, **searchOptions)
+            return
+
+        reduction = self.reduction
+        originalPartial = partial
+        if reduction is not None:
+            mapped = reduction.mapPartial(partial)
+            if mapped is None:
+                return
+            partial, pinned = mapped
+            if reduction.alternatives:
+                # every choice between duplicates is another solution
+                searchOptions["countOnly"] = False
+
+        covered = self._coverRows(partial)
+        if covered is None:
+            return
+        self._searching = True
+        self._partial = originalPartial
+        try:
+            if reduction is None:
+                yield from self._search(position=position, pending=pending, **searchOptions)
+                return
+            # The solution at a checkpoint may not have returned all of its
+            # variants, so it is searched again skipping the ones returned.
+            atSolution = position is not None and not pending
+            search = self._search(position=position, repeat=atSolution, pending=pending,
+                                  **searchOptions)
+            skip = variants if atSolution else 0
+            for solution in search:
+                self._variants = 0
+                for variant in reduction.expand(solution, pinned):
+                    self._variants += 1
+                    if skip:
+                        skip -= 1
+                        continue
+                    yield variant
+                skip = 0
+        finally:
+            self._uncoverRows(covered)
+            self._searching = False
+
+    # _searchFrom for a matrix with column bounds, searched by the
+    # MultiplicityEngine
+    def _searchBounds(self, partial, position=None, stats=None, countOnly=False, budget=None,
+                      **searchOptions):
+        if position is not None or searchOptions.get("rng") is not None:
+            raise Exception("Only solve() and count() are supported with column bounds")
+        engine = self._engine
+        if len(set(partial)) != len(partial):
+            return
+        chosen = []
+        for rowIndex in partial:
+            if rowIndex < 0 or rowIndex >= len(self.rows):
+                raise Exception(f"Row {rowIndex} is not one of the {len(self.rows)} rows")
+            rowNode = engine._rowNode(rowIndex)
+            if rowNode is None:
+                continue
+            if not engine._chooseRow(rowNode):
+                for rowNode in reversed(chosen):
+                    engine._unchooseRow(rowNode)
+                return
+            chosen.append(rowNode)
+        self._searching = True
+        self._partial = partial
+        try:
+            yield from engine.search(stats, countOnly, budget)
+        finally:
+            for rowNode in reversed(chosen):
+                engine._unchooseRow(rowNode)
+            self._searching = False
+
+    # Cover the rows given by their indices as if the search had chosen them.
+    # Returns the covered rows for _uncoverRows, or None if the rows clash
+    # with each other in which case nothing is covered.
+    def _coverRows(self, rowIndices):
+        rows = self._matrix()[1]
+        colors = self.colors or {}
+        # the color each column is used with so far
+        usedColumns = {}
+        for rowIndex in rowIndices:
+            if rowIndex < 0 or rowIndex >= len(rows):
+                raise Exception(f"Row {rowIndex} is not one of the {len(rows)} rows")
+            rowColors = colors.get(rowIndex, {})
+            for columnIndex in rows[rowIndex]:
+                color = rowColors.get(columnIndex)
+                if columnIndex in usedColumns and (color is None or usedColumns[columnIndex] != color):
+                    return None
+                usedColumns[columnIndex] = color
+        if colors and len(set(rowIndices)) != len(rowIndices):
+            # rows which only have colored columns don't clash with themselves
+            return None
+
+        engine = self._engine
+        covered = []
+        for rowIndex in rowIndices:
+            rowNode = engine._rowNode(rowIndex)
+            if rowNode is None:
+                continue
+            if self._isColored(rowIndex, rowNode):
+                engine._purify(rowNode)
+            else:
+                engine._coverColumn(engine._columnOf(rowNode))
+            engine._coverRow(rowNode)
+            covered.append((rowIndex, rowNode))
+        return covered
+
+    def _uncoverRows(self, covered):
+        engine = self._engine
+        for rowIndex, rowNode in reversed(covered):
+            engine._uncoverRow(rowNode)
+            if self._isColored(rowIndex, rowNode):
+                engine._unpurify(rowNode)
+            else:
+                engine._uncoverColumn(engine._columnOf(rowNode))
+
+    # Whether a row gives a color to the column of rowNode, its first node
+    def _isColored(self, rowIndex, rowNode):
+        if not self.colors or rowIndex not in self.colors:
+            return False
+        if self._engine is self:
+            return rowNode.color is not None
+        return self._engine._columnOf(rowNode) in self.colors[rowIndex]
+
+    # The engine to link the matrix with, resolving "auto"
+    def _engineName(self):
+        if self.engine != "auto":
+            return self.engine
+        if self.bounds:
+            return "array"
+        columns, rows, _ = self._matrix()
+        if self.columnSelection == "scan" and columns is not None and rows is not None \
+                and len(columns) <= BITSET_MAX_COLUMNS and len(rows) <= BITSET_MAX_ROWS:
+            return "bitset"
+        return "nodes"
+
+    # The (columns, rows, secondary) which are linked: the reduced matrix
+    # when preprocessing
+    def _matrix(self):
+        if self.reduction is not None:
+            reduction = self.reduction
+            return reduction.columns, reduction.rows, set(reduction.secondary)
+        return self.columns, self.rows, self.secondary
+
+    # Build the links using the engine picked for this DLX. The "nodes"
+    # engine is implemented by the DLX itself.
+    def _link(self):
+        self._checkInput()
+        self.reduction = None
+        engine = self._engineName()
+        if self.colors:
+            if engine == "array":
+                raise Exception("Colors are only supported by the 'nodes' and 'bitset' engines")
+            if self.preprocess:
+                raise Exception("preprocess isn't supported with colors")
+        if self.bounds:
+            if engine != "array":
+                raise Exception("Column bounds are only supported by the 'array' engine")
+            if self.preprocess:
+                raise Exception("preprocess isn't supported with column bounds")
+            self._engine = MultiplicityEngine(self.columns, self.rows, self.secondary, self.bounds)
+            return
+        if self.preprocess:
+            self.reduction = Reduction(self.columns, self.rows, self.secondary)
+            engine = self._engineName()
+        if engine == "array":
+            links = self._links if self.reduction is None else None
+            self._engine = ArrayEngine(*self._matrix(), links=links)
+        elif engine == "bitset":
+            self._engine = BitsetEngine(*self._matrix(), self.colors)
+        else:
+            self._linkTogether()
+
+    def _checkInput(self):
+        if self.columns is None:
+            raise Exception("Must first setColumns before trying to solve()")
+        if self.rows is None and self._rowStream is None:
+            raise Exception("Must first setRows before trying to solve()")
+        if not self._rowsChecked:
+            if self._rowStream is not None:
+                self.rows, self.colors = _readRows(self._rowStream, len(self.columns))
+                self._rowStream = None
+            else:
+                _checkRows(self.rows, len(self.columns))
+            for rowIndex, rowColors in (self.colors or {}).items():
+                for columnIndex in rowColors:
+                    if columnIndex not in self.secondary:
+                        raise Exception(
+                            f"Row {rowIndex} gives a color to column {columnIndex} which isn't secondary")
+            self._rowsChecked = True
 
     # Given all the columns and rows for this DLX
     # we will create all the left-right, up-down linked lists 
     def _linkTogether(self):
-        if self.columns is None or self.rows is None:
-            raise Exception("Must first setColumns before trying to solve()")
-        if self.rows is None:
-            raise Exception("Must first setRows before trying to solve()")
-        
+        self._checkInput()
+        self._engine = self
+        columns, rows, secondary = self._matrix()
+
         columnObjects = []
-        rowObjects = []
 
         self.columnIds = {}
-        self.rowIds = {}
+        # The first node of every row, None for empty rows
+        self.rowNodes = []
+
+        self.columnBuckets = None
+        nodeClass = Node
+        if self.columnSelection == "buckets":
+            nodeClass = BucketedNode
 
         # Set the column headers
-        self.listHeader = ColumnHeader(None)
+        self.listHeader = ColumnHeader(None, 0)
         current = self.listHeader
-        for ci, c in enumerate(self.columns):
-            newColumn = ColumnHeader(c)
-            current.insertRight(newColumn)
-            current = newColumn
+        nodeId = 1
+        for ci, c in enumerate(columns):
+            if nodeClass is BucketedNode:
+                newColumn = BucketedColumnHeader(c, ci, nodeId)
+            else:
+                newColumn = ColumnHeader(c, nodeId)
+            nodeId += 1
+            # Secondary columns are left out of the list of column headers
+            # so they are never chosen, but still get covered by the rows
+            # which use them.
+            if ci not in secondary:
+                current.insertRight(newColumn)
+                current = newColumn
             columnObjects.append(newColumn)
-            self.columnIds[ci] = current
+            self.columnIds[ci] = newColumn
 
         # Iterate through every row and link them up-down and left-right
-        for rowNum, row in enumerate(self.rows):
+        rowNodes = self.rowNodes
+        colors = self.colors or {}
+        for rowNum, row in enumerate(rows):
             currentNode = None
+            firstNode = None
+            rowColors = colors.get(rowNum, {})
 
-            rowIds = {}
-            for ri, columnIndex in enumerate(row):
+            for columnIndex in row:
                 lastColumnNode = columnObjects[columnIndex]
-                newNode = Node(
-                    lastColumnNode.columnHeader, 
-                    (rowNum,ri)
-                    # str([x+1 for x in row])
-                )
+                newNode = nodeClass(
+                    lastColumnNode.columnHeader, rowNum, nodeId, rowColors.get(columnIndex))
+                nodeId += 1
 
                 # Link up and down
                 lastColumnNode.insertDown(newNode)
                 # Link left and right
                 if currentNode is not None:
                     currentNode.insertRight(newNode)
+                else:
+                    firstNode = newNode
                 
                 # update the pointers
                 currentNode = newNode
                 columnObjects[columnIndex] = newNode
-                rowIds[ri] = currentNode
             
-            rowObjects.append(currentNode)
-            self.rowIds[rowNum] = rowIds
+            rowNodes.append(firstNode)
 
-    def _search(self, depth):
-        if self._columnsAreCovered():
-            yield [x.rowId[0] for x in self.solution.values()]
-            return
+        if nodeClass is BucketedNode:
+            columnHeaders = list(self.columnIds.values())
+            self.columnBuckets = ColumnBuckets(columnHeaders)
+            for columnHeader in self.listHeader.iterateRight(False):
+                columnHeader.activate(self.columnBuckets)
 
-        # Choose a column to try and cover
-        columnHeader = self._chooseColumn()
-        if columnHeader == self.listHeader or columnHeader.size == 0:
-            # there are no more rows but we still have columns 
-            # we need to cover. There is no solution, so return
-            return
+    # Depth first search over the columns without recursion. Every frame on
+    # the stack is [columnHeader, rows left to try, current row] for one
+    # level of the search tree. The column of every frame is covered and so is
+    # its current row, which lets us yield a solution straight from the stack
+    # and put every link back if the caller stops iterating early.
+    #
+    # With `maxDepth` the search does not go deeper than that many rows and
+    # yields the rows chosen so far whenever it gets there.
+    # With `countOnly` None is yielded instead of each solution so that
+    # nothing is allocated per solution.
+    # `stats` is an optional SearchStats which is updated as the search runs.
+    # Without it the search only pays for the `stats is not None` checks.
+    # `position` is the position of a checkpoint() to carry on from, with
+    # `repeat` the solution at that position is yielded again first. With
+    # `pending` the row at the position hasn't been tried yet and the search
+    # carries on with it instead.
+    # With a random.Random `rng` ties between the smallest columns are broken
+    # at random and the rows of each column are tried in a random order.
+    # With a _Budget the search stops when it runs out, setting its
+    # stopReason, with every link put back.
+    def _search(self, maxDepth=None, stats=None, countOnly=False, position=None, repeat=False,
+                pending=False, rng=None, budget=None):
+        engine = self._engine
+        chooseColumn = engine._chooseColumn
+        columnRows = engine._columnRows
+        if rng is not None:
+            chooseColumn = lambda: _chooseRandomColumn(engine, rng)
+            columnRows = lambda column: _shuffledRows(engine, column, rng)
+        nodesLeft = None if budget is None else budget.nodesUntilCheck()
+        if stats is not None:
+            stats._start(engine.updates)
+            stats._visit(0, engine.updates)
 
-        self._coverColumn(columnHeader)
+        stack = []
+        if maxDepth is None:
+            self._stack = stack
+        try:
+            if engine._columnsAreCovered():
+                # the only solution has no rows, a checkpoint() after it has
+                # the empty position and nothing is left to resume
+                if position is not None and not repeat:
+                    return
+                if stats is not None:
+                    stats._solution()
+                yield None if countOnly else []
+                return
 
-        for rowNode in columnHeader.iterateDown(False):
-            # Add row `R` as apart of the solution
-            self.solution[depth] = rowNode
-            self._coverRow(rowNode)
+            # Choose a column to try and cover
+            columnHeader = chooseColumn()
+            if stats is not None:
+                stats._chose(engine._columnSize(columnHeader))
+            if engine._columnSize(columnHeader) == 0:
+                # there are no more rows but we still have columns 
+                # we need to cover. There is no solution, so return
+                return
 
-            # recursive call to find solutions for sub-problem
-            for solution in self._search(depth+1):
-                yield solution
+            engine._coverColumn(columnHeader)
+            stack.append([columnHeader, columnRows(columnHeader), None])
+            if position:
+                self._restorePosition(stack, position, pending)
+                if repeat:
+                    yield None if countOnly else [engine._rowIndex(f[2]) for f in stack]
+            while stack:
+                frame = stack[-1]
+                if frame[2] is not None:
+                    # backtrack
+                    engine._uncoverRow(frame[2])
+
+                rowNode = next(frame[1], None)
+                frame[2] = rowNode
+                if rowNode is None:
+                    # tried every row of this column
+                    engine._uncoverColumn(frame[0])
+                    stack.pop()
+                    continue
+
+                # Add row `R` as apart of the solution
+                if nodesLeft is not None:
+                    nodesLeft -= 1
+                    if nodesLeft < 0:
+                        nodesLeft = budget.nodesUntilCheck() - 1
+                        if nodesLeft < 0:
+                            if stack is self._stack and rng is None:
+                                self._stopPosition = self._positionOf(stack)
+                            # the row isn't covered, so don't uncover it
+                            frame[2] = None
+                            return
+                if stats is not None:
+                    stats._visit(len(stack), engine.updates)
+                engine._coverRow(rowNode)
+                if engine._columnsAreCovered():
+                    if stats is not None:
+                        stats._solution()
+                    if countOnly:
+                        yield None
+                    else:
+                        yield [engine._rowIndex(f[2]) for f in stack]
+                    continue
+                if len(stack) == maxDepth:
+                    yield [engine._rowIndex(f[2]) for f in stack]
+                    continue
+
+                columnHeader = chooseColumn()
+                if stats is not None:
+                    stats._chose(engine._columnSize(columnHeader))
+                if engine._columnSize(columnHeader) == 0:
+                    continue
 
-            # backtrack
-            self._uncoverRow(rowNode)
-            del self.solution[depth]
+                # descend into the sub-problem
+                engine._coverColumn(columnHeader)
+                stack.append([columnHeader, columnRows(columnHeader), None])
+        finally:
+            while stack:
+                columnHeader, _, rowNode = stack.pop()
+                if rowNode is not None:
+                    engine._uncoverRow(rowNode)
+                engine._uncoverColumn(columnHeader)
+            if stack is self._stack:
+                self._stack = None
+            if nodesLeft is not None:
+                budget.giveBack(nodesLeft)
+            if stats is not None:
+                stats._finish(engine.updates)
 
-        self._uncoverColumn(columnHeader)
+    # The offset of the current row of every frame of the stack in the rows
+    # of its column, see checkpoint()
+    def _positionOf(self, stack):
+        engine = self._engine
+        position = []
+        for columnHeader, _, rowNode in stack:
+            for offset, row in enumerate(engine._columnRows(columnHeader)):
+                if row == rowNode:
+                    position.append(offset)
+                    break
+        return position
+
+    # Take the search down to a checkpoint() position, leaving the stack just
+    # as it was when the search returned the solution at that position. With
+    # `pending` the last row is left to be tried next instead.
+    def _restorePosition(self, stack, position, pending=False):
+        engine = self._engine
+        for depth, offset in enumerate(position):
+            frame = stack[-1]
+            if pending and depth == len(position) - 1:
+                for _ in range(offset):
+                    if next(frame[1], None) is None:
+                        raise Exception(f"The checkpoint does not match the matrix at depth {depth}")
+                return
+            for _ in range(offset + 1):
+                frame[2] = next(frame[1], None)
+            if frame[2] is None:
+                raise Exception(f"The checkpoint does not match the matrix at depth {depth}")
+            engine._coverRow(frame[2])
+            if depth == len(position) - 1:
+                return
+            columnHeader = engine._chooseColumn()
+            if engine._columnsAreCovered() or engine._columnSize(columnHeader) == 0:
+                raise Exception(f"The checkpoint does not match the matrix at depth {depth}")
+            engine._coverColumn(columnHeader)
+            stack.append([columnHeader, engine._columnRows(columnHeader), None])
 
     # Find the column which has the smallest number of rows 
     def _chooseColumn(self):
+        if self.columnBuckets is not None:
+            return self.columnBuckets.smallest()
+
         bestColumn = None
         for columnHeader in self.listHeader.iterateRight(False):
             if bestColumn is None:
                 bestColumn = columnHeader
             elif columnHeader.size < bestColumn.size:
                 bestColumn = columnHeader
+            # a column can't do better than a single row
+            if bestColumn.size <= 1:
+                break
         return bestColumn
+
+    def _columnSize(self, columnHeader: ColumnHeader):
+        return columnHeader.size
+
+    def _activeColumns(self):
+        return self.listHeader.iterateRight(False)
+
+    def _columnRows(self, columnHeader: ColumnHeader):
+        return columnHeader.iterateDown(False)
+
+    def _rowNode(self, rowIndex):
+        return self.rowNodes[rowIndex]
+
+    def _columnOf(self, rowNode: Node):
+        return rowNode.columnHeader
+
+    def _rowIndex(self, rowNode: Node):
+        return rowNode.rowId
     
     def _coverRow(self, rowNode: Node):
         for currentNode in rowNode.iterateRight(False):
-            columnHeader = currentNode.columnHeader
-            self._coverColumn(columnHeader)
+            if currentNode.color is None:
+                self._coverColumn(currentNode.columnHeader)
+            else:
+                self._purify(currentNode)
         
     def _uncoverRow(self, rowNode: Node):
         for currentNode in rowNode.iterateLeft(False):
-            columnHeader = currentNode.columnHeader
-            self._uncoverColumn(columnHeader)
+            if currentNode.color is None:
+                self._uncoverColumn(currentNode.columnHeader)
+            else:
+                self._unpurify(currentNode)
+
+    # Knuth's purify for a row which gives the column of `node` a color: the
+    # other rows which give the column another color, or none, are removed
+    # and the ones which give it the same color are marked _PURIFIED so that
+    # choosing them leaves the column alone. A node which is already marked
+    # has nothing to do.
+    def _purify(self, node: Node):
+        color = node.color
+        if color is _PURIFIED:
+            return
+        updates = 0
+        for rowNode in node.columnHeader.iterateDown(includeSelf=False):
+            if rowNode is node:
+                continue
+            if rowNode.color == color:
+                rowNode.color = _PURIFIED
+            else:
+                for rightNeighbour in rowNode.iterateRight(includeSelf=False):
+                    rightNeighbour.removeUpDown()
+                    updates += 1
+        self.updates += updates
+
+    def _unpurify(self, node: Node):
+        color = node.color
+        if color is _PURIFIED:
+            return
+        for rowNode in node.columnHeader.iterateUp(includeSelf=False):
+            if rowNode is node:
+                continue
+            if rowNode.color is _PURIFIED:
+                rowNode.color = color
+            else:
+                for rightNeighbour in rowNode.iterateLeft(includeSelf=False):
+                    rightNeighbour.addUpDown()
 
     def _coverColumn(self, columnHeader: ColumnHeader):
         # remove this column from the listHeaders
@@ -265,9 +3567,12 @@ class DLX:
         # go through every row belonging to this column
         # for every column in which those rows belong 
         # remove it from that column
+        updates = 0
         for rowNode in columnHeader.iterateDown(includeSelf=False):
             for rightNeighbour in rowNode.iterateRight(includeSelf=False):
                 rightNeighbour.removeUpDown()
+                updates += 1
+        self.updates += updates
 
     def _uncoverColumn(self, columnHeader: ColumnHeader):
         # go through every row belonging to this column
@@ -353,6 +3658,168 @@ class DLX:
         return matrix
 
 
+# The DLX each worker process of solveParallel links once and reuses for
+# every sub-problem it is given
+_workerDlx = None
+
+def _initWorker(options, columns, secondary, rows):
+    global _workerDlx
+    _workerDlx = DLX(**options)
+    _workerDlx.setColumns(columns, secondary)
+    _workerDlx.setRows(rows)
+    _workerDlx.compile()
+
+def _initWorkerFromFile(options, path):
+    global _workerDlx
+    _workerDlx = DLX(**options)
+    _workerDlx.load(path)
+    _workerDlx.compile()
+
+def _solveSubproblem(prefix):
+    return [solution for solution in _workerDlx.solve(partial=prefix)]
+
+# Solves a batch of asolve() requests, each one (partial, resume, limit,
+# timeout), in a worker. The result of every request is (solutions,
+# checkpoint to resume from for more or None, stopReason), or the Exception
+# it raised so that a bad request doesn't fail the others of the batch.
+def _solveRequests(requests, resumable):
+    results = []
+    for partial, resume, limit, timeout in requests:
+        try:
+            solutions = []
+            checkpoint = None
+            search = _workerDlx.solve(partial, resume, timeout=timeout)
+            try:
+                for solution in search:
+                    solutions.append(solution)
+                    if len(solutions) == limit:
+                        if resumable:
+                            checkpoint = _workerDlx.checkpoint()
+                        break
+            finally:
+                search.close()
+            results.append((solutions, checkpoint, _workerDlx.stopReason))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# Sends the requests of DLX.asolve() to the worker processes. Requests wait
+# in a queue of at most `maxPending` until the dispatcher task takes them, up
+# to `batchSize` at a time, and sends them to a worker as one task. At most
+# two batches per worker are sent at once, so that the queue fills up when
+# the workers can't keep up instead of their task queue. The event loop only
+# does this bookkeeping, the searches all run in the workers.
+class _AsyncPool:
+    def __init__(self, executor, workers, batchSize, maxPending, resumable):
+        self.executor = executor
+        self.batchSize = batchSize
+        self.resumable = resumable
+        self.queue = asyncio.Queue(maxPending)
+        self.slots = asyncio.Semaphore(2 * workers)
+        self.dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    # The result of one request from _solveRequests. `deadline` is in the
+    # time of the event loop, the worker is given what is left of it when
+    # the request is sent.
+    async def submit(self, partial, resume, limit, deadline):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((partial, resume, limit, deadline), future))
+        result = await future
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self.queue.get()]
+            await self.slots.acquire()
+            while len(batch) < self.batchSize and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            # requests given up on while waiting are left out, and so are
+            # the ones out of time
+            now = asyncio.get_running_loop().time()
+            sent = []
+            for (partial, resume, limit, deadline), future in batch:
+                if future.done():
+                    continue
+                if deadline is not None and deadline <= now:
+                    future.set_exception(TimeoutError("asolve() ran out of time"))
+                    continue
+                timeout = None if deadline is None else deadline - now
+                sent.append(((partial, resume, limit, timeout), future))
+            batch = sent
+            if not batch:
+                self.slots.release()
+                continue
+            try:
+                task = self.executor.submit(
+                    _solveRequests, [args for args, _ in batch], self.resumable)
+            except Exception as e:
+                self.slots.release()
+                self._finish(batch, None, e)
+                continue
+            asyncio.wrap_future(task).add_done_callback(
+                lambda task, batch=batch: self._finish(batch, task))
+
+    def _finish(self, batch, task, error=None):
+        if task is not None:
+            self.slots.release()
+            if task.cancelled():
+                error = Exception("The asolve() workers were stopped")
+            else:
+                error = task.exception()
+        for k, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(task.result()[k])
+
+    async def close(self):
+        self.dispatcher.cancel()
+        try:
+            await self.dispatcher
+        except asyncio.CancelledError:
+            pass
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(Exception("The asolve() workers were stopped"))
+        # wait for the workers to exit without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.executor.shutdown(wait=True, cancel_futures=True))
+
+
+# The solutions of a component without its partial rows, as rows of the
+# whole matrix
+def _componentSolutions(component, rowIndices, partial, budget=None):
+    partial = component._resumeFrom(partial, None)[0]
+    for solution in component._searchFrom(partial, budget=budget):
+        yield [rowIndices[i] for i in solution]
+
+
+# The solutions of a component solved by _solveAll() in a worker, with the
+# row indices of the whole matrix
+def _futureSolutions(future, rowIndices):
+    for solution in future.result():
+        yield [rowIndices[i] for i in solution]
+
+
+def _solveAll(options, columns, secondary, rows):
+    d = DLX(**options)
+    d.setColumns(columns, secondary)
+    d.setRows(rows)
+    return [solution for solution in d.solve()]
+
+
+# Reads a checkpoint written by DLX.saveCheckpoint()
+def loadCheckpoint(path):
+    with open(path) as f:
+        return json.load(f)
+
+
 def main():
     dlx = DLX()
 
@@ -1,8 +1,54 @@
 import dlx
 
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
 import unittest
 from pprint import pprint
 
+
+EXAMPLE_COLUMNS = [1,2,3,4,5,6,7]
+EXAMPLE_ROWS = [
+    [x-1 for x in [1,4,7]], # A
+    [x-1 for x in [1,4]], # B
+    [x-1 for x in [4,5,7]], # C
+    [x-1 for x in [3,5,6]], # D
+    [x-1 for x in [2,3,6,7]], # E
+    [x-1 for x in [2,7]], # F
+]
+
+# Build a random matrix which is guaranteed to have a few solutions by
+# planting some partitions of the columns amongst random rows.
+def randomMatrix(seed, numColumns=12, partitions=4, extraRows=20):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(partitions):
+        columns = list(range(numColumns))
+        rng.shuffle(columns)
+        while columns:
+            size = rng.randint(1, 4)
+            rows.append(sorted(columns[:size]))
+            columns = columns[size:]
+    for _ in range(extraRows):
+        rows.append(sorted(rng.sample(range(numColumns), rng.randint(1, 4))))
+    rng.shuffle(rows)
+    return list(range(numColumns)), rows
+
+# Build a DLX with the given matrix, passing any options to the constructor.
+def makeDlx(columns, rows, secondary=None, **options):
+    d = dlx.DLX(**options)
+    d.setColumns(columns, secondary)
+    d.setRows(rows)
+    return d
+
 class TestDLX2Node(unittest.TestCase):
     def assertLeftRight(self, node, left, right):
         self.assertEqual(node.left, left)
@@ -112,7 +158,6 @@ class TestDLX2(unittest.TestCase):
         self.assertEqual(node.down, down)
 
     def setUp(self):
-        dlx.Node.NodeId = 0
         self.dlx = dlx.DLX()
         self.columns = [1,2,3,4,5,6,7]
         self.rows = [
@@ -151,7 +196,6 @@ class TestDLX2(unittest.TestCase):
 
     def testLinkTogether(self):
         d = dlx.DLX()
-        dlx.Node.NodeId = 0
         columns = [1,2,3,4,5,6,7]
         rows = [
             [x-1 for x in [1,4,7]], # A
@@ -238,6 +282,34 @@ class TestDLX2(unittest.TestCase):
         #      19  20          21  22       [2,3,6,7]
         #      23                  24       [2,7]
 
+    def testNodeIdsArePerMatrix(self):
+        other = dlx.DLX()
+        other.setColumns(self.columns)
+        other.setRows(self.rows)
+        other._linkTogether()
+        self.assertEqual(other.listHeader.nodeId, 0)
+        self.assertEqual(other.columnIds[0].nodeId, 1)
+        # linking another matrix does not change the ids of this one
+        self.assertEqual(self.column1.nodeId, 1)
+        self.assertListEqual(
+            [x.nodeId for x in other.rowNodes[5].iterateRight()],
+            [24, 23]
+        )
+
+    def testRowNodes(self):
+        for rowNum, row in enumerate(self.rows):
+            rowNode = self.dlx.rowNodes[rowNum]
+            self.assertEqual(rowNode.columnHeader.name, self.columns[row[0]])
+            self.assertListEqual(
+                [x.rowId for x in rowNode.iterateRight()],
+                [rowNum] * len(row)
+            )
+
+    def testCompactNodes(self):
+        self.assertFalse(hasattr(self.row1, "__dict__"))
+        self.assertFalse(hasattr(self.column1, "__dict__"))
+        self.assertIsInstance(self.row1.rowId, int)
+
     def testChooseColumn(self):
         chosenColumn = self.dlx._chooseColumn()
         self.assertEqual(chosenColumn.nodeId, 1)
@@ -368,6 +440,24 @@ class TestDLX2(unittest.TestCase):
         self.assertEqual(len(allSolutions), 1)
         self.assertSetEqual(set(allSolutions[0]), set([1,3,5]))
 
+    def testSolveDeeperThanRecursionLimit(self):
+        size = sys.getrecursionlimit() + 200
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine)
+            d.setColumns(list(range(size)))
+            d.setRows([[i] for i in range(size)])
+            solutions = [x for x in d.solve()]
+            self.assertEqual(len(solutions), 1)
+            self.assertListEqual(sorted(solutions[0]), list(range(size)))
+
+    def testStoppingEarlyRestoresLinks(self):
+        beforeRep = self.dlx._getDlxRepresentation()
+        solutions = self.dlx._search()
+        self.assertSetEqual(set(next(solutions)), set([1,3,5]))
+        solutions.close()
+        afterRep = self.dlx._getDlxRepresentation()
+        self.assertDictEqual(beforeRep, afterRep)
+
     def testSolveNoSolution(self):
         pass
 
@@ -417,6 +507,1615 @@ class TestDLX2(unittest.TestCase):
         #              21  22      23       [4,5,7]
         pass
 
+# Columns, rows and secondary columns for placing n queens, where the
+# diagonals are secondary columns.
+def queensMatrix(n):
+    columns = list(range(6*n - 2))
+    rows = []
+    for r in range(n):
+        for c in range(n):
+            rows.append([r, n + c, 2*n + r + c, 4*n - 1 + r - c + n - 1])
+    return columns, rows, range(2*n, 6*n - 2)
+
+
+class TestArrayEngine(unittest.TestCase):
+    def solve(self, engine, columns, rows):
+        d = dlx.DLX(engine)
+        d.setColumns(columns)
+        d.setRows(rows)
+        return [x for x in d.solve()]
+
+    def testSolve(self):
+        solutions = self.solve("array", EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        self.assertListEqual(solutions, [[1, 3, 5]])
+
+    def testSameSolutionsAsNodes(self):
+        for seed in range(20):
+            columns, rows = randomMatrix(seed)
+            self.assertListEqual(
+                self.solve("array", columns, rows),
+                self.solve("nodes", columns, rows)
+            )
+
+    def testNoColumns(self):
+        self.assertListEqual(self.solve("array", [], []), [[]])
+
+    def testEmptyColumn(self):
+        self.assertListEqual(self.solve("array", [1, 2], [[0]]), [])
+
+    def testLinksRestoredAfterSolve(self):
+        columns, rows = randomMatrix(1)
+        d = dlx.DLX("array")
+        d.setColumns(columns)
+        d.setRows(rows)
+        solutions = d.solve()
+        next(solutions)
+        solutions.close()
+        engine = d._engine
+        fresh = dlx.ArrayEngine(columns, rows)
+        self.assertEqual(engine.llink, fresh.llink)
+        self.assertEqual(engine.rlink, fresh.rlink)
+        self.assertEqual(engine.ulink, fresh.ulink)
+        self.assertEqual(engine.dlink, fresh.dlink)
+        self.assertEqual(engine.length, fresh.length)
+
+    def testUnknownEngine(self):
+        with self.assertRaises(Exception):
+            dlx.DLX("linked-list")
+
+
+class TestColumnSelection(unittest.TestCase):
+    def testSameSolutionsAsScan(self):
+        for seed in range(20):
+            columns, rows = randomMatrix(seed)
+            scan = makeDlx(columns, rows, columnSelection="scan")
+            buckets = makeDlx(columns, rows, columnSelection="buckets")
+            self.assertListEqual(
+                [x for x in buckets.solve()],
+                [x for x in scan.solve()]
+            )
+
+    def testHeapsSameSolutionsAsScan(self):
+        # every bucket with a column gets a heap
+        heapMin = dlx.BUCKET_HEAP_MIN
+        dlx.BUCKET_HEAP_MIN = 0
+        try:
+            for seed in range(20):
+                columns, rows = randomMatrix(seed)
+                scan = makeDlx(columns, rows, columnSelection="scan")
+                buckets = makeDlx(columns, rows, columnSelection="buckets")
+                search = buckets.solve()
+                first = next(search)
+                self.assertTrue(any(h is not None for h in buckets.columnBuckets.heaps))
+                self.assertListEqual(
+                    [first] + [x for x in search],
+                    [x for x in scan.solve()]
+                )
+        finally:
+            dlx.BUCKET_HEAP_MIN = heapMin
+
+    def bucketContents(self, d):
+        return [sorted(b) for b in d.columnBuckets.buckets]
+
+    def testBucketsFollowCoverAndUncover(self):
+        columns, rows = randomMatrix(3)
+        d = makeDlx(columns, rows, columnSelection="buckets")
+        d._linkTogether()
+        before = self.bucketContents(d)
+        for ci, columnHeader in d.columnIds.items():
+            self.assertIn(ci, d.columnBuckets.buckets[columnHeader.size])
+
+        covered = []
+        for _ in range(3):
+            columnHeader = d._chooseColumn()
+            covered.append(columnHeader)
+            d._coverColumn(columnHeader)
+            for size, bucket in enumerate(d.columnBuckets.buckets):
+                for ci in bucket:
+                    self.assertEqual(d.columnIds[ci].size, size)
+            active = set(c.nodeId for c in d.listHeader.iterateRight(False))
+            inBuckets = set(
+                d.columnIds[ci].nodeId
+                for bucket in d.columnBuckets.buckets for ci in bucket)
+            self.assertSetEqual(active, inBuckets)
+
+        for columnHeader in reversed(covered):
+            d._uncoverColumn(columnHeader)
+        self.assertListEqual(self.bucketContents(d), before)
+
+    def testBucketsNeedNodesEngine(self):
+        with self.assertRaises(Exception):
+            dlx.DLX("array", columnSelection="buckets")
+
+
+class TestSecondaryColumns(unittest.TestCase):
+    def solve(self, columns, rows, secondary, **options):
+        d = dlx.DLX(**options)
+        d.setColumns(columns, secondary)
+        d.setRows(rows)
+        return [x for x in d.solve()]
+
+    def testSecondaryColumnMayBeLeftUncovered(self):
+        for engine in dlx.ENGINES:
+            solutions = self.solve([1, 2], [[0], [0, 1], [1]], [1], engine=engine)
+            self.assertListEqual(solutions, [[0], [1]])
+
+    def testSecondaryColumnCoveredAtMostOnce(self):
+        # rows 0 and 1 cover both primaries but clash on the secondary
+        for engine in dlx.ENGINES:
+            solutions = self.solve([1, 2, 3], [[0, 2], [1, 2], [0], [1]], [2], engine=engine)
+            self.assertListEqual(sorted(map(sorted, solutions)), [[0, 3], [1, 2], [2, 3]])
+
+    def testQueens(self):
+        counts = {4: 2, 5: 10, 6: 4, 7: 40, 8: 92}
+        for n, count in counts.items():
+            columns, rows, secondary = queensMatrix(n)
+            for options in [{"engine": "nodes"}, {"engine": "array"}, {"columnSelection": "buckets"}]:
+                solutions = self.solve(columns, rows, secondary, **options)
+                self.assertEqual(len(solutions), count)
+
+    def testSameSolutionsAcrossEngines(self):
+        columns, rows, secondary = queensMatrix(7)
+        self.assertListEqual(
+            self.solve(columns, rows, secondary, engine="array"),
+            self.solve(columns, rows, secondary, engine="nodes")
+        )
+        self.assertListEqual(
+            self.solve(columns, rows, secondary, columnSelection="buckets"),
+            self.solve(columns, rows, secondary, engine="nodes")
+        )
+
+    def testSecondaryNeverChosen(self):
+        d = dlx.DLX()
+        d.setColumns([1, 2, 3], secondary=[0])
+        d.setRows([[0, 1], [0, 2], [1], [2]])
+        d._linkTogether()
+        self.assertListEqual(
+            [c.name for c in d.listHeader.iterateRight(False)],
+            [2, 3]
+        )
+
+    def testSecondaryOutOfRange(self):
+        with self.assertRaises(Exception):
+            dlx.DLX().setColumns([1, 2], secondary=[2])
+
+
+class TestCount(unittest.TestCase):
+    def testCountMatchesSolve(self):
+        for seed in range(5):
+            columns, rows = randomMatrix(seed)
+            for engine in dlx.ENGINES:
+                d = makeDlx(columns, rows, engine=engine)
+                self.assertEqual(d.count(), len([x for x in d.solve()]))
+
+    def testCountNoSolution(self):
+        d = makeDlx([1, 2], [[0]])
+        self.assertEqual(d.count(), 0)
+        self.assertEqual(d.stats.nodes[0], 1)
+        self.assertEqual(d.stats.solutions, 0)
+
+    def testLimit(self):
+        columns, rows, secondary = queensMatrix(8)
+        d = makeDlx(columns, rows, secondary)
+        self.assertEqual(d.count(limit=10), 10)
+        self.assertEqual(d.stats.solutions, 10)
+        self.assertEqual(d.count(limit=1000), 92)
+
+    def testStats(self):
+        columns, rows, secondary = queensMatrix(6)
+        stats = []
+        for engine in dlx.ENGINES:
+            d = makeDlx(columns, rows, secondary, engine=engine)
+            self.assertEqual(d.count(), 4)
+            stats.append(d.stats)
+        nodes, array, bitset = stats
+        self.assertListEqual(nodes.nodes, array.nodes)
+        self.assertListEqual(nodes.nodes, bitset.nodes)
+        self.assertDictEqual(nodes.columnSizes, bitset.columnSizes)
+        self.assertEqual(nodes.updates, array.updates)
+        self.assertEqual(nodes.nodes[0], 1)
+        # every solution places a queen on each of the 6 ranks
+        self.assertEqual(len(nodes.nodes), 7)
+        self.assertEqual(nodes.nodes[6], 4)
+        self.assertGreater(nodes.updates, 0)
+        self.assertEqual(nodes.totalNodes(), sum(nodes.nodes))
+        self.assertEqual(sum(nodes.depthUpdates), nodes.updates)
+        self.assertListEqual(nodes.depthUpdates, array.depthUpdates)
+        self.assertDictEqual(nodes.columnSizes, array.columnSizes)
+
+    def testAutoEngine(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        self.assertEqual(d.count(), 1)
+        self.assertIsInstance(d._engine, dlx.BitsetEngine)
+        wide = list(range(dlx.BITSET_MAX_COLUMNS + 1))
+        d = makeDlx(wide, [[ci] for ci in wide])
+        self.assertEqual(d.count(), 1)
+        self.assertIs(d._engine, d)
+        # a tall, narrow matrix would need rows * rows bits of conflicts
+        tall = [[ci % 10] for ci in range(dlx.BITSET_MAX_ROWS + 1)]
+        d = makeDlx(list(range(10)), tall)
+        self.assertEqual(d.count(limit=1), 1)
+        self.assertIs(d._engine, d)
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS, columnSelection="buckets")
+        self.assertEqual(d.count(), 1)
+        self.assertIs(d._engine, d)
+
+    def testSolveStats(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+        self.assertIsNone(d.stats)
+
+        d.collectStats()
+        self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+        stats = d.stats
+        self.assertListEqual(stats.nodes, [1, 2, 1, 1])
+        self.assertEqual(stats.solutions, 1)
+        # the first column has 2 rows, then a dead end, then 1 row twice
+        self.assertDictEqual(stats.columnSizes, {0: 1, 1: 2, 2: 1})
+        self.assertIsNotNone(stats.firstSolutionSeconds)
+        self.assertGreaterEqual(stats.seconds, stats.firstSolutionSeconds)
+
+        d.collectStats(False)
+        next(d.solve())
+        self.assertIsNone(d.stats)
+
+    def testStatsExport(self):
+        columns, rows, secondary = queensMatrix(5)
+        d = makeDlx(columns, rows, secondary)
+        d.count()
+        exported = d.stats.asDict()
+        self.assertEqual(exported["solutions"], 10)
+        self.assertEqual(exported["totalNodes"], d.stats.totalNodes())
+        self.assertEqual(len(exported["branchingFactors"]), len(exported["nodes"]) - 1)
+        loaded = json.loads(d.stats.toJson())
+        self.assertListEqual(loaded["nodes"], exported["nodes"])
+        self.assertEqual(loaded["updates"], exported["updates"])
+        self.assertDictEqual(
+            loaded["columnSizes"],
+            {str(size): n for size, n in exported["columnSizes"].items()})
+
+
+class TestCompile(unittest.TestCase):
+    def setUp(self):
+        self.dlx = dlx.DLX("nodes")
+        self.dlx.setColumns(EXAMPLE_COLUMNS)
+        self.dlx.setRows(EXAMPLE_ROWS)
+
+    def testSolveWithPartial(self):
+        self.dlx.compile()
+        beforeRep = self.dlx._getDlxRepresentation()
+        self.assertListEqual([x for x in self.dlx.solve(partial=[3])], [[3, 5, 1]])
+        self.assertListEqual([x for x in self.dlx.solve(partial=[5, 3])], [[5, 3, 1]])
+        self.assertListEqual([x for x in self.dlx.solve(partial=[0])], [])
+        self.assertListEqual([x for x in self.dlx.solve()], [[1, 3, 5]])
+        self.assertDictEqual(self.dlx._getDlxRepresentation(), beforeRep)
+
+    def testClashingPartial(self):
+        self.dlx.compile()
+        beforeRep = self.dlx._getDlxRepresentation()
+        self.assertListEqual([x for x in self.dlx.solve(partial=[1, 0])], [])
+        self.assertEqual(self.dlx.count(partial=[4, 5]), 0)
+        self.assertDictEqual(self.dlx._getDlxRepresentation(), beforeRep)
+
+    def testPartialOutOfRange(self):
+        self.dlx.compile()
+        with self.assertRaises(Exception):
+            [x for x in self.dlx.solve(partial=[6])]
+
+    def testCompileLinksOnce(self):
+        self.dlx.compile()
+        listHeader = self.dlx.listHeader
+        self.assertEqual(self.dlx.count(partial=[1]), 1)
+        [x for x in self.dlx.solve(partial=[3])]
+        self.assertIs(self.dlx.listHeader, listHeader)
+
+        self.dlx.setRows(EXAMPLE_ROWS)
+        [x for x in self.dlx.solve()]
+        self.assertIsNot(self.dlx.listHeader, listHeader)
+
+    def testManyPartialsOnRandomMatrix(self):
+        columns, rows = randomMatrix(6)
+        for engine in dlx.ENGINES:
+            compiled = dlx.DLX(engine).setColumns(columns).setRows(rows).compile()
+            for solution in dlx.DLX().setColumns(columns).setRows(rows).solve():
+                partial = solution[:2]
+                fresh = dlx.DLX(engine).setColumns(columns).setRows(rows)
+                self.assertListEqual(
+                    [x for x in compiled.solve(partial=partial)],
+                    [x for x in fresh.solve(partial=partial)]
+                )
+                self.assertIn(solution, [x for x in compiled.solve(partial=partial)])
+
+    def testOneSearchAtATime(self):
+        self.dlx.compile()
+        first = self.dlx.solve(partial=[1])
+        next(first)
+        with self.assertRaises(Exception):
+            next(self.dlx.solve())
+        first.close()
+        self.assertEqual(self.dlx.count(), 1)
+
+
+class TestSolveParallel(unittest.TestCase):
+    def testOrderedMatchesSolve(self):
+        columns, rows = randomMatrix(4)
+        expected = [x for x in makeDlx(columns, rows).solve()]
+        for engine in dlx.ENGINES:
+            d = makeDlx(columns, rows, engine=engine)
+            for depth in [None, 1, 3]:
+                self.assertListEqual(
+                    [x for x in d.solveParallel(workers=2, depth=depth)],
+                    expected
+                )
+
+    def testUnordered(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = makeDlx(columns, rows, secondary)
+        expected = [x for x in d.solve()]
+        got = [x for x in d.solveParallel(workers=2, ordered=False)]
+        self.assertListEqual(sorted(got), sorted(expected))
+
+    def testSplitDeeperThanTree(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        self.assertListEqual(
+            [x for x in d.solveParallel(workers=1, depth=10)],
+            [[1, 3, 5]]
+        )
+
+    def testDepthZero(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        for depth in [0, -1]:
+            with self.assertRaises(Exception):
+                next(d.solveParallel(workers=1, depth=depth))
+
+    def testSubproblemsCoverTheTree(self):
+        columns, rows = randomMatrix(5)
+        d = makeDlx(columns, rows)
+        subproblems = d._subproblems(None, 16)
+        self.assertGreaterEqual(len(subproblems), 16)
+        # no sub-problem is a prefix of another one
+        asTuples = [tuple(p) for p in subproblems]
+        for p in asTuples:
+            for q in asTuples:
+                if p != q:
+                    self.assertNotEqual(q[:len(p)], p)
+
+    def testCoverRowsClash(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        d._linkTogether()
+        beforeRep = d._getDlxRepresentation()
+        self.assertIsNone(d._coverRows([0, 1]))
+        covered = d._coverRows([1, 3])
+        self.assertListEqual([x for x in d._search()], [[5]])
+        d._uncoverRows(covered)
+        self.assertDictEqual(d._getDlxRepresentation(), beforeRep)
+
+
+class TestMatrixInput(unittest.TestCase):
+    # EXAMPLE_ROWS as CSR arrays
+    INDPTR = [0, 3, 5, 8, 11, 15, 17]
+    INDICES = [0,3,6, 0,3, 3,4,6, 2,4,5, 1,2,5,6, 1,6]
+
+    def testCSRRows(self):
+        rows = dlx.CSRRows(self.INDPTR, self.INDICES)
+        self.assertEqual(len(rows), len(EXAMPLE_ROWS))
+        self.assertListEqual([list(row) for row in rows], EXAMPLE_ROWS)
+
+    def testSetRowsFromArrays(self):
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine).setColumns(EXAMPLE_COLUMNS)
+            d.setRowsFromArrays(self.INDPTR, self.INDICES)
+            self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+
+    def testSetRowsFromArraysNeedsColumns(self):
+        with self.assertRaises(Exception):
+            dlx.DLX().setRowsFromArrays(self.INDPTR, self.INDICES)
+
+    def testArraysValidation(self):
+        d = dlx.DLX().setColumns(EXAMPLE_COLUMNS)
+        for indptr, indices in [
+            ([0, 2], [0, 7]),     # column out of range
+            ([0, 2], [0, -1]),    # negative column
+            ([0, 2], [3, 3]),     # column repeated in a row
+            ([0, 3], [0, 1]),     # indptr past the end of indices
+            ([0, 2, 1], [0, 1]),  # decreasing indptr
+            ([1, 2], [0, 1]),     # not starting at 0
+        ]:
+            with self.assertRaises(Exception):
+                d.setRowsFromArrays(indptr, indices)
+
+    def testRowsValidation(self):
+        for rows in [[[0, 7]], [[-1]], [[2, 2]]]:
+            d = dlx.DLX().setColumns(EXAMPLE_COLUMNS).setRows(rows)
+            with self.assertRaises(Exception):
+                next(d.solve())
+
+    def testRandomMatrixAsArrays(self):
+        columns, rows = randomMatrix(3)
+        indptr = [0]
+        for row in rows:
+            indptr.append(indptr[-1] + len(row))
+        indices = [ci for row in rows for ci in row]
+        for engine in dlx.ENGINES:
+            expected = [x for x in dlx.DLX(engine).setColumns(columns).setRows(rows).solve()]
+            d = dlx.DLX(engine).setColumns(columns).setRowsFromArrays(indptr, indices)
+            self.assertListEqual([x for x in d.solve()], expected)
+
+    @unittest.skipIf(dlx.numpy is None, "needs numpy")
+    def testLinkArraysMatchesLinkRows(self):
+        columns, rows = randomMatrix(4)
+        fromLists = dlx.ArrayEngine(columns, rows)
+        indptr = dlx.numpy.cumsum([0] + [len(row) for row in rows])
+        indices = dlx.numpy.array([ci for row in rows for ci in row])
+        fromArrays = dlx.ArrayEngine(columns, dlx.CSRRows(indptr, indices))
+        for name in ("llink", "rlink", "length", "top", "ulink", "dlink", "rowStart"):
+            self.assertListEqual(list(getattr(fromArrays, name)), list(getattr(fromLists, name)), name)
+
+    # Linked with numpy when it is installed, which needs at least one entry
+    def testNoEntries(self):
+        sources = [([0, 0], [])]
+        if dlx.numpy is not None:
+            sources.append((dlx.numpy.zeros(2, dtype=int), dlx.numpy.zeros(0, dtype=int)))
+        for indptr, indices in sources:
+            d = dlx.DLX("array").setColumns([0, 1], [1]).setRowsFromArrays(indptr, indices)
+            self.assertListEqual([x for x in d.solve()], [])
+            d = dlx.DLX("array").setColumns([0, 1], [0, 1]).setRowsFromArrays(indptr, indices)
+            self.assertListEqual([x for x in d.solve()], [[]])
+        d = dlx.DLX("array").setColumns([0, 1], [0, 1]).setRows(iter([[]]))
+        self.assertListEqual([x for x in d.solve()], [[]])
+
+    @unittest.skipIf(dlx.numpy is None, "needs numpy")
+    def testSetDense(self):
+        matrix = dlx.numpy.zeros((len(EXAMPLE_ROWS), len(EXAMPLE_COLUMNS)), dtype=bool)
+        for ri, row in enumerate(EXAMPLE_ROWS):
+            matrix[ri, row] = True
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine).setColumns(EXAMPLE_COLUMNS).setDense(matrix)
+            self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+        with self.assertRaises(Exception):
+            dlx.DLX().setColumns(EXAMPLE_COLUMNS[:-1]).setDense(matrix)
+
+    @unittest.skipIf(dlx.numpy is None, "needs numpy")
+    def testSetMatrix(self):
+        try:
+            from scipy import sparse
+        except ImportError:
+            self.skipTest("needs scipy")
+        matrix = sparse.csr_matrix(
+            (dlx.numpy.ones(len(self.INDICES)), self.INDICES, self.INDPTR),
+            shape=(len(EXAMPLE_ROWS), len(EXAMPLE_COLUMNS)))
+        d = dlx.DLX().setColumns(EXAMPLE_COLUMNS).setMatrix(matrix.tocoo())
+        self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+        # explicit zeros are not entries
+        matrix.data[0] = 0
+        d.setMatrix(matrix)
+        self.assertListEqual(list(d.rows[0]), [3, 6])
+
+
+class TestCheckpoint(unittest.TestCase):
+    def testResumeAfterRootSolution(self):
+        # the partial rows, or a matrix of secondary columns, leave nothing
+        # to search
+        cases = [([0, 1], [[0], [1], [0, 1]], None, [0, 1]), ([0, 1], [[0], [1]], [0, 1], None)]
+        for columns, rows, secondary, partial in cases:
+            for engine in dlx.ENGINES:
+                d = makeDlx(columns, rows, secondary, engine=engine)
+                search = d.solve(partial=partial)
+                next(search)
+                checkpoint = d.checkpoint()
+                search.close()
+                self.assertListEqual([x for x in d.solve(resume=checkpoint)], [])
+                self.assertEqual(d.count(resume=checkpoint), 0)
+
+        # with preprocess the forced rows are the root solution, each of its
+        # duplicates another one
+        d = makeDlx([0, 1], [[0], [0], [1]], preprocess=True)
+        search = d.solve()
+        first = next(search)
+        checkpoint = d.checkpoint()
+        search.close()
+        self.assertListEqual([first] + [x for x in d.solve(resume=checkpoint)], [x for x in d.solve()])
+
+    def testResumeEverySolution(self):
+        columns, rows, secondary = queensMatrix(6)
+        for options in [{"engine": "nodes"}, {"engine": "array"}, {"columnSelection": "buckets"}]:
+            d = makeDlx(columns, rows, secondary, **options)
+            expected = [x for x in d.solve()]
+            for stop in range(len(expected)):
+                search = d.solve()
+                found = [next(search) for _ in range(stop + 1)]
+                checkpoint = d.checkpoint()
+                search.close()
+                resumed = makeDlx(columns, rows, secondary, **options)
+                found += [x for x in resumed.solve(resume=checkpoint)]
+                self.assertListEqual(found, expected)
+
+    def testResumeRandomMatrices(self):
+        for seed in range(5):
+            columns, rows = randomMatrix(seed)
+            d = makeDlx(columns, rows)
+            expected = [x for x in d.solve()]
+            search = d.solve()
+            found = [next(search) for _ in range(len(expected) // 2)]
+            checkpoint = d.checkpoint()
+            search.close()
+            self.assertEqual(d.count(resume=checkpoint), len(expected) - len(found))
+            self.assertListEqual(found + [x for x in d.solve(resume=checkpoint)], expected)
+
+    def testResumeWithPartial(self):
+        d = makeDlx(*queensMatrix(6)).compile()
+        expected = [x for x in d.solve(partial=[1])]
+        search = d.solve(partial=[1])
+        first = next(search)
+        checkpoint = d.checkpoint()
+        search.close()
+        self.assertListEqual(checkpoint["partial"], [1])
+        self.assertListEqual([first] + [x for x in d.solve(resume=checkpoint)], expected)
+        with self.assertRaises(Exception):
+            next(d.solve(partial=[2], resume=checkpoint))
+
+    def testSaveAndLoad(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = makeDlx(columns, rows, secondary)
+        expected = [x for x in d.solve()]
+        search = d.solve()
+        first = next(search)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "search.json")
+            d.saveCheckpoint(path)
+            search.close()
+            checkpoint = dlx.loadCheckpoint(path)
+        resumed = makeDlx(columns, rows, secondary)
+        self.assertListEqual([first] + [x for x in resumed.solve(resume=checkpoint)], expected)
+
+    def testCountInSteps(self):
+        columns, rows, secondary = queensMatrix(8)
+        for options in [{"engine": "nodes"}, {"engine": "array"}, {"engine": "bitset"},
+                        {"columnSelection": "buckets"}, {"preprocess": True}]:
+            d = makeDlx(columns, rows, secondary, **options).compile()
+            checkpoint = None
+            steps = 0
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "count.json")
+                while True:
+                    found = d.count(resume=checkpoint, maxNodes=100)
+                    if d.stopReason is None:
+                        break
+                    before = 0 if checkpoint is None else checkpoint["solutions"]
+                    d.saveCheckpoint(path)
+                    checkpoint = dlx.loadCheckpoint(path)
+                    self.assertTrue(checkpoint["pending"])
+                    self.assertEqual(checkpoint["solutions"], before + found)
+                    steps += 1
+            self.assertGreater(steps, 10)
+            self.assertEqual(checkpoint["solutions"] + found, 92)
+
+    def testResumeAfterCancel(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = makeDlx(columns, rows, secondary)
+        expected = [x for x in d.solve()]
+        for maxNodes in [1, 7, 40, 100]:
+            found = [x for x in d.solve(maxNodes=maxNodes)]
+            self.assertEqual(d.stopReason, "nodes")
+            checkpoint = d.checkpoint()
+            self.assertEqual(checkpoint["solutions"], len(found))
+            found += [x for x in d.solve(resume=checkpoint)]
+            self.assertListEqual(found, expected)
+
+        cancel = dlx.CancelToken()
+        cancel.cancel()
+        self.assertListEqual([x for x in d.solve(cancel=cancel)], [])
+        self.assertListEqual([x for x in d.solve(resume=d.checkpoint())], expected)
+
+    def testNoRunningSearch(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        with self.assertRaises(Exception):
+            d.checkpoint()
+        self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+        with self.assertRaises(Exception):
+            d.checkpoint()
+
+    def testDifferentMatrix(self):
+        d = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS)
+        search = d.solve()
+        next(search)
+        checkpoint = d.checkpoint()
+        search.close()
+        other = makeDlx(EXAMPLE_COLUMNS, EXAMPLE_ROWS[:-1])
+        with self.assertRaises(Exception):
+            next(other.solve(resume=checkpoint))
+        checkpoint["position"] = [5, 0, 0]
+        with self.assertRaises(Exception):
+            next(d.solve(resume=checkpoint))
+        # the links are put back after a bad checkpoint
+        self.assertListEqual([x for x in d.solve()], [[1, 3, 5]])
+
+
+class TestPreprocess(unittest.TestCase):
+    COLUMNS = ["a", "b", "c", "d", "e"]
+    ROWS = [
+        [0],
+        [0, 1],
+        [1, 2],
+        [3, 4],  # the only row with d
+        [1, 4],  # clashes with the row above
+        [2, 1],  # the same as row 2
+        [],
+    ]
+
+    def testReduction(self):
+        d = makeDlx(self.COLUMNS, self.ROWS, preprocess=True)
+        self.assertListEqual([x for x in d.solve()], [[0, 2, 3], [0, 5, 3]])
+        self.assertDictEqual(d.reduction.asDict(), {
+            "forcedRows": [0, 2, 3],
+            "deadRows": [1, 4],
+            "duplicateRows": [5],
+            "emptyRows": [6],
+            "removedColumns": [0, 1, 2, 3, 4],
+            "infeasible": False,
+            "rows": 0,
+            "columns": 0,
+        })
+        self.assertEqual(d.count(), 2)
+
+    def testPartial(self):
+        d = makeDlx(self.COLUMNS, self.ROWS, preprocess=True).compile()
+        self.assertListEqual([x for x in d.solve(partial=[5])], [[5, 0, 3]])
+        self.assertListEqual([x for x in d.solve(partial=[3, 2])], [[3, 2, 0]])
+        self.assertListEqual([x for x in d.solve(partial=[4])], [])
+        self.assertListEqual([x for x in d.solve(partial=[2, 5])], [])
+        self.assertEqual(d.count(partial=[2]), 1)
+        with self.assertRaises(Exception):
+            next(d.solve(partial=[7]))
+
+    def testInfeasible(self):
+        # c forces the second row, which leaves a without any rows
+        d = makeDlx(["a", "b", "c"], [[0, 1], [1, 2]], preprocess=True)
+        self.assertListEqual([x for x in d.solve()], [])
+        self.assertTrue(d.reduction.infeasible)
+
+    def testSameSolutionsAsWithout(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            columns, rows = randomMatrix(seed, numColumns=8, partitions=2, extraRows=8)
+            rows += [list(rng.choice(rows)) for _ in range(2)]
+            rng.shuffle(rows)
+            for engine in dlx.ENGINES:
+                expected = sorted(sorted(x) for x in dlx.DLX(engine).setColumns(columns).setRows(rows).solve())
+                d = makeDlx(columns, rows, engine=engine, preprocess=True)
+                self.assertListEqual(sorted(sorted(x) for x in d.solve()), expected)
+                self.assertEqual(d.count(), len(expected))
+
+    def testSecondaryColumns(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = makeDlx(columns, rows, secondary, preprocess=True)
+        self.assertEqual(d.count(), 4)
+
+    def testResumeWithDuplicates(self):
+        columns, rows = randomMatrix(2, numColumns=8, partitions=3, extraRows=5)
+        rows = rows + rows[:4]
+        d = makeDlx(columns, rows, preprocess=True)
+        expected = [x for x in d.solve()]
+        self.assertGreater(len(d.reduction.duplicateRows), 0)
+        for stop in range(len(expected)):
+            search = d.solve()
+            found = [next(search) for _ in range(stop + 1)]
+            checkpoint = d.checkpoint()
+            search.close()
+            found += [x for x in d.solve(resume=checkpoint)]
+            self.assertListEqual(found, expected)
+        with self.assertRaises(Exception):
+            next(dlx.DLX().setColumns(columns).setRows(rows).solve(resume=checkpoint))
+
+    def testSolveParallel(self):
+        d = makeDlx(self.COLUMNS, self.ROWS, preprocess=True)
+        self.assertListEqual([x for x in d.solveParallel(workers=1)], [[0, 2, 3], [0, 5, 3]])
+
+
+# The disjoint union of some matrices, each one given as (columns, rows,
+# secondary)
+def unionMatrix(parts):
+    columns, rows, secondary = [], [], []
+    for partColumns, partRows, partSecondary in parts:
+        offset = len(columns)
+        columns += partColumns
+        rows += [[offset + ci for ci in row] for row in partRows]
+        secondary += [offset + ci for ci in partSecondary]
+    return columns, rows, secondary
+
+class TestDecompose(unittest.TestCase):
+    def testConnectedComponents(self):
+        rows = [[0, 2], [1], [3, 1], [], [2]]
+        self.assertListEqual(
+            dlx._connectedComponents(5, rows),
+            [([0, 2], [0, 4]), ([1, 3], [1, 2]), ([4], [])])
+
+    def testLazyProduct(self):
+        self.assertListEqual(
+            [x for x in dlx._lazyProduct([iter([[1], [2]]), iter([[3], [4, 5]])])],
+            [[1, 3], [1, 4, 5], [2, 3], [2, 4, 5]])
+        self.assertListEqual([x for x in dlx._lazyProduct([iter([[1]]), iter([])])], [])
+        # the first iterator is only read as far as needed
+        endless = ([i] for i in itertools.count())
+        self.assertListEqual(
+            list(itertools.islice(dlx._lazyProduct([endless, iter([[7], [8]])]), 5)),
+            [[0, 7], [0, 8], [1, 7], [1, 8], [2, 7]])
+
+    def testSameSolutionsAsWithout(self):
+        for seed in range(10):
+            parts = [randomMatrix(seed * 3 + k, numColumns=6, partitions=2, extraRows=4) + ([],)
+                     for k in range(3)]
+            columns, rows, secondary = unionMatrix(parts)
+            random.Random(seed).shuffle(rows)
+            expected = [x for x in dlx.DLX().setColumns(columns).setRows(rows).solve()]
+            for engine in dlx.ENGINES:
+                d = makeDlx(columns, rows, engine=engine, decompose=True)
+                self.assertListEqual(
+                    sorted(sorted(x) for x in d.solve()),
+                    sorted(sorted(x) for x in expected))
+                self.assertEqual(d.count(), len(expected))
+                self.assertEqual(len(d.components), 3)
+
+    def testCountIsProduct(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(5), queensMatrix(6)])
+        d = makeDlx(columns, rows, secondary, decompose=True)
+        self.assertEqual(d.count(), 4 * 10 * 4)
+        self.assertEqual(d.stats.solutions, 160)
+        self.assertEqual(d.count(limit=7), 7)
+        solutions = [x for x in d.solve()]
+        self.assertEqual(len(solutions), 160)
+        self.assertEqual(len(set(tuple(sorted(x)) for x in solutions)), 160)
+
+    def testPartial(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(6)])
+        d = makeDlx(columns, rows, secondary, decompose=True).compile()
+        plain = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        for partial in ([1], [1, 36 + 4], [0]):
+            self.assertListEqual(
+                sorted(d.solve(partial=partial)),
+                sorted(plain.solve(partial=partial)))
+            self.assertEqual(d.count(partial=partial), plain.count(partial=partial))
+        with self.assertRaises(Exception):
+            next(d.solve(partial=[len(rows)]))
+
+    def testNoSolutionInOneComponent(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(3)])
+        d = makeDlx(columns, rows, secondary, decompose=True)
+        self.assertListEqual([x for x in d.solve()], [])
+        self.assertEqual(d.count(), 0)
+
+    def testSingleComponent(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = makeDlx(columns, rows, secondary, decompose=True)
+        search = d.solve()
+        next(search)
+        # a single component is searched as usual
+        d.checkpoint()
+        search.close()
+
+    def testCheckpointNotSupported(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(5), queensMatrix(5)])
+        d = makeDlx(columns, rows, secondary, decompose=True)
+        search = d.solve()
+        next(search)
+        with self.assertRaises(Exception):
+            d.checkpoint()
+        search.close()
+
+    def testSolveParallel(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(5), queensMatrix(6)])
+        d = makeDlx(columns, rows, secondary, decompose=True)
+        self.assertListEqual(sorted(d.solveParallel(workers=2)), sorted(d.solve()))
+
+    def testSolveParallelOrder(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(4), queensMatrix(5)])
+        d = makeDlx(columns, rows, secondary, decompose=True)
+        self.assertListEqual([x for x in d.solveParallel(workers=2)], [x for x in d.solve()])
+
+
+class TestSolveRandom(unittest.TestCase):
+    def assertExactCover(self, columns, rows, secondary, solution):
+        counts = [0] * len(columns)
+        for rowIndex in solution:
+            for columnIndex in rows[rowIndex]:
+                counts[columnIndex] += 1
+        for columnIndex, count in enumerate(counts):
+            if columnIndex in secondary:
+                self.assertLessEqual(count, 1)
+            else:
+                self.assertEqual(count, 1)
+
+    def testLuby(self):
+        self.assertListEqual(
+            [dlx._luby(i) for i in range(1, 16)],
+            [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8])
+
+    def testFindsSolutions(self):
+        columns, rows, secondary = queensMatrix(8)
+        for engine in dlx.ENGINES:
+            for restarts in dlx.RESTARTS:
+                for seed in range(3):
+                    d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows)
+                    solution = d.solveRandom(seed, restarts, unit=5)
+                    self.assertExactCover(columns, rows, secondary, solution)
+                    self.assertListEqual(
+                        d.solveRandom(seed, restarts, unit=5), solution)
+
+    def testRestartsLeaveTheMatrixClean(self):
+        columns, rows, secondary = queensMatrix(6)
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows).compile()
+            expected = [x for x in d.solve()]
+            solution = d.solveRandom(1, "geometric", unit=1, factor=1.2, partial=[1])
+            self.assertGreater(d.restarts, 0)
+            self.assertEqual(solution[0], 1)
+            self.assertIn(sorted(solution), [sorted(x) for x in expected])
+            self.assertListEqual([x for x in d.solve()], expected)
+
+    def testNoSolution(self):
+        columns, rows, secondary = queensMatrix(3)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        self.assertIsNone(d.solveRandom(0, unit=1))
+        self.assertIsNone(d.solveRandom(0, restarts=None))
+        self.assertEqual(d.restarts, 0)
+
+    def testMaxNodes(self):
+        columns, rows, secondary = queensMatrix(10)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        self.assertIsNone(d.solveRandom(0, unit=1, maxNodes=5))
+        self.assertLessEqual(d.stats.totalNodes() - d.restarts - 1, 5)
+        with self.assertRaises(Exception):
+            d.solveRandom(0, restarts="linear")
+
+    def testOptions(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(5)])
+        for options in ({"preprocess": True}, {"decompose": True}):
+            d = dlx.DLX(**options).setColumns(columns, secondary).setRows(rows)
+            self.assertExactCover(columns, rows, secondary, d.solveRandom(2, unit=3))
+
+
+class TestSolveTo(unittest.TestCase):
+    def roundTrip(self, d, **options):
+        sink = io.BytesIO()
+        written = d.solveTo(sink, **options)
+        with dlx.SolutionReader(sink.getvalue()) as reader:
+            self.assertEqual(len(reader), written)
+            return [x for x in reader]
+
+    def testSameAsSolve(self):
+        columns, rows, secondary = queensMatrix(8)
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows)
+            expected = [sorted(x) for x in d.solve()]
+            self.assertListEqual(self.roundTrip(d, batchSize=10), expected)
+            self.assertListEqual(self.roundTrip(d, batchSize=1000), expected)
+
+    def testPartialAndOptions(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(5)])
+        expected = sorted(sorted(x) for x in dlx.DLX().setColumns(columns, secondary).setRows(rows).solve(partial=[2]))
+        for options in ({}, {"preprocess": True}, {"decompose": True}):
+            d = dlx.DLX(**options).setColumns(columns, secondary).setRows(rows)
+            self.assertListEqual(sorted(self.roundTrip(d, batchSize=3, partial=[2])), expected)
+
+    def testNoSolutions(self):
+        columns, rows, secondary = queensMatrix(3)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        self.assertListEqual(self.roundTrip(d), [])
+
+    def testBatches(self):
+        d = dlx.DLX().setColumns(EXAMPLE_COLUMNS).setRows(EXAMPLE_ROWS)
+        sink = io.BytesIO()
+        d.solveTo(sink, batchSize=1)
+        with dlx.SolutionReader(sink.getvalue()) as reader:
+            batches = [(list(lengths), list(values)) for lengths, values in reader.batches()]
+        self.assertListEqual(batches, [([3], [1, 2, 2])])
+
+    def testWideRows(self):
+        # 300 rows in one solution needs 2 byte lengths
+        columns = list(range(300))
+        d = dlx.DLX().setColumns(columns).setRows([[ci] for ci in columns])
+        self.assertListEqual(self.roundTrip(d), [columns])
+        self.assertEqual(dlx._narrowest([70000])[0], 4)
+
+    def testFile(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "solutions.bin")
+            with open(path, "wb") as f:
+                self.assertEqual(d.solveTo(f, batchSize=3), 4)
+            with dlx.SolutionReader(path) as reader:
+                self.assertListEqual([x for x in reader], [sorted(x) for x in d.solve()])
+
+    def testBadInput(self):
+        with self.assertRaises(Exception):
+            dlx.SolutionReader(b"not solutions")
+        d = dlx.DLX().setColumns(EXAMPLE_COLUMNS).setRows(EXAMPLE_ROWS)
+        sink = io.BytesIO()
+        d.solveTo(sink)
+        with self.assertRaises(Exception):
+            dlx.SolutionReader(sink.getvalue()[:-4])
+
+
+
+class TestBounds(unittest.TestCase):
+    # Every set of rows which covers each column within its bounds. Rows
+    # which only have secondary columns are never chosen.
+    def bruteForce(self, numColumns, rows, bounds, secondary=()):
+        candidates = [i for i, row in enumerate(rows) if not set(row) <= set(secondary)]
+        solutions = []
+        for size in range(len(candidates) + 1):
+            for chosen in itertools.combinations(candidates, size):
+                counts = [0] * numColumns
+                for rowIndex in chosen:
+                    for columnIndex in rows[rowIndex]:
+                        counts[columnIndex] += 1
+                low = [0 if ci in secondary else bounds.get(ci, (1, 1))[0] for ci in range(numColumns)]
+                high = [1 if ci in secondary else bounds.get(ci, (1, 1))[1] for ci in range(numColumns)]
+                if all(l <= c <= h for l, c, h in zip(low, counts, high)):
+                    solutions.append(list(chosen))
+        return sorted(solutions)
+
+    def testRandomMatrices(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            numColumns = rng.randint(1, 5)
+            rows = [rng.sample(range(numColumns), rng.randint(1, numColumns))
+                    for _ in range(rng.randint(0, 8))]
+            secondary = {ci for ci in range(numColumns) if rng.random() < 0.2}
+            bounds = {}
+            for ci in range(numColumns):
+                if ci not in secondary and rng.random() < 0.6:
+                    low = rng.randint(0, 2)
+                    bounds[ci] = (low, rng.randint(max(low, 1), 3))
+            expected = self.bruteForce(numColumns, rows, bounds, secondary)
+            d = dlx.DLX().setColumns(list(range(numColumns)), secondary, bounds).setRows(rows)
+            self.assertListEqual(sorted(sorted(x) for x in d.solve()), expected)
+            self.assertEqual(d.count(), len(expected))
+
+    def testPartial(self):
+        columns = ["a", "b", "c"]
+        rows = [[0, 1], [0], [1, 2], [2], [0, 2]]
+        bounds = {0: (1, 2), 2: 2}
+        d = dlx.DLX().setColumns(columns, None, bounds).setRows(rows).compile()
+        everything = sorted(sorted(x) for x in d.solve())
+        self.assertListEqual(everything, self.bruteForce(3, rows, {0: (1, 2), 2: (2, 2)}))
+        withRow = sorted(sorted(x) for x in d.solve(partial=[4]))
+        self.assertListEqual(withRow, [x for x in everything if 4 in x])
+        for solution in d.solve(partial=[4]):
+            self.assertEqual(solution[0], 4)
+        self.assertEqual(d.count(partial=[1, 4, 0]), 0)
+        self.assertEqual(d.count(partial=[1, 1]), 0)
+        # closing a search early puts back the links
+        search = d.solve(partial=[3])
+        next(search)
+        search.close()
+        self.assertListEqual(sorted(sorted(x) for x in d.solve()), everything)
+
+    def testSameAsCopies(self):
+        # 6 tasks over 2 days with 3 tasks each, against 3 copies of every day
+        columns = list(range(8))
+        rows = [[t, 6 + day] for t in range(6) for day in range(2)]
+        copyRows = [[t, 6 + day * 3 + k] for t in range(6) for day in range(2) for k in range(3)]
+        d = dlx.DLX().setColumns(columns, None, {6: 3, 7: 3}).setRows(rows)
+        copies = dlx.DLX().setColumns(list(range(12))).setRows(copyRows)
+        distinct = {frozenset(i // 3 for i in s) for s in copies.solve()}
+        self.assertEqual(d.count(), 20)
+        self.assertSetEqual({frozenset(s) for s in d.solve()}, distinct)
+        self.assertEqual(copies.count(), 20 * 6 * 6)
+
+    def testOptions(self):
+        columns, rows = ["a", "b"], [[0], [0, 1], [1]]
+        bounds = {0: (1, 2)}
+        expected = sorted(sorted(x) for x in dlx.DLX().setColumns(columns, None, bounds).setRows(rows).solve())
+        d = dlx.DLX(decompose=True).setColumns(columns, None, bounds).setRows(rows)
+        self.assertListEqual(sorted(sorted(x) for x in d.solve()), expected)
+        d = dlx.DLX().setColumns(columns, None, bounds).setRows(rows)
+        sink = io.BytesIO()
+        self.assertEqual(d.solveTo(sink), len(expected))
+        d.collectStats()
+        [x for x in d.solve()]
+        self.assertEqual(d.stats.solutions, len(expected))
+        self.assertGreater(d.stats.totalNodes(), 0)
+
+        for options in ({"engine": "nodes"}, {"engine": "bitset"}, {"preprocess": True}):
+            d = dlx.DLX(**options).setColumns(columns, None, bounds).setRows(rows)
+            with self.assertRaises(Exception):
+                d.count()
+        d = dlx.DLX().setColumns(columns, None, bounds).setRows(rows)
+        with self.assertRaises(Exception):
+            d.solveRandom(0)
+        with self.assertRaises(Exception):
+            next(d.solveParallel(2))
+
+    def testBadBounds(self):
+        for bounds in ({2: 1}, {0: (2, 1)}, {0: 0}, {0: (-1, 1)}, {1: 2}):
+            with self.assertRaises(Exception):
+                dlx.DLX().setColumns(["a", "b"], [1], bounds)
+
+
+
+class TestColors(unittest.TestCase):
+    # Every set of rows where each primary column is used once and each
+    # secondary column either at most once or only with one color
+    def bruteForce(self, numColumns, rows, secondary):
+        def entries(row):
+            return [(entry, None) if isinstance(entry, int) else tuple(entry) for entry in row]
+        candidates = [i for i, row in enumerate(rows)
+                      if any(ci not in secondary for ci, _ in entries(row))]
+        solutions = []
+        for size in range(len(candidates) + 1):
+            for chosen in itertools.combinations(candidates, size):
+                uses = [[] for _ in range(numColumns)]
+                for rowIndex in chosen:
+                    for columnIndex, color in entries(rows[rowIndex]):
+                        uses[columnIndex].append(color)
+                valid = True
+                for columnIndex, colors in enumerate(uses):
+                    if columnIndex not in secondary:
+                        valid = valid and len(colors) == 1
+                    elif None in colors:
+                        valid = valid and len(colors) == 1
+                    else:
+                        valid = valid and len(set(colors)) <= 1
+                if valid:
+                    solutions.append(list(chosen))
+        return sorted(solutions)
+
+    def testRandomMatrices(self):
+        rng = random.Random(5)
+        for _ in range(150):
+            numColumns = rng.randint(1, 6)
+            secondary = {ci for ci in range(numColumns) if rng.random() < 0.5}
+            rows = []
+            for _ in range(rng.randint(0, 8)):
+                row = []
+                for ci in rng.sample(range(numColumns), rng.randint(1, numColumns)):
+                    if ci in secondary and rng.random() < 0.7:
+                        row.append((ci, rng.choice("ab")))
+                    else:
+                        row.append(ci)
+                rows.append(row)
+            expected = self.bruteForce(numColumns, rows, secondary)
+            for options in ({"engine": "nodes"}, {"engine": "bitset"},
+                            {"columnSelection": "buckets"}, {"decompose": True}):
+                d = dlx.DLX(**options).setColumns(list(range(numColumns)), secondary).setRows(rows)
+                self.assertListEqual(sorted(sorted(x) for x in d.solve()), expected)
+
+    def testWordSquare(self):
+        # 2x2 squares: rows and columns both words
+        words = ["ab", "ba", "aa", "bc"]
+        columns = ["row 0", "row 1", "column 0", "column 1", "00", "01", "10", "11"]
+        cells = {(0, 0): 4, (0, 1): 5, (1, 0): 6, (1, 1): 7}
+        rows = []
+        for slot in range(4):
+            for word in words:
+                if slot < 2:
+                    rows.append([slot] + [(cells[slot, k], letter) for k, letter in enumerate(word)])
+                else:
+                    rows.append([slot] + [(cells[k, slot - 2], letter) for k, letter in enumerate(word)])
+        squares = set()
+        for engine in ("nodes", "bitset"):
+            d = dlx.DLX(engine).setColumns(columns, range(4, 8)).setRows(rows)
+            found = set()
+            for solution in d.solve():
+                found.add(tuple(words[i % 4] for i in sorted(solution)))
+            squares = squares or found
+            self.assertSetEqual(found, squares)
+        expected = set()
+        for top, bottom in itertools.product(words, repeat=2):
+            left, right = top[0] + bottom[0], top[1] + bottom[1]
+            if left in words and right in words:
+                expected.add((top, bottom, left, right))
+        self.assertEqual(len(expected), 8)
+        self.assertSetEqual(squares, expected)
+
+    def testPartial(self):
+        columns = ["p", "q", "x"]
+        rows = [[0, (2, "red")], [1, (2, "red")], [1, (2, "blue")], [1], [(2, "red")]]
+        for engine in ("nodes", "bitset"):
+            d = dlx.DLX(engine).setColumns(columns, [2]).setRows(rows).compile()
+            everything = sorted(sorted(x) for x in d.solve())
+            self.assertListEqual(everything, [[0, 1], [0, 3]])
+            self.assertListEqual([x for x in d.solve(partial=[4])], [[4, 0, 1], [4, 0, 3]])
+            self.assertListEqual([x for x in d.solve(partial=[2])], [])
+            self.assertListEqual([x for x in d.solve(partial=[4, 4])], [])
+            self.assertListEqual(sorted(sorted(x) for x in d.solve()), everything)
+
+    def testCheckpoint(self):
+        columns = ["p", "q", "x"]
+        rows = [[0, (2, "red")], [0, (2, "blue")], [1, (2, "red")], [1, (2, "blue")], [0, 1]]
+        d = dlx.DLX("nodes").setColumns(columns, [2]).setRows(rows)
+        expected = [x for x in d.solve()]
+        search = d.solve()
+        first = next(search)
+        checkpoint = d.checkpoint()
+        search.close()
+        self.assertListEqual([first] + [x for x in d.solve(resume=checkpoint)], expected)
+
+    def testBadColors(self):
+        rows = [[0, (1, "red")]]
+        for options in ({"engine": "array"}, {"preprocess": True}):
+            d = dlx.DLX(**options).setColumns(["a", "b"], [1]).setRows(rows)
+            with self.assertRaises(Exception):
+                d.count()
+        d = dlx.DLX().setColumns(["a", "b"]).setRows(rows)
+        with self.assertRaises(Exception):
+            d.count()
+        # a (column, None) pair is a column without a color
+        d = dlx.DLX().setColumns(["a", "b"], [1]).setRows([[0, (1, None)], [(1, None)]])
+        self.assertIsNone(d.colors)
+        self.assertEqual(d.count(), 1)
+
+
+
+# Row permutations of queensMatrix(n) for a map of the board's squares
+def queensSymmetry(n, transform):
+    return [transform(r, c)[0] * n + transform(r, c)[1] for r in range(n) for c in range(n)]
+
+
+class TestSymmetries(unittest.TestCase):
+    def assertOrbits(self, d, group, canonical, smallest=True):
+        # every solution is the image of exactly one canonical solution
+        identity = tuple(range(len(d.rows)))
+        images = set()
+        for solution in canonical:
+            orbit = {tuple(sorted(g[x] for x in solution)) for g in group + [identity]}
+            self.assertTrue(images.isdisjoint(orbit))
+            if smallest:
+                self.assertEqual(min(orbit), tuple(sorted(solution)))
+            images |= orbit
+        self.assertSetEqual(images, {tuple(sorted(x)) for x in d.solve()})
+
+    def testGroup(self):
+        n = 8
+        rotate = queensSymmetry(n, lambda r, c: (c, n - 1 - r))
+        flip = queensSymmetry(n, lambda r, c: (r, n - 1 - c))
+        d = dlx.DLX().setColumns(*queensMatrix(n)[::2]).setRows(queensMatrix(n)[1])
+        d.setSymmetries([rotate, flip])
+        self.assertEqual(len(d.symmetries), 7)
+        with self.assertRaises(Exception):
+            d.setSymmetries([[0, 0] + list(range(2, n * n))])
+
+    def testWholeBoard(self):
+        # no column is mapped onto itself by the rotations and reflections
+        for n, unique in ((6, 1), (8, 12)):
+            columns, rows, secondary = queensMatrix(n)
+            d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+            d.setSymmetries([queensSymmetry(n, lambda r, c: (c, n - 1 - r)),
+                             queensSymmetry(n, lambda r, c: (r, n - 1 - c))])
+            self.assertIsNone(d._symmetricColumnRows(d.symmetries, []))
+            canonical = [x for x in d.solveCanonical()]
+            self.assertEqual(len(canonical), unique)
+            self.assertEqual(d.countCanonical(), unique)
+            self.assertOrbits(d, d.symmetries, canonical)
+
+    def testSymmetricColumn(self):
+        # flipping the ranks maps every file onto itself. With an odd n the
+        # middle rank is fixed, so its rows have a stabilizer.
+        for n, unique in ((7, 20), (8, 46)):
+            columns, rows, secondary = queensMatrix(n)
+            for engine in dlx.ENGINES:
+                d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows)
+                d.setSymmetries([queensSymmetry(n, lambda r, c: (n - 1 - r, c))])
+                self.assertIsNotNone(d._symmetricColumnRows(d.symmetries, []))
+                canonical = [x for x in d.solveCanonical()]
+                self.assertEqual(len(canonical), unique)
+                self.assertEqual(d.countCanonical(), unique)
+                self.assertEqual(d.stats.solutions, unique)
+                self.assertEqual(d.countCanonical(limit=5), 5)
+                self.assertOrbits(d, d.symmetries, canonical, smallest=False)
+
+    def testPartial(self):
+        n = 7
+        columns, rows, secondary = queensMatrix(n)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        d.setSymmetries([queensSymmetry(n, lambda r, c: (n - 1 - r, c))])
+        # a queen on the middle rank is fixed by the flip, one on rank 0 isn't
+        middle = 3 * n + 1
+        self.assertEqual(len(d._symmetriesFixing([middle])), 1)
+        self.assertEqual(len(d._symmetriesFixing([1])), 0)
+        withMiddle = [x for x in d.solve(partial=[middle])]
+        canonical = [x for x in d.solveCanonical(partial=[middle])]
+        self.assertEqual(len(canonical), len(withMiddle) // 2)
+        for solution in canonical:
+            self.assertEqual(solution[0], middle)
+        self.assertEqual(d.countCanonical(partial=[1]), d.count(partial=[1]))
+
+
+
+class TestRowStream(unittest.TestCase):
+    def testSameSolutionsAsList(self):
+        for seed in range(10):
+            columns, rows = randomMatrix(seed)
+            for engine in dlx.ENGINES:
+                expected = [x for x in dlx.DLX(engine).setColumns(columns).setRows(rows).solve()]
+                d = dlx.DLX(engine).setColumns(columns).setRows(row for row in rows)
+                self.assertListEqual([x for x in d.solve()], expected)
+
+    def testReadOnce(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(iter(rows))
+        self.assertEqual(d.count(), 4)
+        self.assertIsInstance(d.rows, dlx.CSRRows)
+        self.assertEqual(len(d.rows), len(rows))
+        self.assertEqual(d.count(), 4)
+        self.assertListEqual(
+            [x for x in d.solve(partial=[1])],
+            [x for x in dlx.DLX().setColumns(columns, secondary).setRows(rows).solve(partial=[1])]
+        )
+
+    def testColors(self):
+        rows = [[0, (2, "a")], [1, (2, "a")], [1, (2, "b")]]
+        d = dlx.DLX().setColumns([0, 1, 2], secondary=[2]).setRows(row for row in rows)
+        self.assertListEqual([x for x in d.solve()], [[0, 1]])
+
+    def testBadRow(self):
+        d = dlx.DLX().setColumns([0, 1]).setRows(row for row in [[0], [2]])
+        with self.assertRaises(Exception):
+            next(d.solve())
+
+
+class TestSaveLoad(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "matrix.dlx")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testSameSolutions(self):
+        columns, rows, secondary = queensMatrix(6)
+        expected = [x for x in dlx.DLX().setColumns(columns, secondary).setRows(rows).solve()]
+        for links in (False, True):
+            dlx.DLX().setColumns(columns, secondary).setRows(rows).save(self.path, links=links)
+            for engine in dlx.ENGINES:
+                d = dlx.DLX(engine).load(self.path)
+                self.assertListEqual(d.columns, columns)
+                self.assertEqual(d.secondary, set(secondary))
+                self.assertListEqual([x for x in d.solve()], expected)
+                self.assertEqual(d.count(partial=[1]), 1)
+
+    def testSavedLinks(self):
+        columns, rows = randomMatrix(3)
+        d = dlx.DLX("array").setColumns(columns).setRows(rows).compile()
+        expected = [x for x in d.solve()]
+        d.save(self.path, links=True)
+        loaded = dlx.DLX("array").load(self.path).compile()
+        # the links are used from the file as they are
+        self.assertIsInstance(loaded._engine.ulink, memoryview)
+        self.assertListEqual([x for x in loaded.solve()], expected)
+        for name in ("top", "ulink", "dlink", "length", "rowStart"):
+            self.assertListEqual(list(getattr(loaded._engine, name)), list(getattr(d._engine, name)))
+        # a second DLX on the same file doesn't see the changes of the first
+        other = dlx.DLX("array").load(self.path)
+        search = loaded.solve()
+        next(search)
+        self.assertListEqual([x for x in other.solve()], expected)
+        search.close()
+
+    def testBoundsAndColors(self):
+        rows = [[0, (2, "a")], [1, (2, "a")], [1, (2, "b")], [0]]
+        d = dlx.DLX().setColumns(["x", "y", "z"], secondary=[2]).setRows(rows)
+        d.save(self.path)
+        self.assertListEqual([x for x in dlx.DLX().load(self.path).solve()], [x for x in d.solve()])
+        with self.assertRaises(Exception):
+            d.save(self.path, links=True)
+
+        d = dlx.DLX("array").setColumns([0, 1], bounds={0: (1, 2)}).setRows([[0], [0, 1], [1]])
+        d.save(self.path)
+        loaded = dlx.DLX("array").load(self.path)
+        self.assertEqual(loaded.bounds, {0: (1, 2)})
+        self.assertEqual(loaded.count(), d.count())
+
+    def testSolveParallel(self):
+        columns, rows = randomMatrix(4)
+        dlx.DLX().setColumns(columns).setRows(rows).save(self.path, links=True)
+        d = dlx.DLX("array").load(self.path)
+        self.assertListEqual([x for x in d.solveParallel(workers=2)], [x for x in d.solve()])
+
+    def testNotAMatrix(self):
+        with open(self.path, "wb") as f:
+            f.write(b"DLXSOL1\n")
+        with self.assertRaises(Exception):
+            dlx.DLX().load(self.path)
+        open(self.path, "wb").close()
+        with self.assertRaises(Exception):
+            dlx.DLX().load(self.path)
+
+    def assertLoadFails(self, data, message):
+        with open(self.path, "wb") as f:
+            f.write(data)
+        with self.assertRaises(Exception) as raised:
+            dlx.DLX("array").load(self.path)
+        self.assertIn(message, str(raised.exception))
+
+    def testCorruptFiles(self):
+        columns, rows = randomMatrix(2)
+        dlx.DLX().setColumns(columns).setRows(rows).save(self.path, links=True)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        magic = len(dlx.MATRIX_MAGIC)
+        metaSize, numRows, numEntries, linkSize = dlx.MATRIX_HEADER.unpack_from(data, magic)
+        start = magic + dlx.MATRIX_HEADER.size
+        indices = start + dlx._padded(metaSize) + 4 * (numRows + 1)
+        links = indices + 4 * numEntries
+
+        self.assertLoadFails(b"DLXMAT2\n" + data[magic:], "version")
+        self.assertLoadFails(data[:magic + 4], "truncated")
+        self.assertLoadFails(data[:-4], "truncated")
+        self.assertLoadFails(data + bytes(4), "longer")
+        self.assertLoadFails(data[:start] + b"[" + data[start + 1:], "header")
+        header = dlx.MATRIX_HEADER.pack(metaSize, numRows, numEntries, linkSize - 1)
+        self.assertLoadFails(data[:magic] + header + data[start:], "links")
+        # a column index past the last column
+        bad = struct.pack("<i", len(columns))
+        self.assertLoadFails(data[:indices] + bad + data[indices + 4:], "columns")
+        # an up link past the last node
+        ulink = links + 4 * linkSize
+        bad = struct.pack("<i", linkSize)
+        self.assertLoadFails(data[:ulink] + bad + data[ulink + 4:], "links")
+        # the file itself still loads
+        with open(self.path, "wb") as f:
+            f.write(data)
+        dlx.DLX("array").load(self.path)
+
+
+class TestBudgets(unittest.TestCase):
+    def testMaxNodes(self):
+        columns, rows, secondary = queensMatrix(8)
+        for engine in dlx.ENGINES:
+            d = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows).compile()
+            self.assertEqual(d.count(maxNodes=50), 0)
+            self.assertEqual(d.stopReason, "nodes")
+            # the root and 50 rows
+            self.assertEqual(d.stats.totalNodes(), 51)
+            self.assertEqual(d.count(), 92)
+            self.assertIsNone(d.stopReason)
+
+    def testMaxSolutions(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        expected = [x for x in d.solve()]
+        self.assertListEqual([x for x in d.solve(maxSolutions=3)], expected[:3])
+        self.assertEqual(d.stopReason, "solutions")
+        self.assertEqual(d.count(limit=2), 2)
+        self.assertEqual(d.stopReason, "solutions")
+
+        # a budget of nothing is reached before the first solution
+        self.assertListEqual([x for x in d.solve(maxSolutions=0)], [])
+        self.assertEqual(d.stopReason, "solutions")
+        self.assertEqual(d.count(limit=0), 0)
+        self.assertEqual(d.stopReason, "solutions")
+        d.setSymmetries([queensSymmetry(6, lambda r, c: (5 - r, c))])
+        self.assertEqual(d.countCanonical(limit=0), 0)
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(5)])
+        d = dlx.DLX(decompose=True).setColumns(columns, secondary).setRows(rows)
+        self.assertEqual(d.count(limit=0), 0)
+        self.assertListEqual([x for x in d.solve(maxSolutions=0)], [])
+
+    def testTimeout(self):
+        columns, rows, secondary = queensMatrix(8)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        self.assertEqual(d.count(timeout=0), 0)
+        self.assertEqual(d.stopReason, "timeout")
+        self.assertEqual(d.count(timeout=60), 92)
+        self.assertIsNone(d.stopReason)
+
+    def testCancel(self):
+        columns, rows, secondary = queensMatrix(10)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows).compile()
+        token = dlx.CancelToken()
+        found = 0
+        for _ in d.solve(cancel=token):
+            found += 1
+            token.cancel()
+        self.assertEqual(d.stopReason, "cancelled")
+        self.assertLess(found, 724)
+        self.assertEqual(d.count(), 724)
+
+        # from another thread while counting
+        columns, rows, secondary = queensMatrix(13)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        token = dlx.CancelToken()
+        timer = threading.Timer(0.05, token.cancel)
+        timer.start()
+        d.count(cancel=token)
+        timer.join()
+        self.assertEqual(d.stopReason, "cancelled")
+
+    def testBoundsAndComponents(self):
+        d = dlx.DLX("array").setColumns([0, 1], bounds={0: (1, 3)})
+        d.setRows([[0], [0], [0, 1], [1], [0]])
+        self.assertEqual(d.count(maxNodes=3), 0)
+        self.assertEqual(d.stopReason, "nodes")
+        self.assertEqual(d.count(), 14)
+
+        columns, rows, secondary = unionMatrix([queensMatrix(6), queensMatrix(5)])
+        d = dlx.DLX(decompose=True).setColumns(columns, secondary).setRows(rows)
+        total = d.count()
+        self.assertEqual(d.count(maxNodes=40), 0)
+        self.assertEqual(d.stopReason, "nodes")
+        self.assertLessEqual(d.stats.totalNodes(), 40 + len(d.components))
+        self.assertEqual(len([x for x in d.solve(maxNodes=100000)]), total)
+        self.assertIsNone(d.stopReason)
+
+
+class TestAsolve(unittest.TestCase):
+    def collect(self, d, **options):
+        async def run():
+            return [x async for x in d.asolve(**options)]
+        return run()
+
+    def testManyRequests(self):
+        columns, rows, secondary = queensMatrix(6)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        expected = [[x for x in d.solve(partial=[r])] for r in range(len(rows))]
+
+        async def run():
+            # small enough that the requests wait for each other
+            d.startAsync(workers=2, batchSize=4, maxPending=8)
+            try:
+                everything = await self.collect(d)
+                got = await asyncio.gather(*[self.collect(d, partial=[r]) for r in range(len(rows))])
+                first = await self.collect(d, maxSolutions=1)
+                with self.assertRaises(Exception):
+                    await self.collect(d, partial=[len(rows)])
+            finally:
+                await d.aclose()
+            return everything, got, first
+
+        everything, got, first = asyncio.run(run())
+        self.assertListEqual(everything, [x for x in d.solve()])
+        self.assertListEqual(got, expected)
+        self.assertListEqual(first, everything[:1])
+
+    def testChunks(self):
+        columns, rows, secondary = queensMatrix(8)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+        chunk = dlx.ASYNC_CHUNK_SOLUTIONS
+        dlx.ASYNC_CHUNK_SOLUTIONS = 5
+
+        async def run():
+            d.startAsync(workers=2)
+            try:
+                return await self.collect(d), await self.collect(d, maxSolutions=12)
+            finally:
+                await d.aclose()
+
+        try:
+            everything, some = asyncio.run(run())
+        finally:
+            dlx.ASYNC_CHUNK_SOLUTIONS = chunk
+        self.assertListEqual(everything, [x for x in d.solve()])
+        self.assertListEqual(some, everything[:12])
+
+    def testComponents(self):
+        columns, rows, secondary = unionMatrix([queensMatrix(5), queensMatrix(4)])
+        d = dlx.DLX(decompose=True).setColumns(columns, secondary).setRows(rows)
+
+        async def run():
+            d.startAsync(workers=1)
+            try:
+                return await self.collect(d)
+            finally:
+                await d.aclose()
+
+        self.assertListEqual(asyncio.run(run()), [x for x in d.solve()])
+
+    def testTimeout(self):
+        columns, rows, secondary = queensMatrix(13)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+
+        async def run():
+            d.startAsync(workers=1)
+            try:
+                with self.assertRaises(TimeoutError):
+                    await self.collect(d, timeout=0.2)
+                # the worker is free again
+                return await self.collect(d, maxSolutions=1)
+            finally:
+                await d.aclose()
+
+        self.assertEqual(len(asyncio.run(run())), 1)
+
+    def testTimeoutWhileWaiting(self):
+        columns, rows, secondary = queensMatrix(13)
+        d = dlx.DLX().setColumns(columns, secondary).setRows(rows)
+
+        chunk = dlx.ASYNC_CHUNK_SOLUTIONS
+        dlx.ASYNC_CHUNK_SOLUTIONS = 10**9
+
+        async def run():
+            # the only worker is busy for a second
+            d.startAsync(workers=1)
+            try:
+                busy = asyncio.ensure_future(self.collect(d, timeout=1.0))
+                await asyncio.sleep(0.05)
+                start = time.perf_counter()
+                with self.assertRaises(TimeoutError):
+                    await self.collect(d, partial=[0], timeout=0.2)
+                waited = time.perf_counter() - start
+                with self.assertRaises(TimeoutError):
+                    await busy
+                return waited
+            finally:
+                await d.aclose()
+
+        try:
+            self.assertLess(asyncio.run(run()), 0.8)
+        finally:
+            dlx.ASYNC_CHUNK_SOLUTIONS = chunk
+
+
+class TestCompiledMatrix(unittest.TestCase):
+    def testSameSolutions(self):
+        columns, rows = randomMatrix(2)
+        expected = [x for x in dlx.DLX().setColumns(columns).setRows(rows).solve()]
+        for engine in ("auto", "array", "bitset"):
+            matrix = dlx.DLX(engine).setColumns(columns).setRows(rows).compileShared()
+            self.assertListEqual([x for x in matrix.solve()], expected)
+            self.assertListEqual([x for x in matrix.solver().solve()], expected)
+            self.assertEqual(matrix.count(), len(expected))
+        with self.assertRaises(Exception):
+            dlx.DLX("nodes").setColumns(columns).setRows(rows).compileShared()
+        with self.assertRaises(Exception):
+            dlx.DLX(decompose=True).setColumns(columns).setRows(rows).compileShared()
+
+    def testIndependentSearches(self):
+        columns, rows, secondary = queensMatrix(7)
+        for engine in ("array", "bitset"):
+            matrix = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows).compileShared()
+            first = matrix.solver()
+            search = first.solve()
+            next(search)
+            # a search left in the middle doesn't change the others
+            self.assertEqual(matrix.count(), 40)
+            self.assertEqual(len([x for x in search]), 39)
+            template = matrix._template._engine
+            fresh = dlx.DLX(engine).setColumns(columns, secondary).setRows(rows).compile()._engine
+            for name in ("llink", "rlink", "ulink", "dlink", "length"):
+                if hasattr(fresh, name):
+                    self.assertEqual(getattr(template, name), getattr(fresh, name))
+
+    def testThreads(self):
+        columns, rows, secondary = queensMatrix(7)
+        d = dlx.DLX("array").setColumns(columns, secondary).setRows(rows)
+        expected = [d.count(partial=[r]) for r in range(len(rows))]
+        matrix = d.compileShared()
+        counts = [None] * len(rows)
+
+        def work(k):
+            solver = matrix.solver()
+            for r in range(k, len(rows), 8):
+                counts[r] = solver.count(partial=[r])
+
+        threads = [threading.Thread(target=work, args=(k,)) for k in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual(counts, expected)
+
+    def testBoundsPreprocessAndFiles(self):
+        d = dlx.DLX("array").setColumns([0, 1], bounds={0: (1, 3)})
+        d.setRows([[0], [0], [0, 1], [1], [0]])
+        self.assertEqual(d.compileShared().count(), 14)
+
+        columns, rows = randomMatrix(3)
+        d = dlx.DLX("array", preprocess=True).setColumns(columns).setRows(rows)
+        matrix = d.compileShared()
+        self.assertListEqual([x for x in matrix.solve()], [x for x in d.solve()])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "matrix.dlx")
+            dlx.DLX().setColumns(columns).setRows(rows).save(path, links=True)
+            matrix = dlx.DLX("array").load(path).compileShared()
+            # the links mapped from the file are copied, not written to
+            self.assertIsInstance(matrix.solver()._engine.ulink, dlx.array)
+            self.assertListEqual(
+                [x for x in matrix.solve()],
+                [x for x in dlx.DLX().setColumns(columns).setRows(rows).solve()])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file